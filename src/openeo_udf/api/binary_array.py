@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""OpenEO Python UDF interface"""
+
+import sys
+import base64
+import numpy
+from typing import Dict, Union, List, Optional
+from openeo_udf.server.data_model.binary_array_schema import BinaryArrayModel
+
+__license__ = "Apache License, Version 2.0"
+__author__     = "Soeren Gebbert"
+__copyright__  = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__      = "soerengebbert@googlemail.com"
+
+
+LIST_ARRAY_ENCODING = "list"
+BINARY_ARRAY_ENCODING = "binary"
+# Arrays are kept as numpy arrays for binary serializers like message pack
+NUMPY_ARRAY_ENCODING = "numpy"
+ARRAY_ENCODINGS = (LIST_ARRAY_ENCODING, BINARY_ARRAY_ENCODING, NUMPY_ARRAY_ENCODING)
+
+# The numpy dtype kinds that can be stored as raw buffer: bool, signed and unsigned integer and float
+BINARY_DTYPE_KINDS = "biuf"
+
+
+def is_binary_array(data) -> bool:
+    """Check if the provided object is a typed binary array dictionary
+
+    Args:
+        data: The object to check
+
+    Returns:
+        bool: True if data is a binary array dictionary, False otherwise
+
+    >>> is_binary_array({"dtype": "int16", "shape": [1], "byteorder": "little", "data": "AQA="})
+    True
+    >>> is_binary_array([[1, 2], [3, 4]])
+    False
+
+    """
+    return isinstance(data, dict) and "dtype" in data and "shape" in data and "data" in data
+
+
+def binary_array_header(array: numpy.ndarray) -> Dict:
+    """Create the data type, shape and byte order entries of a typed binary array dictionary
+    without the raw buffer
+
+    Args:
+        array (numpy.ndarray): The array, must have a boolean, integer or float data type
+
+    Returns:
+        dict: The binary array dictionary without the data entry
+
+    >>> binary_array_header(numpy.zeros((2, 3), dtype="<u2"))
+    {'dtype': 'uint16', 'shape': [2, 3], 'byteorder': 'little'}
+
+    """
+    if array.dtype.kind not in BINARY_DTYPE_KINDS:
+        raise Exception(f"Unable to binary encode arrays of data type {array.dtype}")
+
+    if array.dtype.byteorder == ">":
+        byteorder = "big"
+    elif array.dtype.byteorder == "<":
+        byteorder = "little"
+    else:
+        byteorder = sys.byteorder
+
+    return {"dtype": array.dtype.name, "shape": list(array.shape), "byteorder": byteorder}
+
+
+def array_to_binary_dict(array: numpy.ndarray) -> Dict:
+    """Convert a numpy array into a typed binary array dictionary that stores the data type,
+    the shape, the byte order and the base64 encoded raw buffer of the array
+
+    Args:
+        array (numpy.ndarray): The array to convert, must have a boolean, integer or float data type
+
+    Returns:
+        dict: The binary array dictionary
+
+    >>> d = array_to_binary_dict(numpy.arange(4, dtype="<i2").reshape((2, 2)))
+    >>> d["dtype"], d["shape"], d["byteorder"], d["data"]
+    ('int16', [2, 2], 'little', 'AAABAAIAAwA=')
+    >>> d = array_to_binary_dict(numpy.arange(2, dtype=">f4"))
+    >>> d["dtype"], d["shape"], d["byteorder"]
+    ('float32', [2], 'big')
+
+    """
+    array = numpy.asarray(array)
+    binary_dict = binary_array_header(array)
+    # The ascontiguousarray call does not copy the data if the array is already in C order
+    buffer = numpy.ascontiguousarray(array).data
+    binary_dict["data"] = base64.b64encode(buffer).decode("ascii")
+    return binary_dict
+
+
+def array_from_binary_dict(binary_dict: Dict) -> numpy.ndarray:
+    """Create a numpy array from a typed binary array dictionary
+
+    The returned array is a read-only view on the decoded buffer, hence the data is
+    only copied once when the base64 string is decoded.
+
+    Args:
+        binary_dict (dict): The binary array dictionary with dtype, shape, byteorder and data
+
+    Returns:
+        numpy.ndarray: The read-only array
+
+    >>> a = array_from_binary_dict({"dtype": "int16", "shape": [2, 2], "byteorder": "little", "data": "AAABAAIAAwA="})
+    >>> a.tolist(), a.dtype.name
+    ([[0, 1], [2, 3]], 'int16')
+    >>> a = numpy.linspace(0, 1, 6, dtype=numpy.float32).reshape((2, 3))
+    >>> b = array_from_binary_dict(array_to_binary_dict(a))
+    >>> numpy.array_equal(a, b), b.dtype.name, b.shape
+    (True, 'float32', (2, 3))
+
+    """
+    dtype = numpy.dtype(binary_dict["dtype"])
+    if dtype.kind not in BINARY_DTYPE_KINDS:
+        raise Exception(f"Unsupported data type {dtype} of binary array")
+
+    byteorder = binary_dict.get("byteorder", "little")
+    if byteorder not in ("little", "big"):
+        raise Exception(f"Unsupported byte order {byteorder} of binary array")
+    dtype = dtype.newbyteorder("<" if byteorder == "little" else ">")
+
+    shape = tuple(binary_dict["shape"])
+    buffer = base64.b64decode(binary_dict["data"])
+    count = int(numpy.prod(shape, dtype=numpy.int64))
+    if len(buffer) != count * dtype.itemsize:
+        raise Exception(f"The size of the binary array buffer ({len(buffer)} bytes) does not match "
+                        f"the shape {list(shape)} of data type {dtype.name}")
+
+    return numpy.frombuffer(buffer, dtype=dtype).reshape(shape)
+
+
+def encode_array(array: numpy.ndarray,
+                 array_encoding: str = LIST_ARRAY_ENCODING) -> Union[List, Dict, numpy.ndarray]:
+    """Encode a numpy array as nested lists, as typed binary array dictionary or leave it as numpy array
+
+    Arrays with data types that can not be stored as raw buffer, like datetime or object arrays,
+    are always encoded as nested lists.
+
+    Args:
+        array (numpy.ndarray): The array to encode
+        array_encoding (str): The array encoding "list", "binary" or "numpy"
+
+    Returns:
+        The nested list, the binary array dictionary or the numpy array
+
+    >>> encode_array(numpy.zeros((2, 2)))
+    [[0.0, 0.0], [0.0, 0.0]]
+    >>> encode_array(numpy.zeros((2, 2), dtype=numpy.uint8), "binary")["data"]
+    'AAAAAA=='
+    >>> encode_array(numpy.zeros((2, 2), dtype=numpy.uint8), "numpy").shape
+    (2, 2)
+
+    """
+    if array_encoding not in ARRAY_ENCODINGS:
+        raise Exception(f"Unknown array encoding {array_encoding}, supported are {list(ARRAY_ENCODINGS)}")
+
+    array = numpy.asarray(array)
+    if array.dtype.kind in BINARY_DTYPE_KINDS:
+        if array_encoding == BINARY_ARRAY_ENCODING:
+            return array_to_binary_dict(array)
+        if array_encoding == NUMPY_ARRAY_ENCODING:
+            return array
+    return array.tolist()
+
+
+def decode_array(data, dtype: Optional[str] = None) -> numpy.ndarray:
+    """Decode nested lists or a typed binary array into a numpy array
+
+    Args:
+        data: Nested lists of numbers, a numpy array, a binary array dictionary or a
+              openeo_udf.server.data_model.binary_array_schema.BinaryArrayModel
+        dtype (str): The optional name of the data type of the array, nested lists are directly
+                     decoded into this data type and arrays of other data types are converted
+
+    Returns:
+        numpy.ndarray: The decoded array
+
+    >>> decode_array([[1, 2], [3, 4]]).shape
+    (2, 2)
+    >>> decode_array({"dtype": "uint8", "shape": [2], "data": "AQI="}).tolist()
+    [1, 2]
+    >>> decode_array([[1, 2], [3, 4]], dtype="int16").dtype.name
+    'int16'
+
+    """
+    if dtype is not None and numpy.dtype(dtype).kind not in BINARY_DTYPE_KINDS:
+        raise Exception(f"Unsupported data type {dtype} of array")
+
+    if isinstance(data, BinaryArrayModel):
+        array = array_from_binary_dict(data.dict())
+    elif is_binary_array(data):
+        array = array_from_binary_dict(data)
+    else:
+        return numpy.asarray(data, dtype=dtype)
+
+    if dtype is not None:
+        array = array.astype(dtype, copy=False)
+    return array
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -2,9 +2,25 @@
 # -*- coding: utf-8 -*-
 """OpenEO Python UDF interface"""
 
+import functools
 import numpy
+import pandas
 import xarray
-from typing import Dict, List
+from typing import Dict, List, Optional
+from openeo_udf.api.binary_array import encode_array, decode_array, LIST_ARRAY_ENCODING, NUMPY_ARRAY_ENCODING, \
+    BINARY_ARRAY_ENCODING, BINARY_DTYPE_KINDS, array_to_binary_dict
+from openeo_udf.server.data_model.binary_array_schema import BinaryArrayModel
+from openeo_udf.server.data_model.datacube_schema import DataCubeModel, DimensionModel
+from openeo_udf.server.data_model.variables_collection_schema import VariableModel, VariablesCollectionModel
+from openeo_udf.server.data_model.data_collection_schema import DataCollectionModel, ObjectCollectionModel, \
+    TimeStampsModel
+from openeo_udf.server.data_model.metadata_schema import MetadataModel
+from openeo_udf.server.config import UdfConfiguration
+
+try:
+    import dask
+except ImportError:
+    dask = None
 
 
 __license__ = "Apache License, Version 2.0"
@@ -14,6 +30,112 @@ __maintainer__ = "Soeren Gebbert"
 __email__      = "soerengebbert@googlemail.com"
 
 
+@functools.lru_cache(maxsize=256)
+def regular_grid_coordinates(start: float, end: float, number_of_cells: int) -> numpy.ndarray:
+    """Compute the cell center coordinates of a regular grid dimension from its extent and number of cells
+
+    The coordinates are computed vectorized without accumulation of floating point errors. The result is cached
+    for each distinct extent and number of cells, hence the returned array is read-only and shared by all
+    data cubes with the same dimension definition.
+
+    Args:
+        start (float): The start of the extent of the dimension
+        end (float): The end of the extent of the dimension
+        number_of_cells (int): The number of cells in the dimension
+
+    Returns:
+        numpy.ndarray: The read-only array of cell center coordinates
+
+    >>> regular_grid_coordinates(0, 3, 3).tolist()
+    [0.5, 1.5, 2.5]
+    >>> regular_grid_coordinates(-10, 10, 4).tolist()
+    [-7.5, -2.5, 2.5, 7.5]
+    >>> regular_grid_coordinates(0, 3, 3) is regular_grid_coordinates(0, 3, 3)
+    True
+
+    """
+    stepsize = (end - start) / number_of_cells
+    coordinates = start + (numpy.arange(number_of_cells, dtype=numpy.float64) + 0.5) * stepsize
+    coordinates.flags.writeable = False
+    return coordinates
+
+
+def chunk_array(array: xarray.DataArray, chunks=None) -> xarray.DataArray:
+    """Wrap the data of an array into a chunked dask array, the data is not copied
+
+    Args:
+        array (xarray.DataArray): The array
+        chunks: The chunk sizes of the dask array, a single size for all dimensions, a dictionary with the chunk
+                size of each dimension name or "auto". The array is returned unchanged if None.
+
+    Returns:
+        xarray.DataArray: The dask backed array
+
+    >>> array = xarray.DataArray(numpy.zeros((4, 6)), dims=("y", "x"))
+    >>> chunk_array(array, {"x": 3}).chunks
+    ((4,), (3, 3))
+    >>> chunk_array(array).chunks is None
+    True
+
+    """
+    if chunks is None:
+        return array
+    if dask is None:
+        raise Exception("Chunked data cubes require the dask package")
+    return array.chunk(chunks)
+
+
+def dimension_to_model(name: str, size: int, coordinate: Optional[xarray.DataArray] = None) -> DimensionModel:
+    """Create the dimension model of a data collection from the coordinates of a data cube dimension
+
+    Regular numeric coordinates are stored as extent and number of cells, time stamps as ISO strings and all
+    other coordinates as list of values.
+
+    Args:
+        name (str): The name of the dimension
+        size (int): The number of cells of the dimension
+        coordinate (xarray.DataArray): The optional coordinates of the dimension
+
+    Returns:
+        DimensionModel: The dimension model
+
+    >>> dimension_to_model("x", 3, xarray.DataArray([0.5, 1.5, 2.5])).dict(skip_defaults=True)["extent"]
+    [0.0, 3.0]
+    >>> dimension_to_model("x", 3, xarray.DataArray([1.0, 2.0, 4.0])).values
+    [1.0, 2.0, 4.0]
+
+    """
+    axis = name.lower() if name.lower() in ("x", "y", "z") else None
+    dimension_type = "spatial" if axis else "other"
+    unit = "unknown"
+    extent = []
+    values = None
+
+    if coordinate is not None:
+        coordinates = coordinate.values
+        unit = coordinate.attrs.get("unit", unit)
+        if coordinates.dtype.kind == "M":
+            dimension_type = "temporal"
+            unit = "ISO:8601"
+            values = [t.isoformat() for t in pandas.DatetimeIndex(coordinates)]
+            extent = [values[0], values[-1]] if values else []
+        elif coordinates.dtype.kind in "iuf" and size > 1:
+            coordinates = coordinates.astype(numpy.float64)
+            stepsize = (coordinates[-1] - coordinates[0]) / (size - 1)
+            extent = [float(coordinates[0] - stepsize / 2.0), float(coordinates[-1] + stepsize / 2.0)]
+            grid = regular_grid_coordinates(extent[0], extent[1], size)
+            if stepsize == 0 or not numpy.allclose(grid, coordinates, rtol=0, atol=abs(stepsize) * 1e-9):
+                values = coordinates.tolist()
+                extent = [float(coordinates.min()), float(coordinates.max())]
+        else:
+            values = coordinates.tolist()
+            if coordinates.dtype.kind in "iuf":
+                extent = [float(coordinates.min()), float(coordinates.max())]
+
+    return DimensionModel(description=f"Dimension {name}", type=dimension_type, unit=unit, axis=axis,
+                          extent=extent, values=values, number_of_cells=size)
+
+
 class DataCube:
     """This class is a hypercube representation of multi-dimensional data
     that stores an xarray and provides methods to convert the xarray into
@@ -66,6 +188,15 @@ class DataCube:
     >>> "description" not in d
     True
 
+    >>> array = xarray.DataArray(numpy.arange(6, dtype=numpy.int16).reshape((2, 3)), dims=('x', 'y'))
+    >>> h = DataCube(array=array)
+    >>> d = h.to_dict(array_encoding="binary")
+    >>> d["data"]
+    {'dtype': 'int16', 'shape': [2, 3], 'byteorder': 'little', 'data': 'AAABAAIAAwAEAAUA'}
+    >>> new_h = DataCube.from_dict(d)
+    >>> new_h.array.values.tolist()
+    [[0, 1, 2], [3, 4, 5]]
+
     >>> array = xarray.DataArray(numpy.zeros(shape=(2, 3)))
     >>> h = DataCube(array=array)
     >>> d = h.to_dict()
@@ -125,12 +256,51 @@ class DataCube:
     def id(self):
         return self._array.name
 
+    @property
+    def is_lazy(self) -> bool:
+        """True if the data of the array is a dask array that was not computed yet"""
+        return self._array is not None and self._array.chunks is not None
+
+    @staticmethod
+    def compute_datacubes(cube_list: List['DataCube'], scheduler: Optional[str] = None):
+        """Compute the dask arrays of data cubes in a single computation, hence shared parts of the
+        task graphs are only computed once. The arrays of the data cubes are replaced by the computed arrays.
+
+        Args:
+            cube_list (list): The data cubes, data cubes that are not lazy are ignored
+            scheduler (str): The dask scheduler "threads", "processes" or "synchronous",
+                             UdfConfiguration.dask_scheduler is used if not set
+
+        >>> array = xarray.DataArray(numpy.arange(6).reshape((2, 3)), dims=("y", "x"), name="a")
+        >>> cube = DataCube(array=chunk_array(array, 2) * 2)
+        >>> cube.is_lazy
+        True
+        >>> DataCube.compute_datacubes([cube])
+        >>> cube.is_lazy, cube.array.values.tolist()
+        (False, [[0, 2, 4], [6, 8, 10]])
+
+        """
+        lazy = [cube for cube in cube_list if cube.is_lazy]
+        if not lazy:
+            return
+        if scheduler is None:
+            scheduler = UdfConfiguration.dask_scheduler
+        arrays = dask.compute(*[cube.array for cube in lazy], scheduler=scheduler)
+        for cube, array in zip(lazy, arrays):
+            cube.set_array(array)
+
     array = property(fget=get_array, fset=set_array)
 
-    def to_dict(self) -> Dict:
+    def to_dict(self, array_encoding: str = LIST_ARRAY_ENCODING) -> Dict:
         """Convert this hypercube into a dictionary that can be converted into
         a valid JSON representation
 
+        Args:
+            array_encoding (str): The encoding of the cube data, either "list" for nested lists,
+                                  "binary" for a typed binary array with base64 encoded raw buffer or
+                                  "numpy" to keep the numpy array and time coordinates as pandas.DatetimeIndex
+                                  for binary serializers
+
         Returns:
             dict:
             HyperCube as a dictionary
@@ -157,35 +327,55 @@ class DataCube:
 
         d = {"id":"", "data": "", "dimensions":[]}
         if self._array is not None:
-            xd = self._array.to_dict()
+            # The array data is encoded separately to avoid the conversion of binary encoded data into lists
+            xd = self._array.to_dict(data=False)
 
             if "name" in xd:
                 d["id"] = xd["name"]
 
-            if "data" in xd:
-                d["data"] = xd["data"]
+            d["data"] = encode_array(self._array.values, array_encoding=array_encoding)
+            # The data type is stored to restore it from nested lists
+            if self._array.dtype.kind in BINARY_DTYPE_KINDS:
+                d["dtype"] = self._array.dtype.name
 
             if "attrs" in xd:
                 if "description" in xd["attrs"]:
                     d["description"] = xd["attrs"]["description"]
 
-            if "dims" in xd and "coords" in xd:
-                for dim in xd["dims"]:
-                    if dim in xd["coords"]:
-                        if "data" in xd["coords"][dim]:
-                            d["dimensions"].append({"name": dim, "coordinates": xd["coords"][dim]["data"]})
-                        else:
-                            d["dimensions"].append({"name": dim})
+            d["dimensions"] = self.dimensions_to_list(array_encoding=array_encoding)
 
         return d
 
+    def dimensions_to_list(self, array_encoding: str = LIST_ARRAY_ENCODING) -> List[Dict]:
+        """Convert the dimensions that have coordinates into a list of dimension dictionaries
+
+        Args:
+            array_encoding (str): If "numpy", time coordinates are kept as pandas.DatetimeIndex
+
+        Returns:
+            list:
+            A list of dictionaries with the dimension name and the coordinates
+
+        """
+        dimensions = []
+        for dim in self._array.dims:
+            if dim in self._array.coords:
+                coordinate = self._array.coords[dim]
+                if array_encoding == NUMPY_ARRAY_ENCODING and coordinate.dtype.kind == "M":
+                    coordinates = pandas.DatetimeIndex(coordinate.values)
+                else:
+                    coordinates = coordinate.to_dict()["data"]
+                dimensions.append({"name": dim, "coordinates": coordinates})
+        return dimensions
+
     @staticmethod
-    def from_dict(hc_dict: Dict) -> "DataCube":
+    def from_dict(hc_dict: Dict, chunks=None) -> "DataCube":
         """Create a hypercube from a python dictionary that was created from
         the JSON definition of the HyperCube
 
         Args:
             hc_dict (dict): The dictionary that contains the hypercube definition
+            chunks: The optional chunk sizes of a dask backed array, see chunk_array()
 
         Returns:
             HyperCube
@@ -207,31 +397,108 @@ class DataCube:
                 if "coordinates" in dim:
                     coords[dim["name"]] = dim["coordinates"]
 
+        array = decode_array(hc_dict["data"], dtype=hc_dict.get("dtype"))
+
         if dims and coords:
-            data = xarray.DataArray(numpy.asarray(hc_dict["data"]), coords=coords, dims=dims)
+            data = xarray.DataArray(array, coords=coords, dims=dims)
         elif dims:
-            data = xarray.DataArray(numpy.asarray(hc_dict["data"]), dims=dims)
+            data = xarray.DataArray(array, dims=dims)
         else:
-            data = xarray.DataArray(numpy.asarray(hc_dict["data"]))
+            data = xarray.DataArray(array)
 
         if "id" in hc_dict:
             data.name = hc_dict["id"]
         if "description" in hc_dict:
             data.attrs["description"] = hc_dict["description"]
 
-        hc = DataCube(array=data)
+        hc = DataCube(array=chunk_array(data, chunks))
 
         return hc
 
-    def to_data_collection(self):
-        pass
+    @staticmethod
+    def to_data_collection(cube_list: List['DataCube'],
+                           array_encoding: str = LIST_ARRAY_ENCODING) -> DataCollectionModel:
+        """Create a data collection from data cubes
+
+        Data cubes with the same dimensions, sizes and coordinates share a single data cube model and
+        variables collection, each data cube is stored as a variable of this collection. The variable values
+        are one dimensional views on the data cube arrays.
+
+        Args:
+            cube_list (list): The list of data cubes
+            array_encoding (str): "binary" to store the variable values as typed binary arrays,
+                                  otherwise the values are numpy arrays
+
+        Returns:
+            DataCollectionModel:
+            The data collection
+
+        >>> a = xarray.DataArray(numpy.zeros((2, 3), dtype=numpy.float32), dims=("y", "x"),
+        ...                      coords={"y": [0.5, 1.5], "x": [0.5, 1.5, 2.5]}, name="a")
+        >>> b = a.copy()
+        >>> b.name = "b"
+        >>> dc = DataCube.to_data_collection([DataCube(array=a), DataCube(array=b)])
+        >>> len(dc.object_collections.data_cubes), len(dc.variables_collections)
+        (1, 1)
+        >>> [v.name for v in dc.variables_collections[0].variables]
+        ['a', 'b']
+        >>> [c.id for c in DataCube.from_data_collection(dc)]
+        ['a', 'b']
+
+        """
+        data_cubes = []
+        variables_collections = []
+        groups = {}
+
+        for cube in cube_list:
+            array = cube.array
+            dimensions = {}
+            for dim, size in zip(array.dims, array.shape):
+                coordinate = array.coords[dim] if dim in array.coords else None
+                dimensions[dim] = dimension_to_model(name=dim, size=size, coordinate=coordinate)
+
+            dtype = array.dtype.name if array.dtype.kind in BINARY_DTYPE_KINDS else None
+            key = (tuple(array.dims), tuple(array.shape), dtype,
+                   tuple(d.json() for d in dimensions.values()))
+
+            if key not in groups:
+                index = len(data_cubes)
+                groups[key] = index
+                data_cubes.append(DataCubeModel(name=f"data_cube_{index}", description=array.attrs.get("description"),
+                                                dim=list(array.dims), size=list(array.shape), dtype=dtype,
+                                                dimensions=dimensions, variable_collection=index))
+                variables_collections.append(VariablesCollectionModel(name=f"variables_collection_{index}",
+                                                                      size=list(array.shape),
+                                                                      number_of_variables=0, variables=[]))
+
+            # Reshaping a C contiguous array creates a view without copying the values
+            values = numpy.asarray(array.values).reshape(-1)
+            if array_encoding == BINARY_ARRAY_ENCODING and dtype is not None:
+                values = BinaryArrayModel(**array_to_binary_dict(values))
+
+            variables_collection = variables_collections[groups[key]]
+            variables_collection.variables.append(VariableModel(name=cube.id, unit=array.attrs.get("unit", "unknown"),
+                                                                values=values, labels=[]))
+            variables_collection.number_of_variables = len(variables_collection.variables)
+
+        metadata = MetadataModel(name="data_collection", description="Data collection of data cubes",
+                                 number_of_object_collections=len(data_cubes), number_of_geometries=0,
+                                 number_of_variable_collections=len(variables_collections), number_of_time_stamps=0)
+
+        return DataCollectionModel(metadata=metadata,
+                                   object_collections=ObjectCollectionModel(data_cubes=data_cubes),
+                                   geometry_collection=[],
+                                   variables_collections=variables_collections,
+                                   timestamps=TimeStampsModel(intervals=[]))
 
     @staticmethod
-    def from_data_collection(data_collection: 'openeo_udf.server.data_model.data_collection_schema.DataCollectionModel') -> List['DataCube']:
+    def from_data_collection(data_collection: 'openeo_udf.server.data_model.data_collection_schema.DataCollectionModel',
+                             chunks=None) -> List['DataCube']:
         """Create data cubes from a data collection
 
         Args:
             data_collection:
+            chunks: The optional chunk sizes of dask backed arrays, see chunk_array()
 
         Returns:
             A list of data cubes
@@ -252,26 +519,26 @@ class DataCube:
                 d = cube.dimensions[key]
                 if d.values:
                     coords[key] = d.values
+                    if d.type == "temporal":
+                        try:
+                            coords[key] = pandas.DatetimeIndex(d.values)
+                        except ValueError:
+                            # Time intervals are kept as strings
+                            pass
                 else:
                     l = d.number_of_cells
-                    if l != 0 and d.extent:
-                        stepsize = (d.extent[1] - d.extent[0])/l
-                        values = []
-                        predecessor = d.extent[0]
-                        for i in range(l):
-                            value = predecessor + stepsize/2.0
-                            values.append(value)
-                            predecessor = predecessor + stepsize
-                        coords[key] = values
+                    if l and d.extent:
+                        # Dimensions with the same extent and number of cells share the cached coordinate array
+                        coords[key] = regular_grid_coordinates(d.extent[0], d.extent[1], l)
 
             for variable in variable_collection.variables:
-                array = numpy.asarray(variable.values)
+                array = decode_array(variable.values, dtype=cube.dtype)
                 array = array.reshape(variable_collection.size)
 
                 data = xarray.DataArray(array, dims=cube.dim, coords=coords)
                 data.name = variable.name
 
-                dc = DataCube(array=data)
+                dc = DataCube(array=chunk_array(data, chunks))
                 dc_list.append(dc)
 
         return dc_list
@@ -3,10 +3,14 @@
 """OpenEO Python UDF interface"""
 
 import geopandas
+import geopandas.array
+import numpy
 import pandas
 import json
-from typing import Optional, Dict
+from typing import Optional, Dict, Tuple
 from openeo_udf.api.collection_base import CollectionBase
+from openeo_udf.api.binary_array import LIST_ARRAY_ENCODING, NUMPY_ARRAY_ENCODING, BINARY_DTYPE_KINDS, \
+    encode_array, decode_array
 
 
 __license__ = "Apache License, Version 2.0"
@@ -15,6 +19,65 @@ __copyright__  = "Copyright 2018, Soeren Gebbert"
 __maintainer__ = "Soeren Gebbert"
 __email__      = "soerengebbert@googlemail.com"
 
+WKB_GEOMETRY_ENCODING = "wkb"
+
+
+# The element wise length of an object array of WKB geometries
+_wkb_length = numpy.frompyfunc(len, 1, 1)
+
+
+def geometries_to_wkb(geometry: geopandas.GeoSeries) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Encode geometries as a single buffer of concatenated WKB geometries and an offset array
+
+    The WKB conversion is vectorized by geopandas if pygeos or shapely 2 is available.
+
+    Args:
+        geometry (geopandas.GeoSeries): The geometries to encode, missing geometries are stored with zero length
+
+    Returns:
+        tuple: The uint8 buffer of the WKB geometries and the int64 offsets array with n + 1 entries,
+        the WKB of geometry i is buffer[offsets[i]:offsets[i + 1]]
+
+    >>> from shapely.geometry import Point
+    >>> buffer, offsets = geometries_to_wkb(geopandas.GeoSeries([Point(0, 0), Point(1, 1)]))
+    >>> buffer.dtype.name, offsets.tolist()
+    ('uint8', [0, 21, 42])
+
+    """
+    wkb = numpy.array(geopandas.array.to_wkb(geopandas.GeoSeries(geometry).values), dtype=object)
+    wkb[numpy.equal(wkb, None)] = b""
+    offsets = numpy.zeros(len(wkb) + 1, dtype=numpy.int64)
+    if len(wkb):
+        numpy.cumsum(_wkb_length(wkb).astype(numpy.int64), out=offsets[1:])
+    buffer = numpy.frombuffer(b"".join(wkb), dtype=numpy.uint8)
+    return buffer, offsets
+
+
+def geometries_from_wkb(buffer: numpy.ndarray, offsets: numpy.ndarray) -> geopandas.array.GeometryArray:
+    """Decode geometries from a buffer of concatenated WKB geometries and an offset array
+
+    Args:
+        buffer (numpy.ndarray): The uint8 buffer of the WKB geometries
+        offsets (numpy.ndarray): The offsets array with n + 1 entries
+
+    Returns:
+        geopandas.array.GeometryArray: The geometries, geometries with zero length are missing
+
+    >>> from shapely.geometry import Point
+    >>> geometries = geometries_from_wkb(*geometries_to_wkb(geopandas.GeoSeries([Point(0, 0), Point(1, 1)])))
+    >>> [g.wkt for g in geometries]
+    ['POINT (0 0)', 'POINT (1 1)']
+
+    """
+    blob = numpy.asarray(buffer, dtype=numpy.uint8).tobytes()
+    offsets = numpy.asarray(offsets, dtype=numpy.int64)
+    wkb = numpy.empty(len(offsets) - 1, dtype=object)
+    if len(wkb):
+        wkb[:] = numpy.frompyfunc(lambda start, end: blob[start:end], 2, 1)(offsets[:-1], offsets[1:])
+    # Missing geometries are stored with zero length, they are not valid WKB
+    wkb[offsets[1:] == offsets[:-1]] = None
+    return geopandas.array.from_wkb(wkb)
+
 
 class FeatureCollection(CollectionBase):
     """A feature collection  that represents a subset or a whole feature collection
@@ -134,10 +197,16 @@ class FeatureCollection(CollectionBase):
 
     data = property(fget=get_data, fset=set_data)
 
-    def to_dict(self) -> Dict:
+    def to_dict(self, array_encoding: str = LIST_ARRAY_ENCODING) -> Dict:
         """Convert this FeatureCollection into a dictionary that can be converted into
         a valid JSON representation
 
+        Args:
+            array_encoding (str): If "list", the data is stored as GeoJSON. If "binary" or "numpy", the
+                                  data is stored as columns with WKB encoded geometries, see data_to_wkb_dict.
+                                  If "numpy", the start and end times are kept as pandas.DatetimeIndex
+                                  for binary serializers, otherwise they are converted into ISO strings
+
         Returns:
             dict:
             FeatureCollection as a dictionary
@@ -145,14 +214,88 @@ class FeatureCollection(CollectionBase):
 
         d = {"id": self.id}
         if self._start_times is not None:
-            d.update(self.start_times_to_dict())
+            if array_encoding == NUMPY_ARRAY_ENCODING:
+                d["start_times"] = self._start_times
+            else:
+                d.update(self.start_times_to_dict())
         if self._end_times is not None:
-            d.update(self.end_times_to_dict())
+            if array_encoding == NUMPY_ARRAY_ENCODING:
+                d["end_times"] = self._end_times
+            else:
+                d.update(self.end_times_to_dict())
         if self._data is not None:
-            d["data"] = json.loads(self._data.to_json())
+            if array_encoding == LIST_ARRAY_ENCODING:
+                d["data"] = json.loads(self._data.to_json())
+            else:
+                d.update(self.data_to_wkb_dict(array_encoding=array_encoding))
 
         return d
 
+    def data_to_wkb_dict(self, array_encoding: str) -> Dict:
+        """Convert the data of this FeatureCollection into a columnar dictionary with WKB encoded geometries
+
+        The geometries are stored as a single buffer of concatenated WKB geometries with an offsets array.
+        Attribute columns with boolean, integer or float data type are stored as arrays, all other
+        columns as lists.
+
+        Args:
+            array_encoding (str): The encoding of the geometry buffer, the offsets and the attribute columns,
+                                  "binary" for typed binary arrays or "numpy" for binary serializers
+
+        Returns:
+            dict:
+            A dictionary with the "geometry" and the "columns" entries
+
+        >>> from shapely.geometry import Point
+        >>> data = geopandas.GeoDataFrame({"a": [1, 2], "b": ["x", "y"]}, geometry=[Point(0, 0), Point(1, 1)])
+        >>> d = FeatureCollection(id="test", data=data).data_to_wkb_dict(array_encoding="binary")
+        >>> d["geometry"]["encoding"], d["geometry"]["offsets"]["dtype"], d["columns"]["b"]
+        ('wkb', 'int64', ['x', 'y'])
+        >>> fct = FeatureCollection.from_dict({"id": "test", **d})
+        >>> fct.data["a"].tolist(), [g.wkt for g in fct.data.geometry]
+        ([1, 2], ['POINT (0 0)', 'POINT (1 1)'])
+
+        """
+        buffer, offsets = geometries_to_wkb(self._data.geometry)
+        columns = {}
+        for name in self._data.columns:
+            if name == self._data.geometry.name:
+                continue
+            values = self._data[name].values
+            if values.dtype.kind in BINARY_DTYPE_KINDS:
+                columns[name] = encode_array(values, array_encoding=array_encoding)
+            else:
+                columns[name] = self._data[name].tolist()
+
+        return {"geometry": {"encoding": WKB_GEOMETRY_ENCODING,
+                             "data": encode_array(buffer, array_encoding=array_encoding),
+                             "offsets": encode_array(offsets, array_encoding=array_encoding)},
+                "columns": columns}
+
+    @staticmethod
+    def data_from_wkb_dict(fct_dict: Dict) -> geopandas.GeoDataFrame:
+        """Create the GeoDataFrame of a feature collection from a columnar dictionary with WKB encoded geometries
+        that was created with data_to_wkb_dict
+
+        Args:
+            fct_dict (dict): The dictionary with the "geometry" and the optional "columns" entries
+
+        Returns:
+            geopandas.GeoDataFrame:
+            The data frame with the geometry and the attribute columns
+
+        """
+        geometry = fct_dict["geometry"]
+        if geometry.get("encoding", WKB_GEOMETRY_ENCODING) != WKB_GEOMETRY_ENCODING:
+            raise Exception(f"Unsupported geometry encoding {geometry['encoding']}")
+
+        geometries = geometries_from_wkb(decode_array(geometry["data"]), decode_array(geometry["offsets"]))
+        columns = {}
+        for name, values in (fct_dict.get("columns") or {}).items():
+            columns[name] = values if isinstance(values, list) else decode_array(values)
+
+        return geopandas.GeoDataFrame(pandas.DataFrame(columns) if columns else None, geometry=geometries)
+
     @staticmethod
     def from_dict(fct_dict: Dict):
         """Create a feature collection  from a python dictionary that was created from
@@ -170,11 +313,14 @@ class FeatureCollection(CollectionBase):
         if "id" not in fct_dict:
             raise Exception("Missing id in dictionary")
 
-        if "data" not in fct_dict:
+        if fct_dict.get("geometry") is not None:
+            data = FeatureCollection.data_from_wkb_dict(fct_dict)
+        elif fct_dict.get("data") is not None:
+            data = geopandas.GeoDataFrame.from_features(fct_dict["data"])
+        else:
             raise Exception("Missing data in dictionary")
 
-        fct = FeatureCollection(id =fct_dict["id"],
-                                data=geopandas.GeoDataFrame.from_features(fct_dict["data"]))
+        fct = FeatureCollection(id =fct_dict["id"], data=data)
 
         if "start_times" in fct_dict:
             fct.set_start_times_from_list(fct_dict["start_times"])
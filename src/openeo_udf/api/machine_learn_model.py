@@ -3,7 +3,11 @@
 """OpenEO Python UDF interface"""
 
 import os
-from typing import Optional, Dict
+import pickle
+import numpy
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple
 from openeo_udf.server.config import UdfConfiguration
 
 
@@ -14,13 +18,375 @@ __maintainer__ = "Soeren Gebbert"
 __email__      = "soerengebbert@googlemail.com"
 
 
+# The loaded machine learn models are cached in least recently used order by their md5 hash or their path
+# and the state of their file, together with their estimated memory size and the path of their file
+_model_cache: "OrderedDict[Tuple, Tuple[object, int, str]]" = OrderedDict()
+_model_cache_statistics = {"hits": 0, "misses": 0, "evictions": 0, "memory": 0}
+_model_cache_lock = threading.Lock()
+
+
+class _ByteCounter:
+    """A file like object that only counts the bytes that are written"""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+# The magic bytes of the compression formats of joblib files
+COMPRESSED_FILE_MAGICS = (b"\x1f\x8b", b"BZh", b"\xfd7zXZ\x00", b"\x5d\x00\x00", b"\x04\x22\x4d\x18",
+                          b"\x78\x01", b"\x78\x5e", b"\x78\x9c", b"\x78\xda", b"ZF")
+
+
+def is_compressed_file(filepath: str) -> bool:
+    """Check if a model file is compressed with gzip, bz2, xz, lzma, lz4 or zlib, like compressed joblib files
+
+    Args:
+        filepath (str): The path of the model file
+
+    Returns:
+        bool: True if the file starts with the magic bytes of a compression format
+
+    """
+    with open(filepath, "rb") as model_file:
+        header = model_file.read(8)
+    return header.startswith(COMPRESSED_FILE_MAGICS)
+
+
+def model_memory_size(model, filepath: Optional[str] = None) -> int:
+    """Estimate the memory size of a loaded machine learn model
+
+    The size of pytorch modules is the size of their parameters and buffers, the size of all other models
+    is estimated by the size of their file. If the file is not available or compressed, the size of the pickled
+    representation of the model is computed without storing it.
+
+    Args:
+        model: The loaded machine learn model
+        filepath (str): The path of the model file
+
+    Returns:
+        int: The estimated memory size in bytes
+
+    >>> import numpy
+    >>> model_memory_size(numpy.zeros(1000)) > 8000
+    True
+
+    """
+    if not isinstance(model, type) and callable(getattr(model, "parameters", None)) and \
+            callable(getattr(model, "buffers", None)):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    if filepath and os.path.isfile(filepath) and not is_compressed_file(filepath):
+        return os.path.getsize(filepath)
+    try:
+        counter = _ByteCounter()
+        pickle.dump(model, counter, protocol=pickle.HIGHEST_PROTOCOL)
+        return counter.size
+    except Exception:
+        return 0
+
+
+def model_cache_budget() -> int:
+    """Return the memory budget of the model cache of this process in bytes
+
+    Each worker process has its own model cache, hence the worker processes share the budget of
+    UdfConfiguration.model_cache_memory equally.
+
+    Returns:
+        int: The memory budget in bytes, 0 if the cache is disabled
+
+    """
+    return int(UdfConfiguration.model_cache_memory or 0) // max(1, UdfConfiguration.worker_processes)
+
+
+def model_cache_key(framework: str, filepath: str, md5_hash: Optional[str] = None) -> Tuple:
+    """Compute the key of a model in the model cache
+
+    Models of the machine learn storage are identified by their md5 hash, the modification time and the inode
+    of their file, all other models by their path, their modification time and their size. Hence a changed,
+    deleted or uploaded again model file is never served from the cache of any process.
+
+    Args:
+        framework (str): The name of the framework
+        filepath (str): The path of the model file
+        md5_hash (str): The md5 hash of the model in the machine learn storage
+
+    Returns:
+        tuple: The cache key
+
+    """
+    stat = os.stat(filepath)
+    if md5_hash is not None:
+        return framework.lower(), "md5", md5_hash, stat.st_mtime_ns, stat.st_ino
+    return framework.lower(), "path", os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size
+
+
+# The numpy data types of the ONNX tensor types
+ONNX_TENSOR_TYPES = {"tensor(float)": numpy.float32, "tensor(double)": numpy.float64,
+                     "tensor(float16)": numpy.float16, "tensor(int32)": numpy.int32,
+                     "tensor(int64)": numpy.int64, "tensor(uint8)": numpy.uint8, "tensor(bool)": numpy.bool_}
+
+
+class OnnxModel:
+    """A numpy native machine learn model that runs an ONNX Runtime inference session
+
+    The model provides the prediction method of sklearn models, m.predict(X), and can be called like a pytorch
+    model, m(X), so that the machine learn UDFs can apply it without changes. The input is converted into the
+    data type of the first input of the session and the first output of the session is returned as numpy array.
+
+    Args:
+        session (onnxruntime.InferenceSession): The inference session of the model
+
+    """
+
+    def __init__(self, session: 'onnxruntime.InferenceSession'):
+        self.session = session
+        model_input = session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_dtype = numpy.dtype(ONNX_TENSOR_TYPES.get(model_input.type, numpy.float32))
+        self.output_name = session.get_outputs()[0].name
+
+    def run(self, X) -> numpy.ndarray:
+        """Run the session on the input array and return the first output
+
+        Args:
+            X: The input array, a pandas.DataFrame or an array like object
+
+        Returns:
+            numpy.ndarray: The first output of the model
+        """
+        X = numpy.ascontiguousarray(numpy.asarray(X), dtype=self.input_dtype)
+        return self.session.run([self.output_name], {self.input_name: X})[0]
+
+    def predict(self, X) -> numpy.ndarray:
+        """Predict the values of the rows of the input like a sklearn model, a single output column is flattened
+
+        Args:
+            X: The input array with a row for each sample
+
+        Returns:
+            numpy.ndarray: The predicted values
+        """
+        prediction = self.run(X)
+        if prediction.ndim == 2 and prediction.shape[1] == 1:
+            return prediction.ravel()
+        return prediction
+
+    def __call__(self, X) -> numpy.ndarray:
+        return self.run(X)
+
+
+def load_onnx_model(filepath: str) -> OnnxModel:
+    """Create an ONNX Runtime inference session for a model file with the thread settings of the server
+
+    Args:
+        filepath (str): The path of the ONNX model file
+
+    Returns:
+        OnnxModel: The model that runs the inference session
+
+    """
+    import onnxruntime
+
+    options = onnxruntime.SessionOptions()
+    if UdfConfiguration.onnx_intra_op_threads:
+        options.intra_op_num_threads = int(UdfConfiguration.onnx_intra_op_threads)
+    if UdfConfiguration.onnx_inter_op_threads:
+        options.inter_op_num_threads = int(UdfConfiguration.onnx_inter_op_threads)
+    session = onnxruntime.InferenceSession(filepath, sess_options=options, providers=["CPUExecutionProvider"])
+    return OnnxModel(session)
+
+
+def load_model_file(framework: str, filepath: str):
+    """Load a machine learn model file without the model cache
+
+    Supported model:
+    - sklearn models that are created with sklearn.externals.joblib
+    - pytorch models that are created with torch.save
+    - onnx models that are run with an ONNX Runtime inference session, see OnnxModel
+
+    Args:
+        framework (str): The name of the framework
+        filepath (str): The path of the model file
+
+    Returns:
+        The loaded model or None if the framework is not supported
+
+    """
+    model = None
+    if framework.lower() in "sklearn":
+        from sklearn.externals import joblib
+        model = joblib.load(filepath)
+    if framework.lower() in "pytorch":
+        import torch
+        model = torch.load(filepath)
+    if framework.lower() == "onnx":
+        model = load_onnx_model(filepath)
+    return model
+
+
+def warmup_model(framework: str, model) -> bool:
+    """Run a synthetic prediction with a single sample of zeros, so that lazy initializations and just in time
+    compilations of the framework are done before the first request
+
+    The input shape is derived from the number of features or coefficients of sklearn models, the input of
+    onnx sessions and the first linear or convolution layer of pytorch modules.
+
+    Args:
+        framework (str): The name of the framework
+        model: The loaded machine learn model
+
+    Returns:
+        bool: True if a warmup prediction was run, False if the input shape of the model is unknown
+
+    >>> warmup_model("sklearn", object())
+    False
+
+    """
+    framework = framework.lower()
+    if framework == "onnx":
+        model_input = model.session.get_inputs()[0]
+        shape = [dim if isinstance(dim, int) and dim > 0 else 1 for dim in (model_input.shape or [1])]
+        model.run(numpy.zeros(shape, dtype=model.input_dtype))
+        return True
+    if framework in "pytorch":
+        import torch
+        if isinstance(model, type) or not callable(getattr(model, "modules", None)):
+            return False
+        for module in model.modules():
+            weight = getattr(module, "weight", None)
+            if getattr(module, "in_features", None):
+                shape = [1, module.in_features]
+            elif getattr(module, "in_channels", None) and weight is not None:
+                shape = [1, module.in_channels] + [16] * (weight.dim() - 2)
+            else:
+                continue
+            parameter = next(iter(model.parameters()), None)
+            inference_mode = getattr(torch, "inference_mode", torch.no_grad)
+            with inference_mode():
+                model(torch.zeros(shape, dtype=parameter.dtype if parameter is not None else torch.float32))
+            return True
+        return False
+    if framework in "sklearn":
+        features = getattr(model, "n_features_in_", None) or getattr(model, "n_features_", None)
+        if not features and getattr(model, "coef_", None) is not None:
+            # Linear models of older sklearn versions only provide the shape of their coefficients
+            features = numpy.shape(model.coef_)[-1]
+        if not features or not callable(getattr(model, "predict", None)):
+            return False
+        model.predict(numpy.zeros((1, int(features))))
+        return True
+    return False
+
+
+def load_cached_model(framework: str, filepath: str, md5_hash: Optional[str] = None):
+    """Load a machine learn model file with the process wide model cache
+
+    The model is loaded from the file if it is not in the cache. It is cached if its estimated memory
+    size fits into the budget of the process, see model_cache_budget(), the least recently used models are
+    evicted to make room for it. On a cache miss the models whose files were deleted or modified are removed
+    from the cache, so that worker processes release the models that were deleted from the storage by the
+    server. The cached model object is shared by all requests of the process, hence UDFs must not modify it.
+
+    Args:
+        framework (str): The name of the framework
+        filepath (str): The path of the model file
+        md5_hash (str): The md5 hash of the model in the machine learn storage
+
+    Returns:
+        The loaded model
+
+    """
+    key = model_cache_key(framework, filepath, md5_hash)
+    with _model_cache_lock:
+        if key in _model_cache:
+            _model_cache.move_to_end(key)
+            _model_cache_statistics["hits"] += 1
+            return _model_cache[key][0]
+        _model_cache_statistics["misses"] += 1
+        _evict_stale_models()
+
+    # The model is loaded outside of the lock, so that other models can be accessed in the meantime
+    model = load_model_file(framework, filepath)
+    budget = model_cache_budget()
+    if model is None or not budget:
+        return model
+    size = model_memory_size(model, filepath)
+    if size > budget:
+        return model
+
+    with _model_cache_lock:
+        if key in _model_cache:
+            return _model_cache[key][0]
+        while _model_cache and _model_cache_statistics["memory"] + size > budget:
+            _, (_, evicted_size, _) = _model_cache.popitem(last=False)
+            _model_cache_statistics["memory"] -= evicted_size
+            _model_cache_statistics["evictions"] += 1
+        _model_cache[key] = (model, size, filepath)
+        _model_cache_statistics["memory"] += size
+    return model
+
+
+def _evict_stale_models():
+    """Remove the models whose files were deleted or modified from the model cache, the lock must be held"""
+    for key, (_, size, filepath) in list(_model_cache.items()):
+        try:
+            current_key = model_cache_key(key[0], filepath, key[2] if key[1] == "md5" else None)
+        except OSError:
+            current_key = None
+        if current_key != key:
+            del _model_cache[key]
+            _model_cache_statistics["memory"] -= size
+
+
+def model_cache_info() -> Dict:
+    """Return the statistics of the model cache
+
+    Returns:
+        dict: The number of cache hits, misses and evictions, the number of cached models,
+        their estimated memory size and the memory budget in bytes
+
+    """
+    with _model_cache_lock:
+        return {"hits": _model_cache_statistics["hits"],
+                "misses": _model_cache_statistics["misses"],
+                "evictions": _model_cache_statistics["evictions"],
+                "size": len(_model_cache),
+                "memory": _model_cache_statistics["memory"],
+                "memory_budget": model_cache_budget()}
+
+
+def evict_cached_model(md5_hash: str):
+    """Remove the model with the md5 hash from the model cache
+
+    Args:
+        md5_hash (str): The md5 hash of the model in the machine learn storage
+
+    """
+    with _model_cache_lock:
+        for key in [key for key in _model_cache if key[1] == "md5" and key[2] == md5_hash]:
+            _model_cache_statistics["memory"] -= _model_cache.pop(key)[1]
+
+
+def clear_model_cache():
+    """Remove all models from the model cache and reset its statistics"""
+    with _model_cache_lock:
+        _model_cache.clear()
+        _model_cache_statistics.update(hits=0, misses=0, evictions=0, memory=0)
+
+
 class MachineLearnModelConfig:
     """This class represents a machine learn model. The model will be loaded
-    at construction, based on the machine learn framework.
+    on the first call of get_model(), based on the machine learn framework, hence
+    the configuration can be created and pickled without loading the model.
+    Loaded models are kept in a process wide cache, see load_cached_model().
 
     The following frameworks are supported:
         - sklearn models that are created with sklearn.externals.joblib
         - pytorch models that are created with torch.save
+        - onnx models that are run with ONNX Runtime, the inference sessions are cached like all other models
 
     >>> from sklearn.ensemble import RandomForestRegressor
     >>> from sklearn.externals import joblib
@@ -78,7 +444,7 @@ class MachineLearnModelConfig:
         """The constructor to create a machine learn model object
 
         Args:
-            framework: The name of the framework, pytroch and sklearn are supported
+            framework: The name of the framework, pytroch, sklearn and onnx are supported
             name: The name of the model
             description: The description of the model
             path: The path to the pre-trained machine learn model that should be applied
@@ -90,7 +456,15 @@ class MachineLearnModelConfig:
         self.path = path
         self.md5_hash = md5_hash
         self.model = None
-        self.load_model()
+        filepath = self.model_path()
+        if not os.path.isfile(filepath):
+            raise Exception(f"Unable to find the specified machine learn model at path {filepath}")
+
+    def model_path(self) -> str:
+        """Return the path of the model file in the machine learn storage or the path of the model"""
+        if self.md5_hash is not None:
+            return os.path.join(UdfConfiguration.machine_learn_storage_path, self.md5_hash)
+        return self.path
 
     def load_model(self):
         """Load the machine learn model from the path or md5 hash.
@@ -98,29 +472,31 @@ class MachineLearnModelConfig:
         Supported model:
         - sklearn models that are created with sklearn.externals.joblib
         - pytorch models that are created with torch.save
+        - onnx models that are run with an ONNX Runtime inference session
 
         """
-
-        if self.md5_hash is not None:
-            filepath = os.path.join(UdfConfiguration.machine_learn_storage_path, self.md5_hash)
-        else:
-            filepath = self.path
-
+        filepath = self.model_path()
         if os.path.exists(filepath) and os.path.isfile(filepath):
-            if self.framework.lower() in "sklearn":
-                from sklearn.externals import joblib
-                self.model = joblib.load(filepath)
-            if self.framework.lower() in "pytorch":
-                import torch
-                self.model = torch.load(filepath)
+            self.model = load_cached_model(self.framework, filepath, self.md5_hash)
         else:
             raise Exception(f"Unable to find the specified machine learn model at path {filepath}")
 
+    def __getstate__(self) -> Dict:
+        # The model is not pickled, worker processes load it from their own model cache
+        state = dict(self.__dict__)
+        state["model"] = None
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+
     def get_model(self):
-        """Get the loaded machine learn model. This function will return None if the model was not loaded
+        """Get the machine learn model, it is loaded on the first call
 
         :return: the loaded model
         """
+        if self.model is None:
+            self.load_model()
         return self.model
 
     def to_dict(self) -> Dict:
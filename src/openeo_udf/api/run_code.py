@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 """OpenEO Python UDF interface"""
-import functools
+import hashlib
+import importlib
+import time
+import threading
+from collections import OrderedDict
 from pprint import pprint
 
 import xarray
@@ -10,7 +14,7 @@ import geopandas
 import shapely
 from copy import deepcopy
 import math
-from typing import Dict
+from typing import Callable, Dict, List, Optional, Tuple
 from inspect import signature
 
 from openeo_udf.api.feature_collection import FeatureCollection
@@ -19,6 +23,9 @@ from openeo_udf.api.machine_learn_model import MachineLearnModelConfig
 from openeo_udf.api.spatial_extent import SpatialExtent
 from openeo_udf.api.structured_data import StructuredData
 from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.binary_array import LIST_ARRAY_ENCODING
+from openeo_udf.api.tiling import tiling_options, apply_datacube_tiled
+from openeo_udf.server.config import UdfConfiguration
 
 __license__ = "Apache License, Version 2.0"
 __author__ = "Soeren Gebbert"
@@ -43,23 +50,58 @@ def run_udf_model_user_code(udf_model: 'openeo_udf.server.data_model.udf_schemas
     return result_data
 
 
-def run_legacy_user_code(dict_data: Dict) -> Dict:
+def run_legacy_user_code(dict_data: Dict, array_encoding: Optional[str] = None) -> Dict:
     """Run the user defined python code on legacy data
 
     Args:
         dict_data: the udf request object with code and legacy data organized in a dictionary
+        array_encoding: The array encoding of the result data cubes, if not set the "array_encoding"
+                        entry of the server context or nested lists are used
 
     Returns:
 
     """
     code = dict_data["code"]["source"]
     data = UdfData.from_dict(dict_data["data"])
+    if array_encoding is None:
+        # The server context may request typed binary arrays instead of nested lists for the result cubes
+        array_encoding = data.server_context.get("array_encoding", LIST_ARRAY_ENCODING)
     result_data = run_user_code(code, data)
 
-    return result_data.to_dict()
+    return result_data.to_dict(array_encoding=array_encoding)
 
 
-def _build_default_execution_context():
+# The optional frameworks that can be preloaded into the base execution context, the first module is added
+# to the context, the remaining modules are only imported
+FRAMEWORK_MODULES = {"torch": ["torch", "torchvision"],
+                     "tensorflow": ["tensorflow", "tensorboard"]}
+
+# The base execution context is built once and copied into the namespace of each new UDF module
+_base_execution_context: Optional[Dict] = None
+_execution_context_statistics: Dict = {}
+_execution_context_lock = threading.Lock()
+
+
+def build_base_execution_context(frameworks: Optional[List[str]] = None) -> Dict:
+    """Build the base execution context of the UDF modules and import the optional frameworks
+
+    This function should be called once at server startup, the import time of each framework is
+    recorded in the execution context statistics.
+
+    Args:
+        frameworks (list): The names of the optional frameworks that should be imported, like "torch" and
+                           "tensorflow". UdfConfiguration.preload_frameworks is used if not provided.
+
+    Returns:
+        dict: The base execution context
+
+    """
+    global _base_execution_context
+
+    if frameworks is None:
+        frameworks = UdfConfiguration.preload_frameworks
+
+    start = time.perf_counter()
     context = {
         'numpy': numpy,
         'xarray': xarray,
@@ -74,36 +116,111 @@ def _build_default_execution_context():
         'DataCube': DataCube,
         'UdfData': UdfData
     }
-    try:
-        import torch
-        context['torch'] = torch
-        import torchvision
-    except ImportError as e:
-        print('torch not available')
-    try:
-        import tensorflow
-        context['tensorflow'] = tensorflow
-        import tensorboard
-    except ImportError as e:
-        print('tensorflow not available')
 
+    imports = {}
+    for framework in frameworks:
+        if framework not in FRAMEWORK_MODULES:
+            raise Exception(f"Unknown framework {framework}, supported are {list(FRAMEWORK_MODULES)}")
+        framework_start = time.perf_counter()
+        try:
+            modules = [importlib.import_module(name) for name in FRAMEWORK_MODULES[framework]]
+            context[framework] = modules[0]
+            imports[framework] = {"available": True, "import_time": time.perf_counter() - framework_start}
+        except ImportError as e:
+            imports[framework] = {"available": False, "import_time": time.perf_counter() - framework_start,
+                                  "error": str(e)}
+
+    with _execution_context_lock:
+        _base_execution_context = context
+        _execution_context_statistics.clear()
+        _execution_context_statistics.update({"frameworks": imports, "build_time": time.perf_counter() - start})
     return context
 
 
-@functools.lru_cache(maxsize=100)
-def load_module_from_string(code:str):
+def execution_context_info() -> Dict:
+    """Return the statistics of the base execution context
+
+    Returns:
+        dict: The build time of the base execution context and the availability and the import time of
+        each preloaded framework, empty if the context was not built yet
+
     """
-    Experimental: avoid loading same UDF module more than once, to make caching inside the udf work.
-    @param code:
-    @return:
+    with _execution_context_lock:
+        return deepcopy(_execution_context_statistics)
+
+
+def _build_default_execution_context():
+    # The frameworks are only imported once, every UDF module gets a shallow copy of the base context
+    context = _base_execution_context
+    if context is None:
+        context = build_base_execution_context()
+    return dict(context)
+
+
+# The types of the entry points of a UDF module
+TIMESERIES_ENTRY_POINT = "apply_timeseries"
+TIMESERIES_BLOCK_ENTRY_POINT = "apply_timeseries_block"
+DATACUBE_ENTRY_POINT = "apply_datacube"
+UDF_DATA_ENTRY_POINT = "udf_data"
+
+
+class CompiledUdf:
+    """The executed module of a UDF source and its resolved entry point
+
+    Args:
+        module (dict): The module namespace that was created by executing the UDF source
+        entry_point (callable): The entry point function of the UDF or None if no entry point was found
+        entry_point_type (str): The type of the entry point "apply_timeseries", "apply_timeseries_block",
+                                "apply_datacube" or "udf_data"
+
     """
-    module = _build_default_execution_context()
-    exec(code, module)
-    return module
 
-def run_user_code(code:str, data:UdfData) -> UdfData:
-    module = load_module_from_string(code)
+    def __init__(self, module: Dict, entry_point: Optional[Callable] = None, entry_point_type: Optional[str] = None):
+        self.module = module
+        self.entry_point = entry_point
+        self.entry_point_type = entry_point_type
+
+
+# The compiled UDF modules are cached by the hash of their source in least recently used order
+_code_cache: "OrderedDict[str, CompiledUdf]" = OrderedDict()
+_code_cache_statistics = {"hits": 0, "misses": 0}
+_code_cache_lock = threading.Lock()
+
+
+def code_hash(code: str) -> str:
+    """Compute the hash of a UDF source that is used as key of the code cache
+
+    Args:
+        code (str): The UDF source
+
+    Returns:
+        str: The hex digest of the SHA-256 hash of the source
+
+    >>> code_hash("x = 1")[:16]
+    '8ff436def1451285'
 
+    """
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def resolve_entry_point(module: Dict) -> Tuple[Optional[Callable], Optional[str]]:
+    """Find the entry point of a UDF module by the names and the annotations of its functions
+
+    Args:
+        module (dict): The module namespace of the UDF
+
+    Returns:
+        tuple: The entry point function and its type, or (None, None) if the module has no entry point
+
+    >>> from pandas import Series
+    >>> def apply_timeseries(series: Series, context: Dict) -> Series:
+    ...     return series
+    >>> resolve_entry_point({"apply_timeseries": apply_timeseries})[1]
+    'apply_timeseries'
+    >>> resolve_entry_point({"x": 1})
+    (None, None)
+
+    """
     functions = {t[0]:t[1] for t in module.items() if callable(t[1])}
 
     for func in functions.items():
@@ -116,21 +233,112 @@ def run_user_code(code:str, data:UdfData) -> UdfData:
         if(func[0] == 'apply_timeseries' and 'series' in params and 'context' in params and 'pandas.core.series.Series'
                 in str(params['series'].annotation) and 'pandas.core.series.Series' in str(sig.return_annotation) ):
             #this is a UDF that transforms pandas series
-            from .udf_wrapper import apply_timeseries_generic
-            return apply_timeseries_generic(data, func[1])
+            return func[1], TIMESERIES_ENTRY_POINT
+        elif(func[0] == 'apply_timeseries_block' and 'frame' in params and 'context' in params and 'pandas.core.frame.DataFrame'
+                in str(params['frame'].annotation) and 'pandas.core.frame.DataFrame' in str(sig.return_annotation) ):
+            #this is a UDF that transforms blocks of pandas series
+            return func[1], TIMESERIES_BLOCK_ENTRY_POINT
         elif( (func[0] == 'apply_hypercube' or func[0] == 'apply_datacube' )  and 'cube' in params and 'context' in params and 'openeo_udf.api.datacube.DataCube'
               in str(params['cube'].annotation) and 'openeo_udf.api.datacube.DataCube' in str(sig.return_annotation) ):
             #found a datacube mapping function
-            if len(data.get_datacube_list()) != 1:
-                raise ValueError("The provided UDF expects exactly one datacube, but only: %s were provided." % len(data.get_datacube_list()))
-            result_cube = func[1](data.get_datacube_list()[0], data.user_context)
-            if not isinstance(result_cube,DataCube):
-                raise ValueError("The provided UDF did not return a DataCube, but got: %s" %result_cube)
-            data.set_datacube_list([result_cube])
-            break
+            return func[1], DATACUBE_ENTRY_POINT
         elif len(params_list) == 1 and (params_list[0].annotation == 'openeo_udf.api.udf_data.UdfData' or params_list[0].annotation == UdfData) :
             #found a generic UDF function
-            func[1](data)
-            break
+            return func[1], UDF_DATA_ENTRY_POINT
+
+    return None, None
+
+
+def compile_user_code(code: str) -> CompiledUdf:
+    """Execute the UDF source and resolve its entry point, the result is cached by the hash of the source
+
+    The same UDF source is executed only once as long as it is in the cache, hence module level
+    state of the UDF, like loaded models, is kept between calls.
+
+    Args:
+        code (str): The UDF source
+
+    Returns:
+        CompiledUdf: The compiled UDF with module and entry point
+
+    """
+    key = code_hash(code)
+    with _code_cache_lock:
+        compiled = _code_cache.get(key)
+        if compiled is not None:
+            _code_cache.move_to_end(key)
+            _code_cache_statistics["hits"] += 1
+            return compiled
+        _code_cache_statistics["misses"] += 1
+
+    module = _build_default_execution_context()
+    exec(code, module)
+    entry_point, entry_point_type = resolve_entry_point(module)
+    compiled = CompiledUdf(module=module, entry_point=entry_point, entry_point_type=entry_point_type)
+
+    with _code_cache_lock:
+        # A concurrent call may have compiled the same source, the first cached module is kept
+        compiled = _code_cache.setdefault(key, compiled)
+        while len(_code_cache) > UdfConfiguration.code_cache_size:
+            _code_cache.popitem(last=False)
+    return compiled
+
+
+def code_cache_info() -> Dict:
+    """Return the statistics of the compiled UDF cache
+
+    Returns:
+        dict: The number of cache hits and misses, the current and the maximum number of cached modules
+
+    """
+    with _code_cache_lock:
+        return {"hits": _code_cache_statistics["hits"],
+                "misses": _code_cache_statistics["misses"],
+                "size": len(_code_cache),
+                "max_size": UdfConfiguration.code_cache_size}
+
+
+def clear_code_cache():
+    """Remove all compiled UDF modules from the cache and reset the statistics"""
+    with _code_cache_lock:
+        _code_cache.clear()
+        _code_cache_statistics["hits"] = 0
+        _code_cache_statistics["misses"] = 0
+
+
+def load_module_from_string(code:str):
+    """
+    Experimental: avoid loading same UDF module more than once, to make caching inside the udf work.
+    @param code:
+    @return:
+    """
+    return compile_user_code(code).module
+
+def run_user_code(code:str, data:UdfData) -> UdfData:
+    compiled = compile_user_code(code)
+
+    if compiled.entry_point_type in (TIMESERIES_ENTRY_POINT, TIMESERIES_BLOCK_ENTRY_POINT):
+        #this is a UDF that transforms pandas series or blocks of pandas series
+        from .udf_wrapper import apply_timeseries_generic
+        data = apply_timeseries_generic(data, compiled.entry_point)
+    elif compiled.entry_point_type == DATACUBE_ENTRY_POINT:
+        #found a datacube mapping function
+        if len(data.get_datacube_list()) != 1:
+            raise ValueError("The provided UDF expects exactly one datacube, but only: %s were provided." % len(data.get_datacube_list()))
+        # The data cube is split into spatial tiles if tiling is enabled by the server context or the UDF module
+        tiling = tiling_options(data.server_context, compiled.module)
+        if tiling is not None:
+            result_cube = apply_datacube_tiled(compiled.entry_point, data.get_datacube_list()[0], data.user_context,
+                                               **tiling)
+        else:
+            result_cube = compiled.entry_point(data.get_datacube_list()[0], data.user_context)
+        if not isinstance(result_cube,DataCube):
+            raise ValueError("The provided UDF did not return a DataCube, but got: %s" %result_cube)
+        data.set_datacube_list([result_cube])
+    elif compiled.entry_point_type == UDF_DATA_ENTRY_POINT:
+        #found a generic UDF function
+        compiled.entry_point(data)
 
+    # Dask backed data cubes are computed in a single computation after the UDF built the task graph
+    data.compute()
     return data
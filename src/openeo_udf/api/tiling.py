@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""OpenEO Python UDF interface"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy
+import xarray
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.server.tools import process_cpu_count
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+Spatial tiling of data cubes for apply_datacube UDFs.
+
+The data cube is split along the spatial dimensions x and y into tiles. Each tile is extended by an
+overlap halo on all sides, so that UDFs with neighbourhood operations like filters compute correct values at the
+tile borders. The UDF is applied to the tiles in parallel threads, the halos are trimmed from the result tiles and
+the result tiles are assembled into the result data cube.
+
+The tiling is enabled by the "tiling" entry of the server context or by the UDF_TILING variable of the UDF
+module, the server context has precedence:
+
+    {"tile_size": 256, "overlap": 8, "workers": 4}
+
+The tile size and the overlap can be set per spatial dimension, like {"tile_size": {"x": 512, "y": 256}}.
+The UDF must keep the x and y dimensions of the tiles, all other dimensions can be changed.
+"""
+
+TILING_DIMENSIONS = ("y", "x")
+TILING_VARIABLE = "UDF_TILING"
+
+
+def tile_ranges(size: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """Compute the tile ranges of a dimension
+
+    Args:
+        size (int): The size of the dimension
+        tile_size (int): The size of the tiles without the halo
+        overlap (int): The size of the halo on each side of a tile
+
+    Returns:
+        list: Tuples with the start and end of each tile and the start and end of each tile with halo
+
+    >>> tile_ranges(10, 4, 1)
+    [(0, 4, 0, 5), (4, 8, 3, 9), (8, 10, 7, 10)]
+    >>> tile_ranges(3, 4, 2)
+    [(0, 3, 0, 3)]
+
+    """
+    if tile_size < 1 or overlap < 0:
+        raise Exception(f"Invalid tile size {tile_size} or overlap {overlap}")
+
+    ranges = []
+    for start in range(0, size, tile_size):
+        end = min(start + tile_size, size)
+        ranges.append((start, end, max(0, start - overlap), min(size, end + overlap)))
+    return ranges
+
+
+def _per_dimension(value: Union[int, Dict[str, int]], name: str) -> Dict[str, int]:
+    if isinstance(value, dict):
+        if set(value) - set(TILING_DIMENSIONS):
+            raise Exception(f"The {name} of the tiling supports only the dimensions {list(TILING_DIMENSIONS)}")
+        return {dim: int(value[dim]) for dim in TILING_DIMENSIONS if dim in value}
+    return {dim: int(value) for dim in TILING_DIMENSIONS}
+
+
+def tiling_options(server_context: Optional[Dict], module: Optional[Dict] = None) -> Optional[Dict]:
+    """Get the tiling options from the server context or the UDF_TILING variable of the UDF module
+
+    Args:
+        server_context (dict): The server context of the UDF data
+        module (dict): The module namespace of the UDF
+
+    Returns:
+        dict: The tile size and the overlap of each spatial dimension and the number of worker threads,
+        or None if the tiling is not enabled
+
+    >>> tiling_options({"tiling": {"tile_size": 256, "overlap": 8}})["overlap"]
+    {'y': 8, 'x': 8}
+    >>> tiling_options({}, {"UDF_TILING": {"tile_size": {"x": 128}}})["tile_size"]
+    {'x': 128}
+    >>> tiling_options({"tiling": None}, {"UDF_TILING": {"tile_size": 128}}) is None
+    True
+
+    """
+    server_context = server_context or {}
+    if "tiling" in server_context:
+        options = server_context["tiling"]
+    else:
+        options = (module or {}).get(TILING_VARIABLE)
+    if not options:
+        return None
+    if "tile_size" not in options:
+        raise Exception("The tiling options require the tile_size entry")
+
+    return {"tile_size": _per_dimension(options["tile_size"], "tile size"),
+            "overlap": _per_dimension(options.get("overlap", 0), "overlap"),
+            "workers": options.get("workers")}
+
+
+def apply_datacube_tiled(function: Callable[[DataCube, Dict], DataCube], cube: DataCube, context: Dict,
+                         tile_size: Dict[str, int], overlap: Optional[Dict[str, int]] = None,
+                         workers: Optional[int] = None) -> DataCube:
+    """Apply a data cube function to the spatial tiles of a data cube in parallel threads
+
+    Args:
+        function: The apply_datacube function of the UDF
+        cube (DataCube): The data cube
+        context (dict): The user context that is passed to the function
+        tile_size (dict): The tile size of the spatial dimensions x and y
+        overlap (dict): The size of the halo of the spatial dimensions x and y
+        workers (int): The number of worker threads, if not set the number of CPUs divided by the number
+                       of worker processes of the server
+
+    Returns:
+        DataCube: The assembled result data cube
+
+    >>> from openeo_udf.api.tools import create_datacube
+    >>> cube = create_datacube(name="temp", value=1, dims=("t", "y", "x"), shape=(2, 5, 7))
+    >>> def shift(cube, context):
+    ...     array = cube.array.shift(x=1, fill_value=0)
+    ...     array.name = cube.id
+    ...     return DataCube(array=array)
+    >>> tiled = apply_datacube_tiled(shift, cube, {}, tile_size={"x": 3, "y": 2}, overlap={"x": 1, "y": 0})
+    >>> tiled.array.equals(shift(cube, {}).array)
+    True
+
+    """
+    overlap = overlap or {}
+    array = cube.array
+    dims = [dim for dim in TILING_DIMENSIONS if dim in array.dims and dim in tile_size]
+    if not dims:
+        return function(cube, context)
+
+    ranges = {dim: tile_ranges(array.sizes[dim], tile_size[dim], overlap.get(dim, 0)) for dim in dims}
+    tiles = [{}]
+    for dim in dims:
+        tiles = [dict(tile, **{dim: r}) for tile in tiles for r in ranges[dim]]
+    if len(tiles) == 1:
+        return function(cube, context)
+
+    def process(tile: Dict[str, Tuple[int, int, int, int]]) -> xarray.DataArray:
+        outer = {dim: slice(r[2], r[3]) for dim, r in tile.items()}
+        result = function(DataCube(array=array.isel(outer)), context)
+        if not isinstance(result, DataCube):
+            raise ValueError("The provided UDF did not return a DataCube, but got: %s" % result)
+        result_array = result.array
+        for dim, r in tile.items():
+            if result_array.sizes.get(dim) != r[3] - r[2]:
+                raise Exception(f"The UDF must keep the size of the dimension {dim} when the data cube is tiled")
+        # Trim the halo
+        return result_array.isel({dim: slice(r[0] - r[2], r[1] - r[2]) for dim, r in tile.items()})
+
+    if workers is None:
+        workers = process_cpu_count()
+
+    result = None
+    values = None
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for tile, tile_result in zip(tiles, executor.map(process, tiles)):
+            if values is None:
+                result = tile_result
+                shape = [array.sizes[dim] if dim in tile else tile_result.sizes[dim] for dim in tile_result.dims]
+                values = numpy.empty(shape, dtype=tile_result.dtype)
+            index = tuple(slice(tile[dim][0], tile[dim][1]) if dim in tile else slice(None)
+                          for dim in result.dims)
+            values[index] = tile_result.transpose(*result.dims).values
+
+    coords = {name: coord.variable for name, coord in result.coords.items() if not set(coord.dims) & set(dims)}
+    # The spatial coordinates are taken from the input data cube
+    for name, coord in array.coords.items():
+        if set(coord.dims) & set(dims) and set(coord.dims) <= set(result.dims):
+            coords[name] = coord.variable
+    result_array = xarray.DataArray(values, dims=result.dims, coords=coords, name=result.name, attrs=result.attrs)
+    return DataCube(array=result_array)
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -9,6 +9,8 @@ from openeo_udf.api.datacube import DataCube
 from openeo_udf.api.machine_learn_model import MachineLearnModelConfig
 from openeo_udf.api.spatial_extent import SpatialExtent
 from openeo_udf.api.structured_data import StructuredData
+from openeo_udf.api.binary_array import LIST_ARRAY_ENCODING
+from openeo_udf.server.data_model.udf_schemas import UdfDataModel
 
 
 __license__ = "Apache License, Version 2.0"
@@ -100,15 +102,15 @@ class UdfData:
     >>> udf_data.server_context
     {'reduction_dimension': 't'}
     >>> print(udf_data.get_datacube_by_id("testdata").to_dict())
-    {'id': 'testdata', 'data': [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], 'dimensions': [{'name': 'x', 'coordinates': [1, 2]}, {'name': 'y', 'coordinates': [1, 2, 3]}], 'description': 'This is an xarray with two dimensions'}
+    {'id': 'testdata', 'data': [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], 'dimensions': [{'name': 'x', 'coordinates': [1, 2]}, {'name': 'y', 'coordinates': [1, 2, 3]}], 'dtype': 'float64', 'description': 'This is an xarray with two dimensions'}
     >>> json.dumps(udf_data.to_dict()) # doctest: +ELLIPSIS
     ...                           # doctest: +NORMALIZE_WHITESPACE
-    '{"proj": {"EPSG": 4326}, "user_context": {"kernel": 3}, "server_context": {"reduction_dimension": "t"}, "datacubes": [{"id": "testdata", "data": [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], "dimensions": [{"name": "x", "coordinates": [1, 2]}, {"name": "y", "coordinates": [1, 2, 3]}], "description": "This is an xarray with two dimensions"}], "feature_collection_list": [], "structured_data_list": [], "machine_learn_models": []}'
+    '{"proj": {"EPSG": 4326}, "user_context": {"kernel": 3}, "server_context": {"reduction_dimension": "t"}, "datacubes": [{"id": "testdata", "data": [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], "dimensions": [{"name": "x", "coordinates": [1, 2]}, {"name": "y", "coordinates": [1, 2, 3]}], "dtype": "float64", "description": "This is an xarray with two dimensions"}], "feature_collection_list": [], "structured_data_list": [], "machine_learn_models": []}'
 
     >>> udf = UdfData.from_dict(udf_data.to_dict())
     >>> json.dumps(udf.to_dict()) # doctest: +ELLIPSIS
     ...                           # doctest: +NORMALIZE_WHITESPACE
-    '{"proj": {"EPSG": 4326}, "user_context": {}, "server_context": {}, "datacubes": [{"id": "testdata", "data": [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], "dimensions": [{"name": "x", "coordinates": [1, 2]}, {"name": "y", "coordinates": [1, 2, 3]}], "description": "This is an xarray with two dimensions"}], "feature_collection_list": [], "structured_data_list": [], "machine_learn_models": []}'
+    '{"proj": {"EPSG": 4326}, "user_context": {}, "server_context": {}, "datacubes": [{"id": "testdata", "data": [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], "dimensions": [{"name": "x", "coordinates": [1, 2]}, {"name": "y", "coordinates": [1, 2, 3]}], "dtype": "float64", "description": "This is an xarray with two dimensions"}], "feature_collection_list": [], "structured_data_list": [], "machine_learn_models": []}'
 
     """
 
@@ -181,6 +183,32 @@ class UdfData:
         """Return the server context"""
         self._server_context = context
 
+    def dask_options(self) -> Dict:
+        """Return the dask options of the server context
+
+        The "dask" entry of the server context enables dask backed data cubes, that are computed lazily
+        and in parallel chunks:
+
+            {"dask": {"chunks": {"t": 1, "y": 256, "x": 256}, "scheduler": "threads"}}
+
+        Returns:
+            dict: The chunk sizes of the data cubes and the dask scheduler, an empty dictionary if not set
+
+        """
+        options = self._server_context.get("dask") if self._server_context else None
+        return options or {}
+
+    def compute(self, scheduler: Optional[str] = None):
+        """Compute all lazy dask backed data cubes in a single computation
+
+        Args:
+            scheduler (str): The dask scheduler, the scheduler of the server context is used if not set
+
+        """
+        if scheduler is None:
+            scheduler = self.dask_options().get("scheduler")
+        DataCube.compute_datacubes(self.get_datacube_list() or [], scheduler=scheduler)
+
     def get_datacube_by_id(self, id: str) -> Optional[DataCube]:
         """Get a datacube by its id
 
@@ -375,10 +403,15 @@ class UdfData:
         """
         self._ml_model_list.append(machine_learn_model)
 
-    def to_dict(self) -> Dict:
+    def to_dict(self, array_encoding: str = LIST_ARRAY_ENCODING) -> Dict:
         """Convert this UdfData object into a dictionary that can be converted into
         a valid JSON representation
 
+        Args:
+            array_encoding (str): The encoding of the data cube arrays, either "list" for nested lists,
+                                  "binary" for typed binary arrays with base64 encoded raw buffer or "numpy"
+                                  to keep numpy arrays and time stamps for binary serializers like message pack
+
         Returns:
             dict:
             UdfData object as a dictionary
@@ -389,13 +422,13 @@ class UdfData:
         if self._datacube_list is not None:
             l = []
             for datacube in self._datacube_list:
-                l.append(datacube.to_dict())
+                l.append(datacube.to_dict(array_encoding=array_encoding))
             d["datacubes"] = l
 
         if self._feature_tile_list is not None:
             l = []
             for tile in self._feature_tile_list:
-                l.append(tile.to_dict())
+                l.append(tile.to_dict(array_encoding=array_encoding))
             d["feature_collection_list"] = l
 
         if self._structured_data_list is not None:
@@ -439,8 +472,9 @@ class UdfData:
 
         if "datacubes" in udf_dict:
             l = udf_dict["datacubes"]
+            chunks = udf_data.dask_options().get("chunks")
             for entry in l:
-                h = DataCube.from_dict(entry)
+                h = DataCube.from_dict(entry, chunks=chunks)
                 udf_data.append_datacube(h)
 
         if "feature_collection_list" in udf_dict:
@@ -463,14 +497,38 @@ class UdfData:
 
         return udf_data
 
+    def to_udf_data_model(self, array_encoding: str = LIST_ARRAY_ENCODING) -> UdfDataModel:
+        """Convert this UdfData object into a UDF data model, the data cubes are stored in a data collection
+
+        Args:
+            array_encoding (str): "binary" to store the data cube values as typed binary arrays, otherwise the values
+                                  are kept as numpy arrays that must be converted by the serializer
+
+        Returns:
+            UdfDataModel:
+            The UDF data model
+
+        """
+        data_collection = DataCube.to_data_collection(self.get_datacube_list() or [], array_encoding=array_encoding)
+        structured_data_list = [sd.to_dict() for sd in self.get_structured_data_list() or []]
+        machine_learn_models = [m.to_dict() for m in self.get_ml_model_list() or []]
+
+        return UdfDataModel(user_context=self.user_context, server_context=self.server_context,
+                            data_collection=data_collection, structured_data_list=structured_data_list,
+                            machine_learn_models=machine_learn_models)
+
     @staticmethod
-    def from_udf_data_model(udf_model: 'openeo_udf.server.data_model.udf_schemas.UdfDataModel') -> 'UdfData':
-        """TODO: Must be implemented
+    def from_udf_data_model(udf_model: 'openeo_udf.server.data_model.udf_schemas.UdfDataModel',
+                            machine_learn_models: Optional[List[MachineLearnModelConfig]] = None) -> 'UdfData':
+        """Create a UdfData object from a UDF data model
 
         Args:
-            udf_model:
+            udf_model: The UDF data model
+            machine_learn_models: Already loaded machine learn models that are used instead of loading the
+                                  machine learn models of the UDF data model again
 
         Returns:
+            UdfData: The UDF data object
 
         """
 
@@ -479,12 +537,13 @@ class UdfData:
         udf_data.server_context = udf_model.server_context
         udf_data.user_context = udf_model.user_context
         for d in udf_model.structured_data_list:
-            sd = StructuredData.from_dict(d)
+            sd = StructuredData.from_dict(d.dict())
             udf_data.append_structured_data(sd)
-        for m in udf_model.machine_learn_models:
-            mlm = MachineLearnModelConfig.from_dict(m.dict())
+        if machine_learn_models is None:
+            machine_learn_models = [MachineLearnModelConfig.from_dict(m.dict()) for m in udf_model.machine_learn_models]
+        for mlm in machine_learn_models:
             udf_data.append_machine_learn_model(mlm)
-        cubes = DataCube.from_data_collection(udf_model.data_collection)
+        cubes = DataCube.from_data_collection(udf_model.data_collection, chunks=udf_data.dask_options().get("chunks"))
         udf_data.set_datacube_list(cubes)
 
         return udf_data
@@ -25,6 +25,16 @@ def apply_timeseries(series: Series,context:Dict)-> Series:
     pass
 
 
+def apply_timeseries_block(frame: DataFrame, context: Dict) -> DataFrame:
+    """
+    Process the time series of all pixels of a data cube at once, without changing the time instants.
+    This is the vectorized variant of apply_timeseries, that is called once for each data cube.
+
+    :param frame: A Pandas DataFrame with the time instants as index and the time series of a pixel in each column.
+    :param context: A dictionary containing user context.
+    :return: A Pandas DataFrame with the same index and the same columns.
+    """
+    pass
 
 
 def apply_datacube(cube: DataCube,context:Dict)-> DataCube:
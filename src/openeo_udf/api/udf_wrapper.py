@@ -1,10 +1,19 @@
 from openeo_udf.api.datacube import DataCube
 from openeo_udf.api.udf_data import UdfData
-from typing import Dict, Callable
+from typing import Dict, Callable, List, Optional, Tuple
+from inspect import signature
+import multiprocessing
+import mmap
 import xarray
 import numpy
 import pandas
-from pandas import Series
+from pandas import Series, DataFrame
+
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.tools import process_cpu_count
+
+# The dimension that is used as time axis of the time series, the first dimension is used if a cube has no time dimension
+TIME_DIMENSION = "t"
 
 
 def apply_timeseries(series: Series, context:Dict)->Series:
@@ -16,37 +25,227 @@ def apply_timeseries(series: Series, context:Dict)->Series:
     """
     return series
 
-def apply_timeseries_generic(udf_data: UdfData, callback: Callable = apply_timeseries):
+
+def is_timeseries_block_callback(callback: Callable) -> bool:
+    """
+    Check if a time series callback processes blocks of time series, hence its first parameter is annotated
+    as pandas DataFrame.
+
+    :param callback: The time series callback
+    :return: True if the callback expects a DataFrame with a time series in each column
+    """
+    try:
+        params = list(signature(callback).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    return len(params) > 0 and (params[0].annotation is DataFrame or
+                                'pandas.core.frame.DataFrame' in str(params[0].annotation))
+
+
+def _timeseries_dimensions(array: xarray.DataArray) -> Tuple[str, List[str]]:
+    time_dim = TIME_DIMENSION if TIME_DIMENSION in array.dims else array.dims[0]
+    return time_dim, [dim for dim in array.dims if dim != time_dim]
+
+
+def _timeseries_index(array: xarray.DataArray, time_dim: str) -> Optional[pandas.Index]:
+    return array.indexes[time_dim] if time_dim in array.coords else None
+
+
+def datacube_to_timeseries_block(cube: DataCube) -> DataFrame:
+    """
+    Convert a data cube into a DataFrame with the time coordinates as index and a column for each pixel.
+    The pixels are the flattened positions of all other dimensions in the order of the cube dimensions.
+
+    >>> from openeo_udf.api.tools import create_datacube
+    >>> cube = create_datacube(name="temp", value=1, dims=("t", "y", "x"), shape=(3, 2, 2))
+    >>> datacube_to_timeseries_block(cube).shape
+    (3, 4)
+
+    :param cube: The data cube
+    :return: The block of time series
+    """
+    array = cube.array
+    time_dim, other_dims = _timeseries_dimensions(array)
+    values = array.transpose(time_dim, *other_dims).values.reshape((array.sizes[time_dim], -1))
+    return DataFrame(values, index=_timeseries_index(array, time_dim))
+
+
+def timeseries_block_to_datacube(block: DataFrame, cube: DataCube) -> DataCube:
+    """
+    Convert a block of time series back into a data cube with the dimensions and coordinates of the input cube.
+
+    :param block: The block of time series that was computed from the input cube
+    :param cube: The input data cube
+    :return: The new data cube
+    """
+    array = cube.array
+    time_dim, other_dims = _timeseries_dimensions(array)
+    shape = [array.sizes[time_dim]] + [array.sizes[dim] for dim in other_dims]
+    if block.shape != (shape[0], int(numpy.prod(shape[1:]))):
+        raise Exception(f"The time series block of shape {block.shape} does not match the data cube {cube.id}, "
+                        "the time instants and the pixels must be kept")
+    result = xarray.DataArray(block.values.reshape(shape), dims=[time_dim] + other_dims,
+                              coords=array.coords, name=array.name, attrs=array.attrs)
+    return DataCube(result.transpose(*array.dims))
+
+
+def apply_timeseries_block_generic(udf_data: UdfData, callback: Callable):
+    """
+    Implements the UDF contract by calling a user provided block transformation function (apply_timeseries_block)
+    once for each data cube. The callback receives a DataFrame with the time series of all pixels as columns,
+    so that smoothing or gap filling of all pixels can be computed with a single vectorized pandas call.
+
+    :param udf_data:
+    :param callback:
+    :return:
+    """
+    tile_results = []
+    for cube in udf_data.get_datacube_list():
+        block = callback(datacube_to_timeseries_block(cube), udf_data.user_context)
+        if not isinstance(block, DataFrame):
+            raise ValueError("The provided UDF did not return a DataFrame, but got: %s" % type(block))
+        tile_results.append(timeseries_block_to_datacube(block, cube))
+    udf_data.set_datacube_list(tile_results)
+    return udf_data
+
+
+def timeseries_pixel_ranges(pixels: int, processes: int) -> List[Tuple[int, int]]:
+    """
+    Partition the pixels of a data cube into ranges, each process gets several ranges to balance the load.
+
+    >>> timeseries_pixel_ranges(10, 2)
+    [(0, 2), (2, 4), (4, 6), (6, 8), (8, 10)]
+
+    :param pixels: The number of pixels
+    :param processes: The number of processes
+    :return: The start and end of each pixel range
+    """
+    size = max(1, -(-pixels // (processes * 4)))
+    return [(start, min(start + size, pixels)) for start in range(0, pixels, size)]
+
+
+def _apply_timeseries_range(callback: Callable, context: Dict, index: Optional[pandas.Index],
+                            values: numpy.ndarray, output: numpy.ndarray, start: int, end: int):
+    """Call the time series callback for the pixels of a range and write the results into the output rows"""
+    for pixel in range(start, end):
+        result = callback(Series(values[pixel], index=index), context)
+        if len(result) != values.shape[1]:
+            raise Exception("The provided UDF must keep the time instants of the time series")
+        output[pixel] = numpy.asarray(result)
+
+
+# The callback and the shared arrays of a time series job in a forked worker process
+_timeseries_job = None
+
+
+def _initialize_timeseries_worker(*job):
+    global _timeseries_job
+    _timeseries_job = job
+
+
+def _run_timeseries_range(pixel_range: Tuple[int, int]):
+    _apply_timeseries_range(*_timeseries_job, *pixel_range)
+
+
+def timeseries_processes(processes: Optional[int] = None) -> int:
+    """
+    Get the number of processes that compute the time series of a data cube in parallel. The time series
+    are computed in the calling process if parallel processing is not available on this platform.
+    Inside the processes of a worker pool the number of processes is limited to the CPUs of the worker,
+    so that the time series pools of parallel UDF jobs do not oversubscribe the cores.
+
+    :param processes: The number of processes, UdfConfiguration.timeseries_processes is used if not set
+    :return: The number of processes, 1 for serial processing
+    """
+    if processes is None:
+        processes = UdfConfiguration.timeseries_processes
+    if not processes or "fork" not in multiprocessing.get_all_start_methods() or \
+            multiprocessing.current_process().daemon:
+        return 1
+    if UdfConfiguration.worker_processes > 0:
+        processes = min(processes, process_cpu_count())
+    return max(1, int(processes))
+
+
+def _shared_empty(shape: Tuple[int, ...], dtype: numpy.dtype) -> numpy.ndarray:
+    """Allocate an array in anonymous shared memory that is shared with the processes forked afterwards
+
+    The memory is released with the last reference to the array.
+    """
+    dtype = numpy.dtype(dtype)
+    buffer = mmap.mmap(-1, max(1, int(numpy.prod(shape)) * dtype.itemsize))
+    return numpy.ndarray(shape, dtype=dtype, buffer=buffer)
+
+
+def _apply_timeseries_parallel(callback: Callable, context: Dict, index: Optional[pandas.Index],
+                               values: numpy.ndarray, output: numpy.ndarray, start: int, processes: int):
+    """Compute the time series of the pixels from start in forked processes that write into the shared output"""
+    # The forked processes inherit the callback, that may be defined in a UDF module, the input values
+    # without copy and the output array in shared memory
+    ranges = [(start + a, start + b) for a, b in timeseries_pixel_ranges(values.shape[0] - start, processes)]
+    with multiprocessing.get_context("fork").Pool(
+            processes, initializer=_initialize_timeseries_worker,
+            initargs=(callback, context, index, values, output)) as pool:
+        pool.map(_run_timeseries_range, ranges, chunksize=1)
+
+
+def apply_timeseries_generic(udf_data: UdfData, callback: Callable = apply_timeseries,
+                             processes: Optional[int] = None):
     """
     Implements the UDF contract by calling a user provided time series transformation function (apply_timeseries).
     Multiple bands are currently handled separately, another approach could provide a dataframe with a timeseries for each band.
+    Callbacks that expect a DataFrame are dispatched to apply_timeseries_block_generic().
+
+    The time series of the pixels of large cubes are computed in a pool of forked processes. The processes
+    inherit the input array and the output array is preallocated in shared memory, each process writes the
+    result rows of its pixel ranges in place.
 
     :param udf_data:
+    :param callback:
+    :param processes: The number of processes, UdfConfiguration.timeseries_processes is used if not set
     :return:
     """
+    if is_timeseries_block_callback(callback):
+        return apply_timeseries_block_generic(udf_data, callback)
+
+    processes = timeseries_processes(processes)
     # The list of tiles that were created
     tile_results = []
 
     # Iterate over each cube
     for cube in udf_data.get_datacube_list():
-        array3d = []
-        #use rollaxis to make the time dimension the last one
-        for time_x_slice in numpy.rollaxis(cube.array.values, 1):
-            time_x_result = []
-            for time_slice in time_x_slice:
-                series = pandas.Series(time_slice)
-                transformed_series = callback(series,udf_data.user_context)
-                time_x_result.append(transformed_series)
-            array3d.append(time_x_result)
-
-        # We need to create a new 3D array with the correct shape for the computed aggregate
-        result_tile = numpy.rollaxis(numpy.asarray(array3d),1)
-        assert result_tile.shape == cube.array.shape
-        # Create the new raster collection cube
-        rct = DataCube(xarray.DataArray(result_tile))
-        tile_results.append(rct)
+        array = cube.array
+        time_dim, other_dims = _timeseries_dimensions(array)
+        index = _timeseries_index(array, time_dim)
+        # Each row is the time series of a pixel
+        values = numpy.ascontiguousarray(array.transpose(*other_dims, time_dim).values.reshape((-1, array.sizes[time_dim])))
+        pixels = values.shape[0]
+        if pixels == 0:
+            tile_results.append(cube)
+            continue
+
+        # The first time series determines the data type of the preallocated output
+        first = numpy.asarray(callback(Series(values[0], index=index), udf_data.user_context))
+        if first.shape != (values.shape[1],):
+            raise Exception("The provided UDF must keep the time instants of the time series")
+        parallel = processes > 1 and pixels >= UdfConfiguration.timeseries_minimum_pixels and \
+            not first.dtype.hasobject
+        output = _shared_empty(values.shape, first.dtype) if parallel else numpy.empty(values.shape, dtype=first.dtype)
+        output[0] = first
+
+        if parallel:
+            _apply_timeseries_parallel(callback, udf_data.user_context, index, values, output, 1, processes)
+        else:
+            _apply_timeseries_range(callback, udf_data.user_context, index, values, output, 1, pixels)
+
+        # Create the new raster collection cube with the dimensions and coordinates of the input cube
+        tile_results.append(timeseries_block_to_datacube(DataFrame(output.T), cube))
     # Insert the new tiles as list of raster collection tiles in the input object. The new tiles will
     # replace the original input tiles.
     udf_data.set_datacube_list(tile_results)
     return udf_data
 
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import numpy
 from openeo_udf.api.datacube import DataCube
 from openeo_udf.api.udf_data import UdfData
 
@@ -39,7 +40,12 @@ def hyper_ndvi(udf_data: UdfData):
     if nir is None:
         raise Exception("Nir hypercube is missing in input")
 
-    ndvi = (nir.array - red.array) / (nir.array + red.array)
+    # Compute in float32 for float32 or small integer inputs, otherwise in the data type of the inputs
+    dtype = numpy.result_type(red.array.dtype, nir.array.dtype, numpy.float32)
+    red = red.array.astype(dtype, copy=False)
+    nir = nir.array.astype(dtype, copy=False)
+
+    ndvi = (nir - red) / (nir + red)
     ndvi.name = "NDVI"
 
     hc = DataCube(array=ndvi)
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 # Uncomment the import only for coding support
+import numpy
 import xarray
-import torch
+
+try:
+    import torch
+except ImportError:
+    torch = None
 
 from openeo_udf.api.datacube import DataCube
 from openeo_udf.api.udf_data import UdfData
@@ -17,7 +22,18 @@ def hyper_pytorch_ml(udf_data: UdfData):
     """Apply a pre-trained pytorch machine learn model on a hypercube
 
     The model must be a pytorch model that has expects the input data in the constructor
-    The prediction method must accept a torch.autograd.Variable as input.
+    The prediction method must accept a torch.Tensor as input and must return a tensor with the shape of the input.
+    Models of the onnx framework are run with numpy arrays in ONNX Runtime, pytorch is not required for them.
+
+    The model is applied without autograd in inference mode. The cube can be split into batches along a dimension,
+    for example the time slices or strips of spatial rows, so that only the input of a single batch is converted
+    into a tensor. Dask backed cubes are computed batch by batch. The user context can set the following options:
+
+        - "batch_dimension": The name of the dimension that is split into batches, the cube is processed at once
+          if not set
+        - "batch_size": The number of entries of the batch dimension in each batch, default 1
+        - "threads": The number of intra-op threads of pytorch, the current setting is kept if not set.
+          This should be 1 if the UDF runs in the worker pool of the server
 
     Args:
         udf_data (UdfData): The UDF data object that hypercubes and vector tiles
@@ -28,15 +44,74 @@ def hyper_pytorch_ml(udf_data: UdfData):
 
     """
     cube = udf_data.get_datacube_list()[0]
+    context = udf_data.user_context or {}
+    batch_dimension = context.get("batch_dimension")
+    batch_size = int(context.get("batch_size", 1))
+    threads = context.get("threads")
+    if batch_dimension is not None and batch_dimension not in cube.array.dims:
+        raise Exception(f"The batch dimension {batch_dimension} is not a dimension of the data cube {cube.id}")
+    if batch_size < 1:
+        raise Exception("The batch size must be positive")
 
-    # This is the input data of the model.
-    input = torch.autograd.Variable(torch.Tensor(cube.array.values))
     # Get the first model
     mlm = udf_data.get_ml_model_list()[0]
     m = mlm.get_model()
-    # Predict the data
-    pred = m(input)
-    result = xarray.DataArray(data=pred.detach().numpy(), dims=cube.array.dims,
+    onnx = mlm.framework.lower() == "onnx"
+    if onnx:
+        # The input is converted into the data type of the model input
+        dtype = m.input_dtype
+    else:
+        if torch is None:
+            raise Exception("The pytorch framework is not available")
+        # The input is converted into the data type of the model parameters, float32 by default
+        parameter = next(iter(m.parameters()), None) if hasattr(m, "parameters") else None
+        dtype = torch.empty(0, dtype=parameter.dtype if parameter is not None else torch.float32).numpy().dtype
+
+    if batch_dimension is None:
+        batches = [slice(None)]
+    else:
+        size = cube.array.sizes[batch_dimension]
+        batches = [slice(start, min(start + batch_size, size)) for start in range(0, size, batch_size)]
+    axis = cube.array.dims.index(batch_dimension) if batch_dimension is not None else 0
+
+    output = None
+
+    def predict(batch: slice):
+        nonlocal output
+        values = cube.array.isel({batch_dimension: batch}).values if batch_dimension else cube.array.values
+        values = numpy.ascontiguousarray(values, dtype=dtype)
+        if onnx:
+            # The ONNX Runtime session runs directly on the numpy array
+            pred = m(values)
+        else:
+            # This is the input data of the model, the tensor shares the memory of the numpy array
+            pred = m(torch.from_numpy(values)).numpy()
+        if pred.shape != values.shape:
+            raise Exception(f"The model must keep the shape {values.shape} of the input, got {pred.shape}")
+        if output is None:
+            output = numpy.empty(cube.array.shape, dtype=pred.dtype)
+        index = [slice(None)] * output.ndim
+        index[axis] = batch
+        output[tuple(index)] = pred
+
+    if onnx:
+        # The threads of the ONNX Runtime sessions are set by the server configuration
+        for batch in batches:
+            predict(batch)
+    else:
+        # Fall back to no_grad for pytorch versions without inference mode
+        inference_mode = getattr(torch, "inference_mode", torch.no_grad)
+        previous_threads = torch.get_num_threads()
+        if threads is not None:
+            torch.set_num_threads(int(threads))
+        try:
+            with inference_mode():
+                for batch in batches:
+                    predict(batch)
+        finally:
+            torch.set_num_threads(previous_threads)
+
+    result = xarray.DataArray(data=output, dims=cube.array.dims,
                               coords=cube.array.coords, name=cube.id + "_pytorch")
     # Create the new raster collection tile
     result_cube = DataCube(array=result)
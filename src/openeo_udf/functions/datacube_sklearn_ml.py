@@ -13,15 +13,43 @@ __maintainer__ = "Soeren Gebbert"
 __email__ = "soerengebbert@googlemail.com"
 
 
+# The default cube ids of the model features and the number of pixels that are predicted at once
+DEFAULT_BANDS = ["red", "nir"]
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def _find_cube(cubes, band: str) -> DataCube:
+    """Find the data cube of a band by its id, or by a case insensitive part of its id"""
+    for cube in cubes:
+        if cube.id == band:
+            return cube
+    for cube in cubes:
+        if band.lower() in cube.id.lower():
+            return cube
+    raise Exception(f"{band.capitalize()} data cube is missing in input")
+
+
 def rct_sklearn_ml(udf_data: UdfData):
     """Apply a pre-trained sklearn machine learn model on RED and NIR tiles
 
     The model must be a sklearn model that has a prediction method: m.predict(X)
     The prediction method must accept a pandas.DataFrame as input.
+    Models of the onnx framework are run with numpy arrays in ONNX Runtime, the columns of the input
+    are the bands in the given order.
 
     Tiles with ids "red" and "nir" are required. The machine learn model will be applied to all spatio-temporal pixel
     of the two input raster collections.
 
+    The pixels are predicted in blocks of fixed size, so that the peak memory does not grow with the
+    size of the data cubes. Pixels that are NaN or nodata in any band are skipped and are NaN in the result,
+    or None if the model predicts labels that are not numeric.
+    The user context can set the following options:
+
+        - "bands": The list of cube ids that are the features of the model, default ["red", "nir"]
+        - "chunk_size": The number of pixels that are predicted at once, default 65536
+        - "threads": The number of threads that predict the blocks in parallel, default 1
+        - "nodata": The nodata value of the bands
+
     Args:
         udf_data (UdfData): The UDF data object that contains raster and vector tiles
 
@@ -30,42 +58,81 @@ def rct_sklearn_ml(udf_data: UdfData):
         data.
 
     """
-    red = None
-    nir = None
-
-    # Iterate over each cube
-    for cube in udf_data.get_datacube_list():
-        if "red" in cube.id.lower():
-            red = cube
-        if "nir" in cube.id.lower():
-            nir = cube
-    if red is None:
-        raise Exception("Red data cube is missing in input")
-    if nir is None:
-        raise Exception("Nir data cube is missing in input")
-
-    # We need to reshape the data for prediction into one dimensional arrays
-    three_dim_shape = red.array.shape
-    one_dim_shape = numpy.prod(three_dim_shape)
-
-    red_reshape = red.array.values.reshape((one_dim_shape))
-    nir_reshape = nir.array.values.reshape((one_dim_shape))
-
-    # This is the input data of the model. It must be trained with a DataFrame using the same names.
-    X = pandas.DataFrame()
-    X["red"] = red_reshape
-    X["nir"] = nir_reshape
+    from concurrent.futures import ThreadPoolExecutor
+
+    context = udf_data.user_context or {}
+    bands = list(context.get("bands", DEFAULT_BANDS))
+    chunk_size = int(context.get("chunk_size", DEFAULT_CHUNK_SIZE))
+    threads = int(context.get("threads", 1))
+    nodata = context.get("nodata")
+    if not bands or chunk_size < 1 or threads < 1:
+        raise Exception("The bands must not be empty, the chunk size and the number of threads must be positive")
+
+    cubes = [_find_cube(udf_data.get_datacube_list(), band) for band in bands]
+    shape = cubes[0].array.shape
+    for cube in cubes:
+        if cube.array.shape != shape:
+            raise Exception(f"The data cube {cube.id} has the shape {cube.array.shape}, expected {shape}")
+
+    # The flat views on the data of each band, they are only copied block by block
+    features = [numpy.ravel(cube.array.values) for cube in cubes]
+    dtype = numpy.result_type(*features)
+    pixels = features[0].size
 
     # Get the first model
     mlm = udf_data.get_ml_model_list()[0]
     m = mlm.get_model()
-    # Predict the data
-    pred = m.predict(X)
-    # Reshape the one dimensional predicted values to three dimensions based on the input shape
-    pred_reshape = pred.reshape(three_dim_shape)
+    onnx = mlm.framework.lower() == "onnx"
+
+    def predict(start: int):
+        end = min(start + chunk_size, pixels)
+        # This is the input data of the model. It must be trained with a DataFrame using the same names.
+        block = numpy.empty((end - start, len(bands)), dtype=dtype)
+        for index, feature in enumerate(features):
+            block[:, index] = feature[start:end]
+        valid = numpy.ones(end - start, dtype=bool)
+        if dtype.kind in "fc":
+            valid &= ~numpy.isnan(block).any(axis=1)
+        if nodata is not None:
+            valid &= ~(block == nodata).any(axis=1)
+        if not valid.any():
+            return start, valid, None
+        if onnx:
+            return start, valid, m.predict(block[valid])
+        return start, valid, m.predict(pandas.DataFrame(block[valid], columns=bands))
+
+    # The output is allocated with the data type of the first predicted block, labels that are not numeric
+    # are stored as objects, so that the labels of later blocks are not truncated
+    output = None
+
+    def store(start: int, valid: numpy.ndarray, prediction: numpy.ndarray):
+        nonlocal output
+        if prediction is None:
+            return
+        if output is None:
+            if prediction.dtype.kind in "biufc":
+                output = numpy.full(pixels, numpy.nan, dtype=numpy.result_type(prediction.dtype, numpy.float32))
+            else:
+                output = numpy.full(pixels, None, dtype=object)
+        output[start:start + valid.size][valid] = prediction
+
+    starts = range(0, pixels, chunk_size)
+    if threads > 1 and len(starts) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            for result in executor.map(predict, starts):
+                store(*result)
+    else:
+        for start in starts:
+            store(*predict(start))
+
+    if output is None:
+        output = numpy.full(pixels, numpy.nan)
+    # Reshape the one dimensional predicted values to the shape of the input cubes
+    pred_reshape = output.reshape(shape)
 
-    result = xarray.DataArray(data=pred_reshape, dims=red.array.dims,
-                              coords=red.array.coords, name=red.id + "_pytorch")
+    first = cubes[0]
+    result = xarray.DataArray(data=pred_reshape, dims=first.array.dims,
+                              coords=first.array.coords, name=first.id + "_sklearn")
     # Create the new raster collection cube
     h = DataCube(array=result)
     # Insert the new hypercubes in the input object. The new tiles will
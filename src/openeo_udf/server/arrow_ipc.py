@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+import json
+from typing import Dict, List, Tuple, Optional
+
+import numpy
+import pandas
+import xarray
+import geopandas
+
+from openeo_udf.api.datacube import DataCube, chunk_array
+from openeo_udf.api.feature_collection import FeatureCollection, geometries_to_wkb, geometries_from_wkb
+from openeo_udf.api.machine_learn_model import MachineLearnModelConfig
+from openeo_udf.api.structured_data import StructuredData
+from openeo_udf.api.udf_data import UdfData
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+Apache Arrow IPC serialization of UDF data.
+
+A message is a sequence of Arrow IPC streams. Each stream stores its description as JSON
+in the schema metadata entry "openeo_udf", the "type" of the description defines the content:
+
+    - "udf_data": The first stream of a message without columns. It stores the UDF code (requests only),
+      the projection, the user and server context, the structured data and the machine learn models.
+    - "datacube": A data cube with a single fixed size list column "data". Each row contains a
+      slice of the first dimension of the cube in C (row-major) order. The shape, the dimension names,
+      the coordinates and the description of the cube are stored in the JSON description.
+    - "feature_collection": A feature collection with a WKB encoded "geometry" column
+      (GeoArrow extension type geoarrow.wkb), optional "start_times" and "end_times" timestamp columns
+      and any number of attribute columns.
+
+Array data is shared between numpy and Arrow without copies, arrays that are decoded from a
+message are read-only views on the message buffer.
+"""
+
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+METADATA_KEY = b"openeo_udf"
+GEOMETRY_COLUMN = "geometry"
+START_TIMES_COLUMN = "start_times"
+END_TIMES_COLUMN = "end_times"
+
+
+def _check_pyarrow():
+    if pyarrow is None:
+        raise Exception("The Apache Arrow IPC format requires the pyarrow package")
+
+
+def _get_description(schema: 'pyarrow.Schema') -> Dict:
+    if schema.metadata is None or METADATA_KEY not in schema.metadata:
+        raise Exception("Missing openeo_udf description in the Arrow stream schema metadata")
+    return json.loads(schema.metadata[METADATA_KEY].decode("utf-8"))
+
+
+def _description_to_metadata(description: Dict) -> Dict:
+    return {METADATA_KEY: json.dumps(description).encode("utf-8")}
+
+
+def datacube_to_arrow_table(cube: DataCube) -> 'pyarrow.Table':
+    """Convert a data cube into an Arrow table with a fixed size list column
+    that contains the slices of the first dimension of the cube
+
+    Args:
+        cube (DataCube): The data cube to convert
+
+    Returns:
+        pyarrow.Table: The table that shares the array data with the data cube
+
+    """
+    _check_pyarrow()
+    array = cube.array
+    values = numpy.ascontiguousarray(array.values)
+    shape = list(values.shape)
+
+    if values.dtype.kind not in "biuf":
+        raise Exception(f"Unable to store data cube {cube.id} of data type {values.dtype} in Arrow format")
+
+    row_size = int(numpy.prod(shape[1:], dtype=numpy.int64)) if shape else 1
+    flat = pyarrow.array(values.reshape(-1))
+    data = pyarrow.FixedSizeListArray.from_arrays(flat, row_size)
+
+    dimensions = []
+    for dim in array.dims:
+        d = {"name": dim}
+        if dim in array.coords:
+            coordinate = array.coords[dim]
+            if coordinate.dtype.kind == "M":
+                d["coordinates"] = [t.isoformat() for t in pandas.DatetimeIndex(coordinate.values)]
+                d["datetime"] = True
+            else:
+                d["coordinates"] = coordinate.values.tolist()
+        dimensions.append(d)
+
+    description = {"type": "datacube", "id": cube.id, "shape": shape, "dimensions": dimensions}
+    if "description" in array.attrs:
+        description["description"] = array.attrs["description"]
+
+    table = pyarrow.Table.from_arrays([data], names=["data"])
+    return table.replace_schema_metadata(_description_to_metadata(description))
+
+
+def datacube_from_arrow_table(table: 'pyarrow.Table', chunks=None) -> DataCube:
+    """Create a data cube from an Arrow table that was created with datacube_to_arrow_table
+
+    Args:
+        table (pyarrow.Table): The Arrow table
+        chunks: The optional chunk sizes of a dask backed array, see chunk_array()
+
+    Returns:
+        DataCube: The data cube with a read-only view on the table data, if the table
+        consists of a single chunk
+
+    """
+    _check_pyarrow()
+    description = _get_description(table.schema)
+    columns = table.column("data").chunks
+
+    if len(columns) == 1:
+        values = columns[0].flatten().to_numpy(zero_copy_only=False)
+    else:
+        values = numpy.concatenate([column.flatten().to_numpy(zero_copy_only=False) for column in columns])
+    values = values.reshape(description["shape"])
+
+    dims = []
+    coords = {}
+    for dim in description["dimensions"]:
+        dims.append(dim["name"])
+        if "coordinates" in dim:
+            if dim.get("datetime", False) is True:
+                coords[dim["name"]] = pandas.DatetimeIndex(dim["coordinates"])
+            else:
+                coords[dim["name"]] = dim["coordinates"]
+
+    array = xarray.DataArray(values, dims=dims, coords=coords)
+    array.name = description["id"]
+    if "description" in description:
+        array.attrs["description"] = description["description"]
+
+    return DataCube(array=chunk_array(array, chunks))
+
+
+def feature_collection_to_arrow_table(fct: FeatureCollection) -> 'pyarrow.Table':
+    """Convert a feature collection into an Arrow table with WKB encoded geometries,
+    start and end time columns and the attribute columns
+
+    Args:
+        fct (FeatureCollection): The feature collection to convert
+
+    Returns:
+        pyarrow.Table: The Arrow table
+
+    """
+    _check_pyarrow()
+    data = fct.data
+    attributes = pandas.DataFrame(data.drop(columns=data.geometry.name))
+    table = pyarrow.Table.from_pandas(attributes, preserve_index=False)
+
+    # The Arrow binary array shares the buffer and the offsets of the WKB encoded geometries
+    buffer, offsets = geometries_to_wkb(data.geometry)
+    if offsets[-1] > numpy.iinfo(numpy.int32).max:
+        raise Exception(f"The WKB geometries of feature collection {fct.id} exceed the maximum size of 2GB")
+    geometry = pyarrow.Array.from_buffers(pyarrow.binary(), len(data),
+                                          [None, pyarrow.py_buffer(offsets.astype(numpy.int32)),
+                                           pyarrow.py_buffer(buffer)])
+    geometry_field = pyarrow.field(GEOMETRY_COLUMN, pyarrow.binary(),
+                                   metadata={b"ARROW:extension:name": b"geoarrow.wkb"})
+    table = table.append_column(geometry_field, geometry)
+
+    if fct.start_times is not None:
+        table = table.append_column(START_TIMES_COLUMN, pyarrow.array(fct.start_times.values))
+    if fct.end_times is not None:
+        table = table.append_column(END_TIMES_COLUMN, pyarrow.array(fct.end_times.values))
+
+    description = {"type": "feature_collection", "id": fct.id}
+    return table.replace_schema_metadata(_description_to_metadata(description))
+
+
+def feature_collection_from_arrow_table(table: 'pyarrow.Table') -> FeatureCollection:
+    """Create a feature collection from an Arrow table that was created with
+    feature_collection_to_arrow_table
+
+    Args:
+        table (pyarrow.Table): The Arrow table
+
+    Returns:
+        FeatureCollection: The feature collection
+
+    """
+    _check_pyarrow()
+    description = _get_description(table.schema)
+    names = table.schema.names
+
+    start_times = None
+    end_times = None
+    if START_TIMES_COLUMN in names:
+        start_times = pandas.DatetimeIndex(table.column(START_TIMES_COLUMN).to_pandas())
+    if END_TIMES_COLUMN in names:
+        end_times = pandas.DatetimeIndex(table.column(END_TIMES_COLUMN).to_pandas())
+
+    geometry = []
+    for chunk in table.column(GEOMETRY_COLUMN).chunks:
+        _, offsets, buffer = chunk.buffers()
+        offsets = numpy.frombuffer(offsets, dtype=numpy.int32, count=len(chunk) + 1, offset=chunk.offset * 4)
+        geometry.extend(geometries_from_wkb(numpy.frombuffer(buffer, dtype=numpy.uint8), offsets))
+    attributes = table.drop([name for name in names if name in (GEOMETRY_COLUMN, START_TIMES_COLUMN,
+                                                                 END_TIMES_COLUMN)])
+    attributes = attributes.to_pandas() if attributes.num_columns > 0 else None
+
+    data = geopandas.GeoDataFrame(attributes, geometry=geometry)
+    return FeatureCollection(id=description["id"], data=data, start_times=start_times, end_times=end_times)
+
+
+def _write_table(sink: 'pyarrow.BufferOutputStream', table: 'pyarrow.Table'):
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def write_arrow_stream(udf_data: UdfData, code: Optional[Dict] = None) -> bytes:
+    """Write the UDF data as a sequence of Arrow IPC streams
+
+    Args:
+        udf_data (UdfData): The UDF data to write
+        code (dict): The optional UDF code dictionary with language and source, required for requests
+
+    Returns:
+        bytes: The Arrow IPC message
+
+    """
+    _check_pyarrow()
+    description = {"type": "udf_data",
+                   "proj": udf_data.proj,
+                   "user_context": udf_data.user_context,
+                   "server_context": udf_data.server_context}
+    if code is not None:
+        description["code"] = code
+    if udf_data.structured_data_list:
+        description["structured_data_list"] = [sd.to_dict() for sd in udf_data.structured_data_list]
+    if udf_data.ml_model_list:
+        description["machine_learn_models"] = [m.to_dict() for m in udf_data.ml_model_list]
+
+    sink = pyarrow.BufferOutputStream()
+    _write_table(sink, pyarrow.Table.from_arrays([], names=[]).replace_schema_metadata(
+        _description_to_metadata(description)))
+
+    for cube in udf_data.get_datacube_list() or []:
+        _write_table(sink, datacube_to_arrow_table(cube))
+    for fct in udf_data.get_feature_collection_list() or []:
+        _write_table(sink, feature_collection_to_arrow_table(fct))
+
+    return sink.getvalue().to_pybytes()
+
+
+def read_arrow_stream(blob: bytes) -> Tuple[Optional[Dict], UdfData]:
+    """Read UDF data from a sequence of Arrow IPC streams
+
+    Args:
+        blob (bytes): The Arrow IPC message
+
+    Returns:
+        tuple: The UDF code dictionary, or None if not present, and the UDF data object
+
+    """
+    _check_pyarrow()
+    buffer = pyarrow.py_buffer(blob)
+    source = pyarrow.BufferReader(buffer)
+
+    tables: List['pyarrow.Table'] = []
+    while source.tell() < buffer.size:
+        tables.append(pyarrow.ipc.open_stream(source).read_all())
+
+    if not tables or _get_description(tables[0].schema)["type"] != "udf_data":
+        raise Exception("The first Arrow stream must contain the udf_data description")
+
+    description = _get_description(tables[0].schema)
+    udf_data = UdfData(proj=description.get("proj"))
+    udf_data.user_context = description.get("user_context") or {}
+    udf_data.server_context = description.get("server_context") or {}
+
+    for entry in description.get("structured_data_list", []):
+        udf_data.append_structured_data(StructuredData.from_dict(entry))
+    for entry in description.get("machine_learn_models", []):
+        udf_data.append_machine_learn_model(MachineLearnModelConfig.from_dict(entry))
+
+    # The data cubes are dask backed if the server context requests chunks
+    chunks = udf_data.dask_options().get("chunks")
+    for table in tables[1:]:
+        object_type = _get_description(table.schema)["type"]
+        if object_type == "datacube":
+            udf_data.append_datacube(datacube_from_arrow_table(table, chunks=chunks))
+        elif object_type == "feature_collection":
+            udf_data.append_feature_collection(feature_collection_from_arrow_table(table))
+        else:
+            raise Exception(f"Unsupported object type {object_type} in Arrow stream")
+
+    return description.get("code"), udf_data
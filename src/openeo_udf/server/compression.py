@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+import zlib
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.data_model.udf_schemas import ErrorResponseModel
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+HTTP content encoding negotiation for the UDF server.
+
+Request bodies that are compressed with one of the supported codecs (Content-Encoding header) are decompressed
+chunk by chunk while they are received, responses are compressed chunk by chunk with the codec that was selected
+from the Accept-Encoding header of the request. The codecs zstd and lz4 require the optional
+zstandard and lz4 packages, gzip is always available.
+
+The compression level of each codec is configured in UdfConfiguration.compression_levels.
+"""
+
+GZIP_ENCODING = "gzip"
+ZSTD_ENCODING = "zstd"
+LZ4_ENCODING = "lz4"
+
+
+def supported_encodings() -> List[str]:
+    """Return the content encodings that are available on this server in the order of preference
+
+    Returns:
+        list: The list of content encodings
+
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append(ZSTD_ENCODING)
+    if lz4 is not None:
+        encodings.append(LZ4_ENCODING)
+    encodings.append(GZIP_ENCODING)
+    return encodings
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """Select the content encoding of the response from the Accept-Encoding header of a request
+
+    The encoding with the highest quality value is selected, equal quality values are resolved by
+    the preference of the server.
+
+    Args:
+        accept_encoding (str): The value of the Accept-Encoding header
+
+    Returns:
+        str: The selected content encoding or None if the response must not be compressed
+
+    >>> select_encoding("gzip, deflate")
+    'gzip'
+    >>> select_encoding("identity") is None
+    True
+    >>> select_encoding("gzip;q=1.0, zstd;q=0")
+    'gzip'
+
+    """
+    qualities: Dict[str, float] = {}
+    for entry in accept_encoding.split(","):
+        parts = entry.strip().split(";")
+        name = parts[0].strip().lower()
+        quality = 1.0
+        for parameter in parts[1:]:
+            key, _, value = parameter.strip().partition("=")
+            if key.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            qualities[name] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in supported_encodings():
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best = encoding
+            best_quality = quality
+    return best
+
+
+class StreamCompressor:
+    """Compress data chunk by chunk with the gzip, zstd or lz4 codec"""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        if level is None:
+            level = UdfConfiguration.compression_levels.get(encoding)
+
+        self._header = b""
+        if encoding == GZIP_ENCODING:
+            self._compressor = zlib.compressobj(level if level is not None else 6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        elif encoding == ZSTD_ENCODING and zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level if level is not None else 3).compressobj()
+        elif encoding == LZ4_ENCODING and lz4 is not None:
+            self._compressor = lz4.frame.LZ4FrameCompressor(compression_level=level if level is not None else 0)
+            self._header = self._compressor.begin()
+        else:
+            raise Exception(f"Unsupported content encoding {encoding}, supported are {supported_encodings()}")
+
+    def compress(self, data: bytes) -> bytes:
+        result = self._header + self._compressor.compress(data)
+        self._header = b""
+        return result
+
+    def flush(self) -> bytes:
+        return self._header + self._compressor.flush()
+
+
+class StreamDecompressor:
+    """Decompress data chunk by chunk that was compressed with the gzip, zstd or lz4 codec"""
+
+    def __init__(self, encoding: str):
+        self._encoding = encoding
+        if encoding == GZIP_ENCODING:
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == ZSTD_ENCODING and zstandard is not None:
+            self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+        elif encoding == LZ4_ENCODING and lz4 is not None:
+            self._decompressor = lz4.frame.LZ4FrameDecompressor()
+        else:
+            raise Exception(f"Unsupported content encoding {encoding}, supported are {supported_encodings()}")
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        if self._encoding == GZIP_ENCODING:
+            return self._decompressor.flush()
+        return b""
+
+
+class ContentEncodingMiddleware:
+    """ASGI middleware that decompresses request bodies based on the Content-Encoding header and
+    compresses the response based on the Accept-Encoding header of the request"""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+
+        content_encoding = headers.get("Content-Encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            if content_encoding not in supported_encodings():
+                message = f"Unsupported content encoding {content_encoding}, supported are {supported_encodings()}"
+                response = JSONResponse({"detail": ErrorResponseModel(message=message).dict()}, status_code=415)
+                await response(scope, receive, send)
+                return
+            scope, receive = self._decompress_request(scope, receive, content_encoding)
+
+        encoding = select_encoding(headers.get("Accept-Encoding", ""))
+        if encoding is not None:
+            send = _CompressedSender(send, encoding).send
+
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _decompress_request(scope: Scope, receive: Receive, encoding: str):
+        # The size of the decompressed body is unknown, hence the content length is removed
+        scope = dict(scope)
+        scope["headers"] = [(key, value) for key, value in scope["headers"]
+                            if key not in (b"content-encoding", b"content-length")]
+        decompressor = StreamDecompressor(encoding)
+
+        async def receive_decompressed() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                more_body = message.get("more_body", False)
+                body = decompressor.decompress(message.get("body", b""))
+                if not more_body:
+                    body += decompressor.flush()
+                message = {"type": "http.request", "body": body, "more_body": more_body}
+            return message
+
+        return scope, receive_decompressed
+
+
+class _CompressedSender:
+    """Compress the body messages of a response, small responses and responses that
+    already have a content encoding are sent unchanged"""
+
+    def __init__(self, send: Send, encoding: str) -> None:
+        self._send = send
+        self._encoding = encoding
+        self._compressor: Optional[StreamCompressor] = None
+        self._initial_message: Message = {}
+        self._started = False
+
+    async def send(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            # The headers are sent with the first body message, when it is known whether to compress
+            self._initial_message = message
+            return
+
+        if message_type != "http.response.body":
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self._started:
+            self._started = True
+            headers = MutableHeaders(raw=self._initial_message["headers"])
+            if "content-encoding" in headers or (len(body) < UdfConfiguration.compression_minimum_size
+                                                 and not more_body):
+                await self._send(self._initial_message)
+                await self._send(message)
+                return
+
+            self._compressor = StreamCompressor(self._encoding)
+            headers["Content-Encoding"] = self._encoding
+            headers.add_vary_header("Accept-Encoding")
+            if more_body is False:
+                body = self._compressor.compress(body) + self._compressor.flush()
+                headers["Content-Length"] = str(len(body))
+                await self._send(self._initial_message)
+                await self._send({"type": "http.response.body", "body": body, "more_body": False})
+                return
+
+            # The size of a streaming response is unknown
+            if "content-length" in headers:
+                del headers["Content-Length"]
+            await self._send(self._initial_message)
+
+        if self._compressor is None:
+            await self._send(message)
+            return
+
+        body = self._compressor.compress(body)
+        if not more_body:
+            body += self._compressor.flush()
+        await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
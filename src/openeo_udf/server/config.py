@@ -1,8 +1,34 @@
 # -*- coding: utf-8 -*-
 
+# Every value of the variables is validated by pydantic
+FULL_VALIDATION = "full"
+# Only the sizes, the number of variables and the data types are validated, values are parsed into numpy arrays
+STRUCTURE_VALIDATION = "structure"
+
 
 class UdfConfiguration:
 
     machine_learn_storage_path = "/tmp/ml_storage"  # Path to store machine learn objects
     temporary_storage_path = "/tmp"
-
+    validation_mode = FULL_VALIDATION  # The validation mode of the variable values, "full" or "structure"
+    compression_levels = {"gzip": 6, "zstd": 3, "lz4": 0}  # The compression level of each content encoding
+    compression_minimum_size = 500  # Responses smaller than this number of bytes are not compressed
+    code_cache_size = 100  # The maximum number of compiled UDF modules that are cached by the hash of their source
+    preload_frameworks = ["torch", "tensorflow"]  # The optional frameworks that are imported into the UDF namespace
+    # The number of worker processes that run UDF jobs, 0 runs the UDF code in threads of the server process
+    worker_processes = 0
+    worker_start_method = "forkserver"  # The multiprocessing start method of the worker processes
+    worker_shared_memory = True  # Transfer the data cube arrays to the worker processes in shared memory blocks
+    # The default deadline of UDF jobs in seconds, None for no deadline. Deadlines are only enforced if a worker pool
+    # is running, UDF code that runs in a thread of the server process can not be stopped
+    execution_timeout = None
+    worker_poll_interval = 0.05  # The interval in seconds in which running jobs are checked for deadline and cancellation
+    dask_scheduler = "threads"  # The default dask scheduler that computes the dask backed data cubes of a UDF
+    timeseries_processes = 0  # The number of forked processes that compute the time series of apply_timeseries UDFs
+    timeseries_minimum_pixels = 10000  # Data cubes with fewer pixels are processed serially by apply_timeseries UDFs
+    # The memory budget of the machine learn model caches in bytes, 0 disables them. Models are not shared between
+    # processes, each worker process loads the models into its own cache that gets an equal share of the budget
+    model_cache_memory = 2 * 1024 ** 3
+    onnx_intra_op_threads = 0  # The number of intra-op threads of the ONNX Runtime sessions, 0 for the runtime default
+    onnx_inter_op_threads = 0  # The number of inter-op threads of the ONNX Runtime sessions, 0 for the runtime default
+    preload_models = []  # The md5 hashes of stored models or ["all"], that are loaded and warmed up at startup
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+from typing import List
+
+import numpy
+from pydantic import BaseModel, Schema as Field
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+class BinaryArrayModel(BaseModel):
+    """A typed binary representation of a multi-dimensional array. The raw buffer of the array
+    is stored as base64 encoded string in C (row-major) order."""
+    dtype: str = Field(..., description="The numpy compatible name of the data type of the array values.",
+                       enum=["bool", "int8", "int16", "int32", "int64", "uint8", "uint16",
+                             "uint32", "uint64", "float16", "float32", "float64"],
+                       examples=[{"dtype": "float32"}])
+    shape: List[int] = Field(..., description="The shape of the array as an ordered list of integer values.",
+                             examples=[{"shape": [3, 3, 3]}])
+    byteorder: str = Field("little", description="The byte order of the raw buffer.",
+                           enum=["little", "big"])
+    data: str = Field(..., description="The base64 encoded raw buffer of the array in C (row-major) order.")
+
+
+class NumpyArray(list):
+    """A field type that accepts numpy arrays unchanged. It is used by binary transport protocols like
+    message pack, that deliver decoded numpy arrays and must not be validated element by element.
+    The JSON schema of this type is an array."""
+
+    @classmethod
+    def __get_validators__(cls):
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value):
+        if isinstance(value, numpy.ndarray) is False:
+            raise TypeError("value is not a numpy array")
+        return value
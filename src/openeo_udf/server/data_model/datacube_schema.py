@@ -19,7 +19,7 @@ class DimensionModel(BaseModel):
                                   "Time instances or intervals are defined as ISO8601 strings",
                       examples=[{"unit": "seconds"}, {"unit": "m"}, {"unit": "hours"},
                                 {"unit": "days"}, {"unit": "mm"}, {"unit": "km"}, {"unit": "ISO8601"}])
-    extent: List[Union[int, float, str]] = Field(..., description="The spatial or temporal extent of the dimension. "
+    extent: List[Union[float, int, str]] = Field(..., description="The spatial or temporal extent of the dimension. "
                                                                   "It must be a tuple of values.")
     values: List[Union[float, str]] = Field(None, description="A list of coordinates for this dimension. Use "
                                                               "ISO8601 to specify time instances and intervals."
@@ -56,6 +56,11 @@ class DataCubeModel(BaseModel):
                            examples=[{"dim": ["time", "y", "x"]}])
     size: List[int] = Field(..., description="The size of the dimensions as an ordered list of integer values.",
                             examples=[[3, 3, 3]])
+    dtype: str = Field(None, description="The numpy compatible name of the data type of the data cube values. "
+                                         "The values of the variables are converted into this data type.",
+                       enum=["bool", "int8", "int16", "int32", "int64", "uint8", "uint16",
+                             "uint32", "uint64", "float16", "float32", "float64"],
+                       examples=[{"dtype": "float32"}])
 
     dimensions: Dict[str, DimensionModel] = Field(..., description="A dictionary of dimension descriptions. Dimensions are "
                                                                    "references by their name that is the key of the dict. "
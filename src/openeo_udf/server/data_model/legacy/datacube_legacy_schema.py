@@ -55,6 +55,12 @@ class DataCubeLegacyModel(BaseModel):
                            ]
                        ]}])
 
+    dtype: str = Schema(None, description="The numpy compatible name of the data type of the values. Nested lists "
+                                          "of values are decoded into this data type.",
+                        enum=["bool", "int8", "int16", "int32", "int64", "uint8", "uint16",
+                              "uint32", "uint64", "float16", "float32", "float64"],
+                        examples=[{"dtype": "int16"}])
+
     dimensions: List[DimensionModel] = Schema(...,
                                               description="The description of each dimension "
                                                           "and the value as ordered list. "
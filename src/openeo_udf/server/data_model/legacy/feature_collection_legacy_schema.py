@@ -29,7 +29,8 @@ class FeatureCollectionLegacyModel(BaseModel):
 
     id: str = Schema(..., description="The identifier of this feature collection.", examples=[{"id": "test_data"}])
 
-    data: Dict = Schema(..., description="A GeoJSON FeatureCollection.",
+    data: Dict = Schema(None, description="A GeoJSON FeatureCollection. Either the GeoJSON data or the WKB "
+                                          "encoded geometry and the attribute columns must be provided.",
                         examples=[
                             {"data": {"features": [{"id": "0", "type": "Feature", "properties": {"a": 1, "b": "a"},
                                                     "geometry": {"coordinates": [24.0, 50.0], "type": "Point"}},
@@ -37,6 +38,15 @@ class FeatureCollectionLegacyModel(BaseModel):
                                                     "geometry": {"coordinates": [30.0, 53.0], "type": "Point"}}],
                                       "type": "FeatureCollection"}}])
 
+    geometry: Dict = Schema(None, description="The WKB encoded geometries with the entries: encoding (wkb), data "
+                                              "(the concatenated WKB geometries as typed binary uint8 array) and "
+                                              "offsets (the int64 array with the start offset of each geometry "
+                                              "in data and the size of data as last entry).")
+
+    columns: Dict = Schema(None, description="The attribute columns of the WKB encoded features. Each column is a "
+                                             "list or a typed binary array with a value for each feature.",
+                           examples=[{"columns": {"a": [1, 2], "b": ["a", "b"]}}])
+
     start_time: List[str] = Schema(None, description="The array that contains that start time values for "
                                                      "each vector feature. As date-time string format "
                                                      "ISO 8601 must be supported.",
@@ -18,7 +18,7 @@ class MachineLearnModel(BaseModel):
     """A machine learn model that should be applied to the UDF data."""
 
     framework: str = pydSchema(..., description="The framework that was used to train the model",
-                               enum=["sklearn", "pytorch", "tensorflow", "R"],
+                               enum=["sklearn", "pytorch", "onnx", "tensorflow", "R"],
                                examples=[{"framework": "sklearn"}])
 
     name: str = pydSchema(..., description="The name of the machine learn model.")
@@ -56,6 +56,18 @@ class UdfRequestModel(BaseModel):
     data: UdfDataModel
 
 
+class UdfBatchRequestModel(BaseModel):
+    """
+    The udf batch request JSON specification that applies a single UDF to a list of UDF data objects, like the
+    tiles of a large data cube. This class is not part of the UDF API but used to create the UDF test server.
+    """
+    code: UdfCodeModel
+    data: List[UdfDataModel] = Schema(..., description="The list of UDF data objects that are processed "
+                                                       "independently with the UDF code")
+    ordered: bool = Schema(True, description="Return the results in the order of the UDF data objects, "
+                                             "otherwise each result is returned as soon as it is computed")
+
+
 class ErrorResponseModel(BaseModel):
     """
     The error message. This class is not part of the UDF API but used to create the UDF test server."
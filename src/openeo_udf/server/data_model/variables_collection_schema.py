@@ -1,7 +1,11 @@
 # -*- coding: utf-8 -*-
 from typing import List, Union
 
-from pydantic import BaseModel, Schema as pyField
+import numpy
+from pydantic import BaseModel, Schema as pyField, validator
+
+from openeo_udf.server.config import UdfConfiguration, STRUCTURE_VALIDATION
+from openeo_udf.server.data_model.binary_array_schema import BinaryArrayModel, NumpyArray
 
 __license__ = "Apache License, Version 2.0"
 __author__ = "Soeren Gebbert"
@@ -18,13 +22,29 @@ class VariableModel(BaseModel):
     unit: str = pyField(...,
                         description="The unit of the variable.",
                         examples=[{"unit": "m"}, {"unit": "NDVI"}, {"unit": "Watt"}])
-    values: List[Union[float, int]] = pyField(...,
-                                              description="The variable values that must be numeric.",
-                                              examples=[{"values": [1, 2, 3]}])
+    values: Union[List[Union[float, int]], BinaryArrayModel, NumpyArray] = pyField(...,
+                                                                                   description="The variable values "
+                                                                                               "that must be numeric. "
+                                                                                               "The values can be "
+                                                                                               "provided as list or "
+                                                                                               "as typed binary array.",
+                                                                                   examples=[{"values": [1, 2, 3]}])
     labels: List[str] = pyField(...,
                                 description="Label for each variable value.",
                                 examples=[{"labels": ["a", "b", "c"]}])
 
+    @validator("values", pre=True, whole=True)
+    def parse_values(cls, value):
+        """Parse lists of numbers into numpy arrays in structure validation mode, so that
+        the values are not validated one element at a time"""
+        if UdfConfiguration.validation_mode != STRUCTURE_VALIDATION or not isinstance(value, list):
+            return value
+
+        array = numpy.asarray(value)
+        if array.ndim != 1 or array.dtype.kind not in "biuf":
+            raise ValueError("The variable values must be a one dimensional list of numbers")
+        return array
+
 
 class VariablesCollectionModel(BaseModel):
     """A collection of variables that all have the same size"""
@@ -37,3 +57,27 @@ class VariablesCollectionModel(BaseModel):
                               examples=[{"size": [100]}, {"size": [3, 3, 3]}])
     number_of_variables: int = pyField(..., description="The number of variables in this collection.")
     variables: List[VariableModel] = pyField(..., description="A list of variables with the same size.")
+
+    @validator("variables", whole=True)
+    def check_structure(cls, variables, values):
+        """Check the number of variables and the number of values of each variable against
+        the size of the collection in structure validation mode"""
+        if UdfConfiguration.validation_mode != STRUCTURE_VALIDATION:
+            return variables
+
+        if "number_of_variables" in values and len(variables) != values["number_of_variables"]:
+            raise ValueError(f"The number of variables {len(variables)} does not match the "
+                             f"number_of_variables {values['number_of_variables']}")
+
+        if "size" in values:
+            count = int(numpy.prod(values["size"], dtype=numpy.int64))
+            for variable in variables:
+                if isinstance(variable.values, BinaryArrayModel):
+                    number_of_values = int(numpy.prod(variable.values.shape, dtype=numpy.int64))
+                else:
+                    number_of_values = numpy.size(variable.values)
+                # Variables without values only provide labels
+                if number_of_values != count and number_of_values != 0:
+                    raise ValueError(f"The number of values {number_of_values} of variable {variable.name} "
+                                     f"does not match the size {values['size']} of the variables collection")
+        return variables
@@ -1,11 +1,15 @@
 # -*- coding: utf-8 -*-
 from pydantic import BaseModel, Schema
 import os
+import time
 from shutil import copyfile
 from hashlib import md5
-from typing import Optional
+from typing import Dict, List, Optional
+
+import ujson
 
 from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.api.machine_learn_model import MachineLearnModelConfig, warmup_model
 
 __license__ = "Apache License, Version 2.0"
 __author__ = "Soeren Gebbert"
@@ -20,6 +24,9 @@ class ResponseStorageModel(BaseModel):
     source: str = Schema(..., description="The source of the machine learn model.")
     title: str = Schema(None, description="The title of the machine learn model.")
     description: str = Schema(None, description="The description of the machine learn model.")
+    framework: str = Schema(None, description="The framework of the machine learn model, like sklearn, pytorch "
+                                              "or onnx. It is derived from the file extension of the source "
+                                              "if not set.")
 
 
 class RequestStorageModel(BaseModel):
@@ -29,6 +36,16 @@ class RequestStorageModel(BaseModel):
                       examples=["/tmp/local_model.zip", "ftp://ftp.company.com/model/my_model.zip"])
     title: str = Schema(None, description="The title of the machine learn model.")
     description: str = Schema(None, description="The description of the machine learn model.")
+    framework: str = Schema(None, description="The framework of the machine learn model, like sklearn, pytorch "
+                                              "or onnx.")
+
+
+# The frameworks of the file extensions of stored models
+MODEL_FILE_FRAMEWORKS = {".onnx": "onnx", ".pt": "pytorch", ".pth": "pytorch",
+                         ".pkl": "sklearn", ".joblib": "sklearn"}
+
+# The load and warmup statistics of the models that were preloaded in this process
+_preloaded_models: Dict[str, Dict] = {}
 
 
 def store_model(filepath: str, request_storage: RequestStorageModel) -> Optional[str]:
@@ -45,7 +62,8 @@ def store_model(filepath: str, request_storage: RequestStorageModel) -> Optional
 
         response_model = ResponseStorageModel(md5_hash=md5_hash, source=request_storage.uri,
                                               title=request_storage.title,
-                                              description=request_storage.description)
+                                              description=request_storage.description,
+                                              framework=request_storage.framework)
 
         meta_file = open(md5_hash_path + ".json", "w")
         meta_file.write(response_model.json())
@@ -54,3 +72,110 @@ def store_model(filepath: str, request_storage: RequestStorageModel) -> Optional
         copyfile(filepath, md5_hash_path)
         return md5_hash
     return None
+
+
+def read_model_metadata(md5_hash: str) -> ResponseStorageModel:
+    """Read the metadata of a stored machine learn model
+
+    Args:
+        md5_hash (str): The md5 hash of the stored model
+
+    Returns:
+        ResponseStorageModel: The metadata of the model
+
+    """
+    path = os.path.join(UdfConfiguration.machine_learn_storage_path, md5_hash + ".json")
+    if not os.path.isfile(path):
+        raise Exception(f"The machine learn model for hash {md5_hash} was not found")
+    with open(path, "r") as meta_file:
+        return ResponseStorageModel(**ujson.loads(meta_file.read()))
+
+
+def stored_model_hashes() -> List[str]:
+    """Return the md5 hashes of all stored machine learn models
+
+    Returns:
+        list: The md5 hashes of the models that have metadata in the storage
+
+    """
+    path = UdfConfiguration.machine_learn_storage_path
+    if not os.path.isdir(path):
+        return []
+    return sorted(name[:-len(".json")] for name in os.listdir(path)
+                  if name.endswith(".json") and os.path.isfile(os.path.join(path, name[:-len(".json")])))
+
+
+def model_framework(metadata: ResponseStorageModel) -> Optional[str]:
+    """Get the framework of a stored model from its metadata or the file extension of its source
+
+    Args:
+        metadata (ResponseStorageModel): The metadata of the stored model
+
+    Returns:
+        str: The framework or None if it is unknown
+
+    >>> model_framework(ResponseStorageModel(md5_hash="a", source="/tmp/rf_model.pkl.xz"))
+    'sklearn'
+    >>> model_framework(ResponseStorageModel(md5_hash="a", source="/tmp/model.onnx"))
+    'onnx'
+
+    """
+    if metadata.framework:
+        return metadata.framework
+    name = os.path.basename(metadata.source).lower()
+    for extension, framework in MODEL_FILE_FRAMEWORKS.items():
+        if extension + "." in name or name.endswith(extension):
+            return framework
+    return None
+
+
+def preload_models(md5_hashes: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """Load stored machine learn models into the model cache and run a synthetic warmup prediction
+
+    Errors are recorded in the statistics of the model and do not stop the preloading of the other models.
+
+    Args:
+        md5_hashes (list): The md5 hashes of the models or ["all"] for all stored models,
+                           UdfConfiguration.preload_models is used if not set
+
+    Returns:
+        dict: The framework, the load time, the warmup time and the error of each preloaded model
+
+    """
+    if md5_hashes is None:
+        md5_hashes = UdfConfiguration.preload_models
+    if "all" in md5_hashes:
+        md5_hashes = stored_model_hashes()
+
+    statistics = {}
+    for md5_hash in md5_hashes:
+        entry = {"framework": None, "load_time": None, "warmup_time": None, "error": None}
+        statistics[md5_hash] = entry
+        try:
+            metadata = read_model_metadata(md5_hash)
+            entry["framework"] = model_framework(metadata)
+            if entry["framework"] is None:
+                raise Exception(f"Unknown framework of the machine learn model {md5_hash}")
+            start = time.perf_counter()
+            config = MachineLearnModelConfig(framework=entry["framework"], name=metadata.title or md5_hash,
+                                             description=metadata.description or "", md5_hash=md5_hash)
+            model = config.get_model()
+            entry["load_time"] = time.perf_counter() - start
+            start = time.perf_counter()
+            if warmup_model(entry["framework"], model):
+                entry["warmup_time"] = time.perf_counter() - start
+        except Exception as e:
+            entry["error"] = str(e)
+
+    _preloaded_models.update(statistics)
+    return statistics
+
+
+def model_preload_info() -> Dict[str, Dict]:
+    """Return the load and warmup statistics of the models that were preloaded in this process
+
+    Returns:
+        dict: The framework, the load time, the warmup time and the error of each preloaded model
+
+    """
+    return dict(_preloaded_models)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import struct
+from typing import Any
+
+import msgpack
+import numpy
+import pandas
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+Raw message pack serialization with extension types for numpy arrays and datetime indexes.
+
+Numpy arrays with boolean, integer or float data type are stored as extension type 1. The extension
+payload starts with a header that contains the numpy type string (like "<f4") and the shape, followed by
+the raw buffer of the array in C (row-major) order:
+
+    uint8 length of the type string | type string | uint8 number of dimensions | uint8 length of the padding |
+    zero padding | uint64 little endian size of each dimension | raw buffer
+
+The padding aligns the raw buffer to a multiple of the alignment of the data type, at least 8 bytes,
+relative to the start of the payload.
+
+Datetime indexes and numpy datetime64 arrays are stored as extension type 2. The payload
+is a little endian int64 buffer with nanoseconds since 1970-01-01T00:00:00.
+
+The message pack parser creates a separate bytes object for each extension payload, hence the data of each
+array is copied once out of the message body. The bytes objects are allocated aligned, so that the unpacked
+arrays are aligned read-only numpy views on the extension payloads and no further copy is created.
+"""
+
+MESSAGE_PACK_CONTENT_TYPE = "application/msgpack"
+EXT_NUMPY_ARRAY = 1
+EXT_DATETIME_INDEX = 2
+
+
+def _pack_numpy_array(array: numpy.ndarray) -> msgpack.ExtType:
+    type_string = array.dtype.str.encode("ascii")
+    alignment = max(8, array.dtype.alignment)
+    padding = -(3 + len(type_string) + 8 * array.ndim) % alignment
+    header = struct.pack(f"<B{len(type_string)}sBB{padding}x{array.ndim}Q", len(type_string), type_string,
+                         array.ndim, padding, *array.shape)
+    return msgpack.ExtType(EXT_NUMPY_ARRAY, b"".join([header, numpy.ascontiguousarray(array).data]))
+
+
+def _unpack_numpy_array(data: bytes) -> numpy.ndarray:
+    type_length = data[0]
+    type_string = data[1:1 + type_length].decode("ascii")
+    ndim = data[1 + type_length]
+    offset = 3 + type_length + data[2 + type_length]
+    shape = struct.unpack_from(f"<{ndim}Q", data, offset)
+    offset += 8 * ndim
+    return numpy.frombuffer(data, dtype=numpy.dtype(type_string), offset=offset).reshape(shape)
+
+
+def _default(obj: Any) -> Any:
+    """Convert numpy and pandas objects that are not supported by message pack"""
+    if isinstance(obj, pandas.DatetimeIndex):
+        return msgpack.ExtType(EXT_DATETIME_INDEX, obj.asi8.astype("<i8").tobytes())
+    if isinstance(obj, numpy.ndarray):
+        if obj.dtype.kind == "M":
+            return msgpack.ExtType(EXT_DATETIME_INDEX,
+                                   obj.astype("datetime64[ns]").view("<i8").tobytes())
+        if obj.dtype.kind in "biuf":
+            return _pack_numpy_array(obj)
+        return obj.tolist()
+    if isinstance(obj, numpy.generic):
+        return obj.item()
+    raise TypeError(f"Unable to serialize object of type {type(obj)} with message pack")
+
+
+def _ext_hook(code: int, data: bytes) -> Any:
+    if code == EXT_NUMPY_ARRAY:
+        return _unpack_numpy_array(data)
+    if code == EXT_DATETIME_INDEX:
+        return pandas.DatetimeIndex(numpy.frombuffer(data, dtype="<i8").view("datetime64[ns]"))
+    return msgpack.ExtType(code, data)
+
+
+def packb(obj: Any) -> bytes:
+    """Serialize a python object with numpy arrays and datetime indexes into a raw message pack blob
+
+    Args:
+        obj: The object to serialize, usually a dictionary created by UdfData.to_dict(array_encoding="numpy")
+
+    Returns:
+        bytes: The message pack blob
+
+    """
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def unpackb(blob: bytes) -> Any:
+    """Deserialize a raw message pack blob, numpy arrays are created as read-only views
+    on the message data
+
+    Args:
+        blob (bytes): The message pack blob
+
+    Returns:
+        The deserialized python object
+
+    """
+    return msgpack.unpackb(blob, ext_hook=_ext_hook, raw=False)
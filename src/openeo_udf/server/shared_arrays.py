@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+from typing import Dict, Tuple
+
+import numpy
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+Transfer of numpy arrays between processes with shared memory blocks.
+
+The sender copies the array into a new shared memory block and sends the small, picklable
+descriptor of the block to the receiver. The descriptor stores the name of the block, the numpy type
+string and the shape of the array. The receiver attaches to the block by name and uses the array as view
+on the block or copies it into private memory. Hence the array data is copied once and never pickled.
+
+Shared memory requires the multiprocessing.shared_memory module of Python 3.8 or later.
+"""
+
+
+def shared_memory_available() -> bool:
+    """Check if arrays can be transferred with shared memory on this platform
+
+    Returns:
+        bool: True if the multiprocessing.shared_memory module is available
+
+    """
+    return shared_memory is not None
+
+
+def array_to_shared_memory(array: numpy.ndarray) -> Tuple[Dict, 'shared_memory.SharedMemory']:
+    """Copy an array into a new shared memory block
+
+    The caller owns the block and must release it with release_shared_memory(block, unlink=True)
+    if the receiver does not unlink it.
+
+    Args:
+        array (numpy.ndarray): The array to copy, must have a boolean, integer, float or complex data type
+
+    Returns:
+        tuple: The descriptor of the shared array and the shared memory block
+
+    """
+    if shared_memory is None:
+        raise Exception("Shared memory requires the multiprocessing.shared_memory module of Python 3.8")
+
+    array = numpy.asarray(array)
+    if array.dtype.hasobject:
+        raise Exception(f"Unable to store arrays of data type {array.dtype} in shared memory")
+
+    # Shared memory blocks can not be empty
+    block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+    view = numpy.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+    view[...] = array
+    del view
+
+    descriptor = {"name": block.name, "dtype": array.dtype.str, "shape": list(array.shape)}
+    return descriptor, block
+
+
+def array_from_shared_memory(descriptor: Dict) -> Tuple[numpy.ndarray, 'shared_memory.SharedMemory']:
+    """Attach to the shared memory block of a shared array descriptor
+
+    The returned array is a view on the block, the block can only be released after all views are deleted.
+
+    Args:
+        descriptor (dict): The shared array descriptor
+
+    Returns:
+        tuple: The array view and the shared memory block
+
+    """
+    if shared_memory is None:
+        raise Exception("Shared memory requires the multiprocessing.shared_memory module of Python 3.8")
+
+    block = shared_memory.SharedMemory(name=descriptor["name"])
+    array = numpy.ndarray(tuple(descriptor["shape"]), dtype=numpy.dtype(descriptor["dtype"]), buffer=block.buf)
+    return array, block
+
+
+def copy_array_from_shared_memory(descriptor: Dict, unlink: bool = True) -> numpy.ndarray:
+    """Copy a shared array into private memory and release its shared memory block
+
+    Args:
+        descriptor (dict): The shared array descriptor
+        unlink (bool): Remove the shared memory block after the array was copied
+
+    Returns:
+        numpy.ndarray: The copy of the shared array
+
+    """
+    view, block = array_from_shared_memory(descriptor)
+    array = view.copy()
+    del view
+    release_shared_memory(block, unlink=unlink)
+    return array
+
+
+def release_shared_memory(block: 'shared_memory.SharedMemory', unlink: bool = False):
+    """Close a shared memory block and optionally remove it
+
+    A block that still has array views can not be closed, it is closed when the process exits.
+
+    Args:
+        block (shared_memory.SharedMemory): The shared memory block
+        unlink (bool): Remove the block, so that no other process can attach to it
+
+    """
+    try:
+        block.close()
+    except BufferError:
+        pass
+    if unlink:
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import base64
+import datetime
+import json
+from typing import Iterator
+
+import numpy
+
+from openeo_udf.api.binary_array import LIST_ARRAY_ENCODING, BINARY_ARRAY_ENCODING, BINARY_DTYPE_KINDS, \
+    binary_array_header
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.udf_data import UdfData
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+Streaming JSON encoder of UDF data.
+
+The encoder creates the same JSON document as UdfData.to_dict(), but yields it as a sequence of
+text chunks that can be written to a chunked HTTP response. Data cubes, feature collections, structured data
+and machine learn models are encoded one object at a time. The array data of a data cube is encoded in blocks of
+slices along the first dimension, hence the memory required to encode the response is close to the size of a block
+and not the size of the full result.
+"""
+
+# The approximate number of raw array bytes that are encoded in a single chunk
+STREAM_CHUNK_SIZE = 1 << 20
+
+
+def _json_default(obj):
+    """Encode time stamps of dimension coordinates as ISO strings like the JSON response of the server"""
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _rows_per_chunk(array: numpy.ndarray) -> int:
+    row_size = array[0].nbytes if array.shape[0] > 0 else 0
+    return max(1, STREAM_CHUNK_SIZE // max(1, row_size))
+
+
+def stream_array_list(array: numpy.ndarray) -> Iterator[str]:
+    """Encode an array as nested JSON lists in blocks of slices along the first dimension
+
+    Args:
+        array (numpy.ndarray): The array to encode
+
+    Returns:
+        Iterator of JSON text chunks
+
+    >>> "".join(stream_array_list(numpy.arange(6).reshape((3, 2))))
+    '[[0, 1], [2, 3], [4, 5]]'
+    >>> "".join(stream_array_list(numpy.asarray(5)))
+    '5'
+
+    """
+    if array.ndim == 0:
+        yield json.dumps(array.tolist())
+        return
+
+    rows = _rows_per_chunk(array)
+    yield "["
+    for start in range(0, array.shape[0], rows):
+        # Strip the brackets of the block list to join the blocks into a single list
+        block = json.dumps(array[start:start + rows].tolist())[1:-1]
+        yield block if start == 0 else ", " + block
+    yield "]"
+
+
+def stream_array_binary(array: numpy.ndarray) -> Iterator[str]:
+    """Encode an array as typed binary array dictionary, the base64 encoded raw buffer is created
+    in blocks of slices along the first dimension
+
+    Args:
+        array (numpy.ndarray): The array to encode, must have a boolean, integer or float data type
+
+    Returns:
+        Iterator of JSON text chunks
+
+    >>> "".join(stream_array_binary(numpy.arange(4, dtype="<i2").reshape((2, 2))))
+    '{"dtype": "int16", "shape": [2, 2], "byteorder": "little", "data": "AAABAAIAAwA="}'
+
+    """
+    header = json.dumps(binary_array_header(array))
+    yield header[:-1] + ', "data": "'
+
+    if array.ndim == 0:
+        yield base64.b64encode(array.tobytes()).decode("ascii")
+    else:
+        rows = _rows_per_chunk(array)
+        # Base64 encodes groups of 3 bytes, the remaining bytes of a block are prepended to the next block
+        remainder = b""
+        for start in range(0, array.shape[0], rows):
+            buffer = remainder + numpy.ascontiguousarray(array[start:start + rows]).tobytes()
+            size = len(buffer) - len(buffer) % 3
+            remainder = buffer[size:]
+            if size > 0:
+                yield base64.b64encode(buffer[:size]).decode("ascii")
+        if remainder:
+            yield base64.b64encode(remainder).decode("ascii")
+
+    yield '"}'
+
+
+def stream_datacube_json(cube: DataCube, array_encoding: str = LIST_ARRAY_ENCODING) -> Iterator[str]:
+    """Encode a data cube as JSON text chunks, the result is identical to DataCube.to_dict()
+
+    Args:
+        cube (DataCube): The data cube to encode
+        array_encoding (str): The array encoding "list" or "binary"
+
+    Returns:
+        Iterator of JSON text chunks
+
+    """
+    if cube.array is None:
+        yield json.dumps(cube.to_dict(array_encoding=array_encoding), default=_json_default)
+        return
+
+    array = cube.array
+    yield '{"id": ' + json.dumps(array.name) + ', "data": '
+
+    values = array.values
+    if array_encoding == BINARY_ARRAY_ENCODING and values.dtype.kind in BINARY_DTYPE_KINDS:
+        yield from stream_array_binary(values)
+    else:
+        yield from stream_array_list(values)
+
+    if values.dtype.kind in BINARY_DTYPE_KINDS:
+        yield ', "dtype": ' + json.dumps(values.dtype.name)
+    if "description" in array.attrs:
+        yield ', "description": ' + json.dumps(array.attrs["description"])
+    yield ', "dimensions": ' + json.dumps(cube.dimensions_to_list(array_encoding=array_encoding),
+                                            default=_json_default) + "}"
+
+
+def stream_udf_data_json(udf_data: UdfData, array_encoding: str = LIST_ARRAY_ENCODING) -> Iterator[str]:
+    """Encode a UdfData object as JSON text chunks, the result is identical to UdfData.to_dict()
+
+    Args:
+        udf_data (UdfData): The UDF data object to encode
+        array_encoding (str): The array encoding "list" or "binary" of the data cubes
+
+    Returns:
+        Iterator of JSON text chunks
+
+    >>> from openeo_udf.api.tools import create_datacube
+    >>> cube = create_datacube(name="temp", value=1, dims=("y", "x"), shape=(2, 2))
+    >>> udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[cube])
+    >>> json.loads("".join(stream_udf_data_json(udf_data))) == udf_data.to_dict()
+    True
+
+    """
+    # The encoding is checked before the generator is created, so that the error is raised before the response starts
+    if array_encoding not in (LIST_ARRAY_ENCODING, BINARY_ARRAY_ENCODING):
+        raise Exception(f"Unsupported array encoding {array_encoding} of the streaming JSON encoder, "
+                        f"supported are {[LIST_ARRAY_ENCODING, BINARY_ARRAY_ENCODING]}")
+
+    return _stream_udf_data_json(udf_data, array_encoding)
+
+
+def _stream_udf_data_json(udf_data: UdfData, array_encoding: str) -> Iterator[str]:
+    header = json.dumps({"proj": udf_data.proj, "user_context": udf_data.user_context,
+                         "server_context": udf_data.server_context})
+    yield header[:-1]
+
+    datacubes = udf_data.get_datacube_list()
+    if datacubes is not None:
+        yield ', "datacubes": ['
+        for i, cube in enumerate(datacubes):
+            if i > 0:
+                yield ", "
+            yield from stream_datacube_json(cube, array_encoding=array_encoding)
+        yield "]"
+
+    # Feature collections are encoded as GeoJSON or with WKB geometries depending on the array encoding
+    objects = [("feature_collection_list", udf_data.get_feature_collection_list(), {"array_encoding": array_encoding}),
+               ("structured_data_list", udf_data.get_structured_data_list(), {}),
+               ("machine_learn_models", udf_data.get_ml_model_list(), {})]
+    for key, entries, options in objects:
+        if entries is None:
+            continue
+        yield ', "' + key + '": ['
+        for i, entry in enumerate(entries):
+            text = json.dumps(entry.to_dict(**options), default=_json_default)
+            yield text if i == 0 else ", " + text
+        yield "]"
+
+    yield "}"
+
+
+if __name__ == "__main__":
+    import doctest
+    doctest.testmod()
@@ -21,3 +21,17 @@ def create_storage_directory():
     # Create the machine learn storage path
     if not os.path.isdir(UdfConfiguration.machine_learn_storage_path):
         os.mkdir(UdfConfiguration.machine_learn_storage_path)
+
+
+def process_cpu_count() -> int:
+    """Return the number of CPUs that the UDF code of this process should use for its own threads or processes
+
+    The CPUs are divided between the worker processes of the pool, so that UDFs running in parallel worker
+    processes do not oversubscribe the cores. Without worker pool all CPUs are available.
+
+    Returns:
+        int: The number of CPUs, at least 1
+
+    """
+    cpus = os.cpu_count() or 1
+    return max(1, cpus // max(1, UdfConfiguration.worker_processes))
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 import msgpack
 import base64
+import json
+import numpy
 from fastapi import FastAPI
 from fastapi import Body
 from starlette.requests import Request
@@ -10,18 +12,30 @@ import sys
 import os
 from os import listdir
 from os.path import isfile, join
-from typing import List
+from typing import Dict, List
 
 import requests
 from fastapi import HTTPException
-from starlette.responses import PlainTextResponse
+from starlette.responses import PlainTextResponse, Response, StreamingResponse
 import ujson
 from openeo_udf.server.config import UdfConfiguration
 from openeo_udf.server.data_model.legacy.udf_legacy_schemas import UdfLegacyDataModel, UdfLegacyRequestModel
 
-from openeo_udf.server.data_model.udf_schemas import UdfRequestModel, ErrorResponseModel, UdfDataModel
-from openeo_udf.api.run_code import run_legacy_user_code, run_udf_model_user_code
-from openeo_udf.server.machine_learn_database import ResponseStorageModel, RequestStorageModel, store_model
+from openeo_udf.server.data_model.udf_schemas import UdfRequestModel, ErrorResponseModel, UdfDataModel, \
+    UdfBatchRequestModel
+from openeo_udf.api.run_code import code_cache_info, build_base_execution_context, execution_context_info
+from openeo_udf.api.binary_array import NUMPY_ARRAY_ENCODING, LIST_ARRAY_ENCODING
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.machine_learn_model import MachineLearnModelConfig, model_cache_info, evict_cached_model
+from openeo_udf.server import message_pack
+from openeo_udf.server.message_pack import MESSAGE_PACK_CONTENT_TYPE
+from openeo_udf.server.streaming import stream_udf_data_json
+from openeo_udf.server.compression import ContentEncodingMiddleware
+from openeo_udf.server.worker_pool import execute_user_code, execute_user_code_batch, start_worker_pool, \
+    stop_worker_pool, worker_pool_info, worker_model_preload_info
+from openeo_udf.server.arrow_ipc import ARROW_STREAM_CONTENT_TYPE, read_arrow_stream, write_arrow_stream
+from openeo_udf.server.machine_learn_database import ResponseStorageModel, RequestStorageModel, store_model, \
+    preload_models
 
 __license__ = "Apache License, Version 2.0"
 __author__ = "Soeren Gebbert"
@@ -69,36 +83,152 @@ Out[10]: {1: [1, 2, 3, 4, 5, 6], b'w': b'fffff', b'd': {b'd': b'd'}}
 
 """
 
+# The content type of newline delimited JSON responses
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
 app = FastAPI(title="UDF Server for geodata processing",
               description="This server processes UDF data")
+# Request and response bodies can be compressed with gzip, zstd or lz4
+app.add_middleware(ContentEncodingMiddleware)
+
+
+# The server is ready when the startup, including the warmup of the preloaded models, is finished
+_server_state = {"ready": False}
+
+
+@app.on_event("startup")
+def startup():
+    """Import the modules and the optional frameworks of the UDF execution context once at server startup,
+    wait until the worker processes are ready and load and warm up the preloaded machine learn models"""
+    build_base_execution_context()
+    # The worker processes preload the models before they report that they are ready, the server process
+    # only runs the UDF code and needs the models if no worker pool was started
+    if start_worker_pool() is None:
+        preload_models()
+    _server_state["ready"] = True
+
+
+@app.on_event("shutdown")
+def shutdown():
+    """Stop the worker processes of the UDF jobs"""
+    _server_state["ready"] = False
+    stop_worker_pool()
+
+
+@app.get("/ready", response_model=Dict, tags=["metrics"],
+         responses={200: {"content": {"application/json": {}},
+                          "description": "The server is ready and the preloaded models are warmed up"},
+                    503: {"content": {"application/json": {}}}})
+async def ready():
+    """Report if the server is ready to process requests, this is the case after the preloaded machine learn
+    models were loaded and warmed up. The load and warmup statistics of the preloaded models are returned."""
+    if not _server_state["ready"]:
+        response = ErrorResponseModel(message="The server is starting and warms up the preloaded models")
+        raise HTTPException(status_code=503, detail=response.dict())
+    return {"ready": True, "models": worker_model_preload_info()}
 
 
 @app.post("/udf", response_model=UdfDataModel, tags=["udf"])
-async def udf(request: UdfRequestModel = Body(...)):
-    """Run a Python user defined function (UDF) on the provided data collection"""
+async def udf(http_request: Request, request: UdfRequestModel = Body(...)):
+    """Run a Python user defined function (UDF) on the provided data collection. The server context may set
+    the deadline of the UDF job in seconds with the "timeout" entry."""
 
     try:
-        result = run_udf_model_user_code(udf_model=request)
-        return result
+        data = UdfData.from_udf_data_model(request.data)
+        result = await execute_user_code(request.code.source, data, receive=http_request.receive)
+        # The server context may request typed binary arrays instead of nested lists for the variable values
+        array_encoding = request.data.server_context.get("array_encoding", LIST_ARRAY_ENCODING)
+        result = result.to_udf_data_model(array_encoding=array_encoding)
+        return Response(json.dumps(result.dict(), default=numpy_json_default), media_type="application/json")
     except Exception:
         e_type, e_value, e_tb = sys.exc_info()
         response = ErrorResponseModel(message=str(e_value), traceback=str(traceback.format_tb(e_tb)))
         raise HTTPException(status_code=400, detail=response.dict())
 
 
+@app.post("/udf_batch", tags=["udf"], response_model=str,
+          responses={200: {"content": {NDJSON_CONTENT_TYPE: {}},
+                           "description": "One JSON object per line for each UDF data object of the request, "
+                                          "with the index of the UDF data object and the resulting UDF data "
+                                          "or the error"},
+                     400: {"content": {"application/json": {}}}})
+async def udf_batch(http_request: Request, request: UdfBatchRequestModel = Body(...)):
+    """Run a Python user defined function (UDF) on a list of data collections, like the tiles of a large data cube.
+    The data collections are processed in parallel in the worker pool of the server. The results are streamed
+    as newline delimited JSON, in the order of the data collections or as soon as they are computed."""
+
+    try:
+        # Machine learn models that are used by several data collections are only loaded once
+        ml_models = {}
+        data_list = []
+        for data_model in request.data:
+            models = []
+            for m in data_model.machine_learn_models:
+                key = json.dumps(m.dict(), sort_keys=True)
+                if key not in ml_models:
+                    ml_models[key] = MachineLearnModelConfig.from_dict(m.dict())
+                models.append(ml_models[key])
+            data_list.append(UdfData.from_udf_data_model(data_model, machine_learn_models=models))
+    except Exception:
+        e_type, e_value, e_tb = sys.exc_info()
+        response = ErrorResponseModel(message=str(e_value), traceback=str(traceback.format_tb(e_tb)))
+        raise HTTPException(status_code=400, detail=response.dict())
+
+    async def results():
+        async for index, result, error in execute_user_code_batch(request.code.source, data_list,
+                                                                  ordered=request.ordered,
+                                                                  receive=http_request.receive):
+            if error is not None:
+                response = ErrorResponseModel(message=str(error),
+                                              traceback=str(traceback.format_tb(error.__traceback__)))
+                line = {"index": index, "error": response.dict()}
+            else:
+                array_encoding = result.server_context.get("array_encoding", LIST_ARRAY_ENCODING)
+                line = {"index": index, "data": result.to_udf_data_model(array_encoding=array_encoding).dict()}
+            yield json.dumps(line, default=numpy_json_default) + "\n"
+
+    return StreamingResponse(results(), media_type=NDJSON_CONTENT_TYPE)
+
+
+def numpy_json_default(obj):
+    """Convert numpy arrays and scalars of the UDF data model into JSON compatible objects"""
+    if isinstance(obj, numpy.ndarray):
+        return obj.tolist()
+    if isinstance(obj, numpy.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def is_raw_message_pack(request: Request) -> bool:
+    """Check if the request body is a raw message pack blob or a base64 encoded message pack blob"""
+    return request.headers.get("content-type", "").startswith(MESSAGE_PACK_CONTENT_TYPE)
+
+
 @app.post("/udf_message_pack", tags=["udf"], response_model=str,
-          responses={200: {"content": {"application/base64": {}},
-                           "description": "The base64 encoded string"},
+          responses={200: {"content": {"application/base64": {},
+                                       MESSAGE_PACK_CONTENT_TYPE: {}},
+                           "description": "The base64 encoded string or the raw message pack blob, "
+                                          "depending on the content type of the request"},
                      400: {"content": {"application/json": {}}}})
 async def udf_message_pack(request: Request):
     """Run a Python user defined function (UDF) on the provided data collection
-    that are base64 encoded message pack objects"""
+    that are base64 encoded message pack objects. If the content type of the request
+    is application/msgpack, then the body is a raw message pack blob in which numpy arrays
+    and datetime indexes are stored as message pack extension types."""
 
     try:
         data = await request.body()
+        if is_raw_message_pack(request):
+            udf_model = UdfRequestModel(**message_pack.unpackb(data))
+            result = await execute_user_code(udf_model.code.source, UdfData.from_udf_data_model(udf_model.data),
+                                             receive=request.receive)
+            result = message_pack.packb(result.to_dict(array_encoding=NUMPY_ARRAY_ENCODING))
+            return Response(result, media_type=MESSAGE_PACK_CONTENT_TYPE)
+
         blob = base64.b64decode(data)
-        udf_model: UdfRequestModel = msgpack.unpackb(blob, raw=False)
-        result = run_udf_model_user_code(udf_model=udf_model)
+        udf_model = UdfRequestModel(**msgpack.unpackb(blob, raw=False))
+        result = await execute_user_code(udf_model.code.source, UdfData.from_udf_data_model(udf_model.data),
+                                         receive=request.receive)
         result = base64.b64encode(msgpack.packb(result.to_dict()))
         return PlainTextResponse(result)
     except Exception:
@@ -108,12 +238,20 @@ async def udf_message_pack(request: Request):
 
 
 @app.post("/udf_legacy", response_model=UdfLegacyDataModel, tags=["udf legacy"])
-async def udf_legacy(request: UdfLegacyRequestModel = Body(...)):
-    """Run a Python user defined function (UDF) on the provided legacy data"""
+async def udf_legacy(http_request: Request, request: UdfLegacyRequestModel = Body(...)):
+    """Run a Python user defined function (UDF) on the provided legacy data. If the server context
+    sets "stream_response" to true, the result is written as chunked JSON response one object at a time and the
+    data cube arrays in blocks of slices along the first dimension."""
 
     try:
-        result = run_legacy_user_code(dict_data=request.dict())
-        return result
+        data = UdfData.from_dict(request.data.dict())
+        array_encoding = data.server_context.get("array_encoding", LIST_ARRAY_ENCODING)
+        result = await execute_user_code(request.code.source, data, receive=http_request.receive)
+        if request.data.server_context.get("stream_response", False) is True:
+            return StreamingResponse(stream_udf_data_json(result, array_encoding=array_encoding),
+                                     media_type="application/json")
+
+        return result.to_dict(array_encoding=array_encoding)
     except Exception:
         e_type, e_value, e_tb = sys.exc_info()
         response = ErrorResponseModel(message=str(e_value), traceback=str(traceback.format_tb(e_tb)))
@@ -121,18 +259,32 @@ async def udf_legacy(request: UdfLegacyRequestModel = Body(...)):
 
 
 @app.post("/udf_legacy_message_pack", response_model=str, tags=["udf legacy"],
-          responses={200: {"content": {"application/base64": {}},
-                           "description": "The base64 encoded string"},
+          responses={200: {"content": {"application/base64": {},
+                                       MESSAGE_PACK_CONTENT_TYPE: {}},
+                           "description": "The base64 encoded string or the raw message pack blob, "
+                                          "depending on the content type of the request"},
                      400: {"content": {"application/json": {}}}})
 async def udf_legacy_message_pack(request: Request):
     """Run a Python user defined function (UDF) on the provided legacy
-    data that are base64 encoded message pack objects"""
+    data that are base64 encoded message pack objects. If the content type of the request
+    is application/msgpack, then the body is a raw message pack blob in which numpy arrays
+    and datetime indexes are stored as message pack extension types."""
 
     try:
         data = await request.body()
+        if is_raw_message_pack(request):
+            dict_data = message_pack.unpackb(data)
+            result = await execute_user_code(dict_data["code"]["source"], UdfData.from_dict(dict_data["data"]),
+                                             receive=request.receive)
+            result = result.to_dict(array_encoding=NUMPY_ARRAY_ENCODING)
+            return Response(message_pack.packb(result), media_type=MESSAGE_PACK_CONTENT_TYPE)
+
         blob = base64.b64decode(data)
         dict_data = msgpack.unpackb(blob, raw=False)
-        result = run_legacy_user_code(dict_data=dict_data)
+        data = UdfData.from_dict(dict_data["data"])
+        array_encoding = data.server_context.get("array_encoding", LIST_ARRAY_ENCODING)
+        result = await execute_user_code(dict_data["code"]["source"], data, receive=request.receive)
+        result = result.to_dict(array_encoding=array_encoding)
         result = base64.b64encode(msgpack.packb(result))
         return PlainTextResponse(result)
     except Exception:
@@ -141,6 +293,40 @@ async def udf_legacy_message_pack(request: Request):
         raise HTTPException(status_code=400, detail=response.dict())
 
 
+@app.post("/udf_arrow", tags=["udf"], response_model=str,
+          responses={200: {"content": {ARROW_STREAM_CONTENT_TYPE: {}},
+                           "description": "The resulting UDF data as sequence of Apache Arrow IPC streams"},
+                     400: {"content": {"application/json": {}}}})
+async def udf_arrow(request: Request):
+    """Run a Python user defined function (UDF) on the provided data that is a sequence of
+    Apache Arrow IPC streams. The first stream stores the UDF code and the UDF data description, each
+    following stream stores a single data cube or feature collection."""
+
+    try:
+        data = await request.body()
+        code, udf_data = read_arrow_stream(data)
+        if code is None:
+            raise Exception("Missing UDF code in Arrow stream description")
+        result = await execute_user_code(code["source"], udf_data, receive=request.receive)
+        return Response(write_arrow_stream(result), media_type=ARROW_STREAM_CONTENT_TYPE)
+    except Exception:
+        e_type, e_value, e_tb = sys.exc_info()
+        response = ErrorResponseModel(message=str(e_value), traceback=str(traceback.format_tb(e_tb)))
+        raise HTTPException(status_code=400, detail=response.dict())
+
+
+@app.get("/metrics", response_model=Dict, tags=["metrics"])
+async def metrics():
+    """Return the runtime statistics of the server, like the hits and misses of the compiled UDF cache and
+    the machine learn model cache, the import times of the UDF execution context at startup and the job
+    statistics of the worker pool"""
+    return {"code_cache": code_cache_info(),
+            "model_cache": model_cache_info(),
+            "model_preload": worker_model_preload_info(),
+            "execution_context": execution_context_info(),
+            "worker_pool": worker_pool_info()}
+
+
 @app.get("/storage", response_model=List[ResponseStorageModel], tags=["ML Storage"],
          responses={200: {"content": {"application/json": {}},
                           "description": "A list of metadata information about the stored machine model that include "
@@ -192,6 +378,7 @@ async def ml_delete(md5_hash: str):
             # Remove the json file
             if os.path.exists(path + ".json"):
                 os.remove(path + ".json")
+            evict_cached_model(md5_hash)
 
             return PlainTextResponse(md5_hash)
 
@@ -0,0 +1,674 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import xarray
+from starlette.types import Receive
+
+from openeo_udf.api.binary_array import BINARY_DTYPE_KINDS
+from openeo_udf.api.datacube import DataCube, chunk_array
+from openeo_udf.api.run_code import run_user_code, build_base_execution_context, FRAMEWORK_MODULES
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.machine_learn_database import preload_models, model_preload_info
+from openeo_udf.server.shared_arrays import shared_memory_available, array_to_shared_memory, \
+    array_from_shared_memory, copy_array_from_shared_memory, release_shared_memory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+"""
+Process pool execution backend of the UDF endpoints.
+
+The UDF endpoints decode the request in the event loop of the server and submit the UDF code and
+the UDF data as job to a pool of worker processes. The event loop keeps accepting and decoding requests
+while the jobs are running. The number of worker processes is configured in UdfConfiguration.worker_processes,
+if it is 0 the UDF code is executed in the threads of the default executor of the event loop of the server.
+
+With the default "forkserver" start method the fork server process imports this module, and hence the
+run_code execution context with numpy, xarray, pandas and geopandas, and the preloaded ML frameworks once.
+The worker processes are forked from the warm fork server, hence they do not import these modules again.
+Each worker process builds the base execution context when it is started and keeps its own cache of
+compiled UDF modules.
+
+The arrays of the data cubes are transferred to the worker processes and back in shared memory
+blocks (Python 3.8 or later), the rest of the UDF data is pickled.
+
+The deadline of a job is set by the server default UdfConfiguration.execution_timeout, or by the "timeout"
+entry of the server context of a request. A job that exceeds its deadline, or whose HTTP client disconnected,
+is cancelled by killing its worker process, which is immediately replaced by a new worker process.
+Without worker pool deadlines and cancellation are not enforced, because threads can not be stopped.
+"""
+
+READY_MESSAGE = "ready"
+
+# A data cube that is sent to a worker process, either as shared memory descriptor or as pickled data cube
+SharedDataCube = Union[Dict, DataCube]
+
+
+def _initialize_worker(configuration: Dict):
+    """Apply the server configuration, build the UDF execution context and preload the machine learn models
+    in a new worker process"""
+    for key, value in configuration.items():
+        setattr(UdfConfiguration, key, value)
+    build_base_execution_context()
+    # The worker keeps the preloaded models in its model cache
+    if UdfConfiguration.preload_models:
+        preload_models()
+
+
+def _run_job(code: str, data: UdfData) -> Tuple[UdfData, float]:
+    """Run the UDF code in a worker process and measure the execution time"""
+    start = time.perf_counter()
+    result = run_user_code(code, data)
+    return result, time.perf_counter() - start
+
+
+def _datacubes_to_shared_memory(cubes: List[DataCube], blocks: List) -> List[SharedDataCube]:
+    """Copy the arrays of the data cubes into shared memory blocks, cubes that can not be
+    stored in shared memory are kept unchanged"""
+    entries = []
+    for cube in cubes:
+        array = cube.array
+        if array is None or array.dtype.kind not in BINARY_DTYPE_KINDS:
+            entries.append(cube)
+            continue
+        descriptor, block = array_to_shared_memory(array.values)
+        blocks.append(block)
+        coords = {name: (coord.dims, coord.values) for name, coord in array.coords.items()}
+        entry = {"name": array.name, "dims": array.dims, "coords": coords, "attrs": dict(array.attrs),
+                 "array": descriptor}
+        # Dask backed arrays are computed into the block and chunked again in the worker process
+        if array.chunks is not None:
+            entry["chunks"] = dict(zip(array.dims, array.chunks))
+        entries.append(entry)
+    return entries
+
+
+def _datacube_from_entry(entry: SharedDataCube, values) -> DataCube:
+    if isinstance(entry, DataCube):
+        return entry
+    array = xarray.DataArray(values, dims=entry["dims"], coords=entry["coords"], name=entry["name"],
+                             attrs=entry["attrs"])
+    return DataCube(array=chunk_array(array, entry.get("chunks")))
+
+
+def _run_shared_memory_job(code: str, data: UdfData, entries: List[SharedDataCube]) \
+        -> Tuple[UdfData, List[SharedDataCube], float]:
+    """Run the UDF code in a worker process on data cubes that are views on shared memory blocks,
+    the arrays of the result data cubes are copied into new shared memory blocks that are removed by the server"""
+    inputs = []
+    try:
+        result, execution_time = _run_shared_memory_udf(code, data, entries, inputs)
+        output_blocks = []
+        try:
+            # The cube list is cleared in place, hence a copy is exported
+            result_entries = _datacubes_to_shared_memory(list(result.get_datacube_list()), output_blocks)
+        except BaseException:
+            for block in output_blocks:
+                release_shared_memory(block, unlink=True)
+            raise
+        result.set_datacube_list([])
+        for block in output_blocks:
+            release_shared_memory(block)
+        return result, result_entries, execution_time
+    finally:
+        # Input blocks that are still referenced by the UDF module are closed when the worker exits
+        for block in inputs:
+            release_shared_memory(block)
+
+
+def _run_shared_memory_udf(code: str, data: UdfData, entries: List[SharedDataCube], inputs: List) \
+        -> Tuple[UdfData, float]:
+    cubes = []
+    for entry in entries:
+        values = None
+        if not isinstance(entry, DataCube):
+            values, block = array_from_shared_memory(entry["array"])
+            inputs.append(block)
+        cubes.append(_datacube_from_entry(entry, values))
+    data.set_datacube_list(cubes)
+    return _run_job(code, data)
+
+
+def _server_configuration() -> Dict:
+    return {key: value for key, value in vars(UdfConfiguration).items() if not key.startswith("_")}
+
+
+def _worker_main(connection: Connection, configuration: Dict):
+    """The main loop of a worker process that receives jobs from the server until the connection is closed
+
+    A job is a tuple of a function and its arguments, the worker sends a tuple of a success flag and the
+    result or the raised exception back to the server. The ready message contains the load and warmup
+    statistics of the preloaded models.
+    """
+    _initialize_worker(configuration)
+    connection.send((READY_MESSAGE, model_preload_info()))
+
+    while True:
+        try:
+            job = connection.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        function, args = job
+        try:
+            response = (True, function(*args))
+        except BaseException as e:
+            response = (False, e)
+        try:
+            connection.send(response)
+        except Exception as e:
+            # The exception or the result can not be pickled
+            connection.send((False, Exception(f"Unable to send the result of the UDF job to the server: {e}")))
+
+
+class _Worker:
+    """A worker process and the connection to it"""
+
+    def __init__(self, context, configuration: Dict):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, configuration))
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        self.model_preload = {}
+
+    def wait_ready(self):
+        """Wait until the worker process was initialized"""
+        if not self.ready:
+            message = self.connection.recv()
+            if not isinstance(message, tuple) or message[0] != READY_MESSAGE:
+                raise Exception("The worker process did not start")
+            self.model_preload = message[1]
+            self.ready = True
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker process after it finished its current job"""
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout)
+        self.kill()
+
+    def kill(self):
+        """Kill the worker process immediately"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class WorkerPool:
+    """A pool of worker processes that runs UDF jobs
+
+    Each job waits in the event loop for a free worker process. If the deadline of a job is exceeded or
+    the job is cancelled, then its worker process is killed and replaced by a new worker process, hence
+    the slot is freed immediately.
+
+    Args:
+        workers (int): The number of worker processes
+        start_method (str): The multiprocessing start method "forkserver", "spawn" or "fork"
+        shared_memory (bool): Transfer the data cube arrays in shared memory blocks, if available
+
+    """
+
+    def __init__(self, workers: int, start_method: Optional[str] = None, shared_memory: Optional[bool] = None):
+        if workers < 1:
+            raise Exception(f"The worker pool requires at least one worker process, got {workers}")
+        if start_method is None:
+            start_method = UdfConfiguration.worker_start_method
+        if shared_memory is None:
+            shared_memory = UdfConfiguration.worker_shared_memory
+
+        self.workers = workers
+        self.start_method = start_method
+        self.shared_memory = shared_memory and shared_memory_available()
+
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # The fork server imports the modules once, the workers are forked from it
+            preload = ["openeo_udf.server.worker_pool"]
+            for framework in UdfConfiguration.preload_frameworks:
+                preload.extend(FRAMEWORK_MODULES.get(framework, []))
+            self._context.set_forkserver_preload(preload)
+
+        self._configuration = _server_configuration()
+        # The workers divide the CPUs by the actual number of worker processes of this pool
+        self._configuration["worker_processes"] = workers
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = [_Worker(self._context, self._configuration) for i in range(workers)]
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        for worker in self._workers:
+            self._idle.put(worker)
+        # The threads wait for the results of the worker processes, hence the event loop is not blocked
+        self._threads = ThreadPoolExecutor(max_workers=max(32, 4 * workers))
+        self._statistics = {"submitted_jobs": 0, "completed_jobs": 0, "failed_jobs": 0, "pending_jobs": 0,
+                            "queued_jobs": 0, "cancelled_jobs": 0, "timed_out_jobs": 0, "restarted_workers": 0,
+                            "execution_time": {"total": 0.0, "max": 0.0, "last": 0.0},
+                            "queue_time": {"total": 0.0, "max": 0.0, "last": 0.0}}
+
+    async def run_user_code(self, code: str, data: UdfData, timeout: Optional[float] = None,
+                            cancel_event: Optional[threading.Event] = None) -> UdfData:
+        """Run the UDF code on the UDF data in a worker process without blocking the event loop
+
+        Args:
+            code (str): The UDF source
+            data (UdfData): The UDF data
+            timeout (float): The deadline of the job in seconds, including the time waiting for a worker process.
+                             The deadline starts when a thread of the pool takes the job
+            cancel_event (threading.Event): The job is cancelled when this event is set
+
+        Returns:
+            UdfData: The processed UDF data
+
+        """
+        if cancel_event is None:
+            cancel_event = threading.Event()
+
+        with self._lock:
+            self._statistics["submitted_jobs"] += 1
+            self._statistics["pending_jobs"] += 1
+
+        try:
+            if self.shared_memory:
+                result, execution_time, queue_time = await self._run_shared_memory_job(code, data, timeout,
+                                                                                       cancel_event)
+            else:
+                (result, execution_time), queue_time = await self._submit(_run_job, (code, data), timeout,
+                                                                          cancel_event)
+        except BaseException:
+            with self._lock:
+                self._statistics["pending_jobs"] -= 1
+                self._statistics["failed_jobs"] += 1
+            raise
+
+        with self._lock:
+            self._statistics["pending_jobs"] -= 1
+            self._statistics["completed_jobs"] += 1
+            for key, value in (("execution_time", execution_time), ("queue_time", queue_time)):
+                timing = self._statistics[key]
+                timing["total"] += value
+                timing["max"] = max(timing["max"], value)
+                timing["last"] = value
+        return result
+
+    async def _submit(self, function, args: Tuple, timeout: Optional[float], cancel_event: threading.Event):
+        # The job is counted as queued until it gets a worker process, including the time it waits for a thread
+        with self._lock:
+            self._statistics["queued_jobs"] += 1
+        try:
+            future = self._threads.submit(self._execute, function, args, timeout, cancel_event)
+        except BaseException:
+            self._dequeue()
+            raise
+        # A job that is cancelled before a thread took it is never executed
+        future.add_done_callback(lambda f: self._dequeue() if f.cancelled() else None)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The thread kills the worker process of the cancelled job
+            cancel_event.set()
+            raise
+
+    async def _run_shared_memory_job(self, code: str, data: UdfData, timeout: Optional[float],
+                                     cancel_event: threading.Event) -> Tuple[UdfData, float, float]:
+        blocks = []
+        cubes = list(data.get_datacube_list())
+        try:
+            entries = _datacubes_to_shared_memory(cubes, blocks)
+            # The data cubes are transferred in shared memory and not pickled with the UDF data
+            data.set_datacube_list([])
+            try:
+                (result, result_entries, execution_time), queue_time = await self._submit(
+                    _run_shared_memory_job, (code, data, entries), timeout, cancel_event)
+            finally:
+                data.set_datacube_list(cubes)
+        finally:
+            for block in blocks:
+                release_shared_memory(block, unlink=True)
+
+        result_cubes = []
+        for entry in result_entries:
+            values = None if isinstance(entry, DataCube) else copy_array_from_shared_memory(entry["array"])
+            result_cubes.append(_datacube_from_entry(entry, values))
+        result.set_datacube_list(result_cubes)
+        return result, execution_time, queue_time
+
+    def _check_job(self, deadline: Optional[float], cancel_event: threading.Event):
+        """Raise an exception if the job was cancelled or its deadline was exceeded"""
+        if cancel_event.is_set():
+            with self._lock:
+                self._statistics["cancelled_jobs"] += 1
+            raise Exception("The UDF job was cancelled")
+        if deadline is not None and time.monotonic() > deadline:
+            with self._lock:
+                self._statistics["timed_out_jobs"] += 1
+            raise Exception("The UDF job exceeded its deadline")
+        if self._closed:
+            raise Exception("The worker pool was shut down")
+
+    def _dequeue(self):
+        with self._lock:
+            self._statistics["queued_jobs"] -= 1
+
+    def _execute(self, function, args: Tuple, timeout: Optional[float], cancel_event: threading.Event):
+        """Run a job in a free worker process, this method blocks the calling thread until the job is finished
+
+        Returns:
+            tuple: The result of the job and the time the job waited for a free worker process
+        """
+        start = time.perf_counter()
+        # The deadline starts when the thread takes the job, not while the job waits for a thread
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        try:
+            while True:
+                self._check_job(deadline, cancel_event)
+                try:
+                    worker = self._idle.get(timeout=UdfConfiguration.worker_poll_interval)
+                    break
+                except queue.Empty:
+                    continue
+        finally:
+            self._dequeue()
+        queue_time = time.perf_counter() - start
+
+        try:
+            worker.wait_ready()
+            worker.connection.send((function, args))
+            while not worker.connection.poll(UdfConfiguration.worker_poll_interval):
+                self._check_job(deadline, cancel_event)
+            success, result = worker.connection.recv()
+        except BaseException as e:
+            self._replace_worker(worker)
+            if isinstance(e, (EOFError, OSError)):
+                raise Exception("The worker process of the UDF job terminated unexpectedly")
+            raise
+
+        self._idle.put(worker)
+        if not success:
+            raise result
+        return result, queue_time
+
+    def _replace_worker(self, worker: _Worker):
+        """Kill a worker process and start a new one"""
+        worker.kill()
+        with self._lock:
+            self._workers.remove(worker)
+            if self._closed:
+                return
+            self._statistics["restarted_workers"] += 1
+            new_worker = _Worker(self._context, self._configuration)
+            self._workers.append(new_worker)
+        self._idle.put(new_worker)
+
+    def warmup(self):
+        """Wait until all worker processes are started and ready to run jobs"""
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.wait_ready()
+
+    def model_preload_info(self) -> Dict[str, Dict]:
+        """Return the load and warmup statistics of the models that were preloaded by the ready worker processes
+
+        Returns:
+            dict: The framework, the load time, the warmup time and the error of each preloaded model
+
+        """
+        with self._lock:
+            workers = list(self._workers)
+        statistics = {}
+        for worker in workers:
+            statistics.update(worker.model_preload)
+        return statistics
+
+    def info(self) -> Dict:
+        """Return the statistics of the worker pool
+
+        Returns:
+            dict: The number of workers, the number of submitted, pending, completed, failed, cancelled
+            and timed out jobs, the number of jobs that wait for a free worker (queue_depth), the number of
+            restarted workers and the execution and queue times of the jobs in seconds
+
+        """
+        with self._lock:
+            info = {"workers": self.workers, "start_method": self.start_method, "shared_memory": self.shared_memory}
+            info.update({key: dict(value) if isinstance(value, dict) else value
+                         for key, value in self._statistics.items()})
+        info["queue_depth"] = info.pop("queued_jobs")
+        return info
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker processes
+
+        Args:
+            wait (bool): Wait until all running jobs are finished, otherwise the jobs are cancelled
+
+        """
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        for worker in workers:
+            if wait:
+                worker.stop()
+            else:
+                worker.kill()
+        self._threads.shutdown(wait=wait)
+
+
+_worker_pool: Optional[WorkerPool] = None
+
+
+def start_worker_pool(workers: Optional[int] = None) -> Optional[WorkerPool]:
+    """Start the worker pool of the server, no pool is started if the number of workers is 0
+
+    Args:
+        workers (int): The number of worker processes, UdfConfiguration.worker_processes is used if not provided
+
+    Returns:
+        WorkerPool: The started worker pool or None
+
+    """
+    global _worker_pool
+
+    if workers is None:
+        workers = UdfConfiguration.worker_processes
+
+    stop_worker_pool()
+    if workers > 0:
+        _worker_pool = WorkerPool(workers=workers)
+        _worker_pool.warmup()
+    return _worker_pool
+
+
+def stop_worker_pool():
+    """Stop the worker pool of the server"""
+    global _worker_pool
+
+    if _worker_pool is not None:
+        _worker_pool.shutdown()
+        _worker_pool = None
+
+
+def get_worker_pool() -> Optional[WorkerPool]:
+    """Return the worker pool of the server or None if the UDF code is executed in threads of the server process"""
+    return _worker_pool
+
+
+def job_timeout(server_context: Optional[Dict]) -> Optional[float]:
+    """Return the deadline of a UDF job in seconds from the "timeout" entry of the server context or
+    the server default UdfConfiguration.execution_timeout
+
+    Args:
+        server_context (dict): The server context of the UDF data
+
+    Returns:
+        float: The timeout in seconds or None if the job has no deadline
+
+    """
+    timeout = (server_context or {}).get("timeout", UdfConfiguration.execution_timeout)
+    if timeout is None:
+        return None
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or timeout <= 0:
+        raise Exception(f"The timeout of the server context must be a positive number of seconds, got {timeout}")
+    return float(timeout)
+
+
+async def _wait_for_disconnect(receive: Receive):
+    """Wait until the HTTP client closed the connection, the request body must be already received"""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def execute_user_code(code: str, data: UdfData, receive: Optional[Receive] = None) -> UdfData:
+    """Run the UDF code in the worker pool of the server, or in a thread of the default executor of the event
+    loop if no worker pool was started, hence the event loop is not blocked by the UDF code
+
+    The deadline of the job is set by the "timeout" entry of the server context of the UDF data or the
+    server default. The job is cancelled if the HTTP client disconnects. Deadlines and cancellation are
+    only enforced on the worker pool, a thread can not be stopped.
+
+    Args:
+        code (str): The UDF source
+        data (UdfData): The UDF data
+        receive: The ASGI receive channel of the HTTP request that is used to detect disconnects of the client
+
+    Returns:
+        UdfData: The processed UDF data
+
+    """
+    pool = _worker_pool
+    if pool is None:
+        return await asyncio.get_event_loop().run_in_executor(None, run_user_code, code, data)
+
+    timeout = job_timeout(data.server_context)
+
+    cancel_event = threading.Event()
+    job = asyncio.ensure_future(pool.run_user_code(code, data, timeout=timeout, cancel_event=cancel_event))
+    if receive is None:
+        return await job
+
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait([job, disconnect], return_when=asyncio.FIRST_COMPLETED)
+        if not job.done():
+            cancel_event.set()
+        return await job
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+    finally:
+        disconnect.cancel()
+
+
+async def execute_user_code_batch(code: str, data_list: List[UdfData], ordered: bool = True,
+                                  receive: Optional[Receive] = None) \
+        -> AsyncIterator[Tuple[int, Optional[UdfData], Optional[BaseException]]]:
+    """Run the UDF code on a list of UDF data objects in parallel in the worker pool of the server,
+    or one after another in a thread of the default executor of the event loop if no worker pool was started
+
+    At most as many jobs as the pool has worker processes are submitted at the same time, the remaining jobs
+    wait in the event loop, hence the deadline of a job starts when it is submitted to a free slot.
+    Each worker process compiles the UDF code only once. A failing job does not stop the other jobs, all
+    jobs are cancelled if the HTTP client disconnects or the iteration over the results is stopped.
+
+    Args:
+        code (str): The UDF source
+        data_list (list): The UDF data objects
+        ordered (bool): Yield the results in the order of the UDF data objects, otherwise as soon as they are
+                        computed
+        receive: The ASGI receive channel of the HTTP request that is used to detect disconnects of the client
+
+    Returns:
+        Asynchronous iterator of tuples with the index of the UDF data object, the processed UDF data
+        and the raised exception, either the UDF data or the exception is None
+
+    """
+    pool = _worker_pool
+    if pool is None:
+        loop = asyncio.get_event_loop()
+        for index, data in enumerate(data_list):
+            try:
+                result = await loop.run_in_executor(None, run_user_code, code, data)
+            except Exception as e:
+                yield index, None, e
+                continue
+            yield index, result, None
+        return
+
+    cancel_event = threading.Event()
+    # Limit the jobs in flight to the worker processes of the pool
+    slots = asyncio.Semaphore(pool.workers)
+
+    async def run_job(index: int, data: UdfData):
+        try:
+            timeout = job_timeout(data.server_context)
+            async with slots:
+                result = await pool.run_user_code(code, data, timeout=timeout, cancel_event=cancel_event)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return index, None, e
+        return index, result, None
+
+    jobs = [asyncio.ensure_future(run_job(index, data)) for index, data in enumerate(data_list)]
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive)) if receive is not None else None
+    try:
+        for job in (jobs if ordered else asyncio.as_completed(jobs)):
+            waiting = {job if ordered else asyncio.ensure_future(job)}
+            if disconnect is not None:
+                waiting.add(disconnect)
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if disconnect is not None and disconnect in done:
+                cancel_event.set()
+            waiting.discard(disconnect)
+            yield await waiting.pop()
+    finally:
+        # Jobs that are still running, because the client disconnected or the iteration was stopped, are cancelled
+        cancel_event.set()
+        for job in jobs:
+            job.cancel()
+        if disconnect is not None:
+            disconnect.cancel()
+
+
+def worker_pool_info() -> Dict:
+    """Return the statistics of the worker pool of the server
+
+    Returns:
+        dict: The worker pool statistics, the number of workers is 0 if no worker pool was started
+
+    """
+    pool = _worker_pool
+    if pool is None:
+        return {"workers": 0}
+    return pool.info()
+
+
+def worker_model_preload_info() -> Dict[str, Dict]:
+    """Return the load and warmup statistics of the preloaded models of the processes that run the UDF code
+
+    Returns:
+        dict: The statistics of the worker processes, or of the server process if no worker pool was started
+
+    """
+    pool = _worker_pool
+    if pool is None:
+        return model_preload_info()
+    return pool.model_preload_info()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+import pandas
+import geopandas
+import xarray
+from shapely.geometry import Point, Polygon
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.feature_collection import FeatureCollection
+from openeo_udf.api.structured_data import StructuredData
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server.arrow_ipc import ARROW_STREAM_CONTENT_TYPE, read_arrow_stream, write_arrow_stream
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+FABS_CODE = """
+def fabs(udf_data: UdfData):
+    cube_list = []
+    for cube in udf_data.get_datacube_list():
+        result = numpy.fabs(cube.array)
+        result.name = cube.id + "_fabs"
+        cube_list.append(DataCube(array=result))
+    udf_data.set_datacube_list(cube_list)
+"""
+
+
+class ArrowIpcTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    @staticmethod
+    def create_udf_data() -> UdfData:
+        array = xarray.DataArray(-numpy.arange(12, dtype=numpy.float32).reshape((3, 2, 2)), dims=("t", "y", "x"),
+                                 coords={"t": pandas.DatetimeIndex(["2001-01-01", "2001-01-02", "2001-01-03"]),
+                                         "y": [1.5, 2.5], "x": [1.5, 2.5]})
+        array.name = "temp"
+        array.attrs["description"] = "Temperature"
+
+        data = geopandas.GeoDataFrame(geometry=[Point(0, 0), Polygon([(0, 0), (1, 0), (1, 1)])])
+        data["a"] = [1, 2]
+        data["b"] = ["x", "y"]
+        fct = FeatureCollection(id="features", data=data,
+                                start_times=pandas.DatetimeIndex(["2001-01-01", "2001-01-02"]),
+                                end_times=pandas.DatetimeIndex(["2001-01-02", "2001-01-03"]))
+
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)],
+                           feature_collection_list=[fct])
+        udf_data.user_context = {"kernel": 3}
+        udf_data.append_structured_data(StructuredData(description="list", data=[1, 2, 3], type="list"))
+        return udf_data
+
+    def test_arrow_round_trip(self):
+        """Test the conversion of UDF data into Arrow IPC streams and back"""
+
+        udf_data = self.create_udf_data()
+        code, result = read_arrow_stream(write_arrow_stream(udf_data))
+
+        self.assertIsNone(code)
+        self.assertEqual(result.proj, {"EPSG": 4326})
+        self.assertEqual(result.user_context, {"kernel": 3})
+        self.assertEqual(result.structured_data_list[0].data, [1, 2, 3])
+
+        cube = result.get_datacube_by_id("temp")
+        source = udf_data.get_datacube_by_id("temp")
+        self.assertEqual(cube.array.dtype, numpy.float32)
+        # The cube data is a view on the Arrow buffer
+        self.assertFalse(cube.array.values.flags.writeable)
+        self.assertEqual(cube.array.dims, ("t", "y", "x"))
+        self.assertTrue(numpy.array_equal(cube.array.values, source.array.values))
+        self.assertTrue(cube.array.coords["t"].equals(source.array.coords["t"]))
+        self.assertEqual(cube.array.attrs["description"], "Temperature")
+
+        fct = result.get_feature_collection_by_id("features")
+        self.assertEqual(list(fct.data["a"]), [1, 2])
+        self.assertEqual(list(fct.data["b"]), ["x", "y"])
+        self.assertTrue(fct.data.geometry[1].equals(Polygon([(0, 0), (1, 0), (1, 1)])))
+        self.assertTrue(fct.start_times.equals(udf_data.feature_collection_list[0].start_times))
+        self.assertTrue(fct.end_times.equals(udf_data.feature_collection_list[0].end_times))
+
+    def test_udf_arrow(self):
+        """Test the Arrow IPC endpoint"""
+
+        udf_data = self.create_udf_data()
+        request = write_arrow_stream(udf_data, code={"language": "python", "source": FABS_CODE})
+
+        response = self.app.post('/udf_arrow', data=request, headers={"Content-Type": ARROW_STREAM_CONTENT_TYPE})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], ARROW_STREAM_CONTENT_TYPE)
+
+        code, result = read_arrow_stream(response.content)
+        cube = result.get_datacube_by_id("temp_fabs")
+        self.assertEqual(cube.array.dtype, numpy.float32)
+        self.assertTrue(numpy.array_equal(cube.array.values, numpy.arange(12).reshape((3, 2, 2))))
+        self.assertEqual(len(result.feature_collection_list), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
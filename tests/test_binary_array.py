@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+import xarray
+
+from openeo_udf.api.binary_array import array_to_binary_dict, array_from_binary_dict
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+from openeo_udf.server.data_model.model_example_creator import create_data_collection_model_example
+from openeo_udf.server.data_model.data_collection_schema import DataCollectionModel
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+def identity(udf_data: UdfData):
+    pass
+"""
+
+
+class BinaryArrayTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def test_binary_array_round_trip(self):
+        """Test the binary encoding of arrays with different data types and byte orders"""
+
+        for dtype in ["int8", "<i2", ">i2", "uint16", "<f4", ">f8", "bool"]:
+            array = (numpy.arange(24) % 3).astype(dtype).reshape((2, 3, 4))
+            result = array_from_binary_dict(array_to_binary_dict(array))
+            self.assertTrue(numpy.array_equal(array, result))
+            self.assertEqual(array.dtype, result.dtype)
+            self.assertEqual(array.shape, result.shape)
+
+        # Non-contiguous arrays are stored in C order
+        array = numpy.arange(12, dtype=numpy.float32).reshape((3, 4)).T
+        result = array_from_binary_dict(array_to_binary_dict(array))
+        self.assertTrue(numpy.array_equal(array, result))
+
+    def test_binary_array_size_mismatch(self):
+        """Test that a buffer that does not match the shape is rejected"""
+
+        d = array_to_binary_dict(numpy.zeros((2, 2), dtype=numpy.float32))
+        d["shape"] = [3, 3]
+        self.assertRaises(Exception, array_from_binary_dict, d)
+
+    def test_data_collection_binary_values(self):
+        """Test the decoding of binary variable values in a data collection"""
+
+        dcm = create_data_collection_model_example()
+        d = dcm.dict()
+        values = numpy.arange(27, dtype=numpy.float32)
+        d["variables_collections"][0]["variables"][0]["values"] = array_to_binary_dict(values)
+        dcm = DataCollectionModel(**d)
+
+        dc = DataCube.from_data_collection(data_collection=dcm)
+        self.assertEqual(dc[0].array.dtype, numpy.float32)
+        self.assertEqual(dc[0].array.shape, (3, 3, 3))
+        self.assertTrue(numpy.array_equal(dc[0].array.values.reshape([27]), values))
+        self.assertTrue(numpy.array_equal(dc[1].array.values.reshape([27]), numpy.arange(1, 28)))
+
+    def test_list_encoding_dtype(self):
+        """Test that the data type of nested lists is restored from the dtype entry"""
+
+        for dtype in ["int16", "uint8", "float32"]:
+            array = xarray.DataArray(numpy.ones((2, 3), dtype=dtype), dims=("y", "x"), name="ones",
+                                     coords={"y": [0, 1], "x": [0, 1, 2]})
+            d = DataCube(array=array).to_dict()
+            self.assertEqual(d["dtype"], dtype)
+            self.assertEqual(DataCube.from_dict(d).array.dtype, numpy.dtype(dtype))
+
+        dcm = create_data_collection_model_example()
+        d = dcm.dict()
+        d["object_collections"]["data_cubes"][0]["dtype"] = "int16"
+        dc = DataCube.from_data_collection(data_collection=DataCollectionModel(**d))
+        self.assertEqual(dc[0].array.dtype, numpy.int16)
+
+    def test_udf_legacy_binary(self):
+        """Test the legacy endpoint with binary encoded data cubes in request and response"""
+
+        temp = create_datacube(name="temp", value=1, dims=("t", "y", "x"), shape=(3, 3, 3))
+        temp.array = temp.array.astype(numpy.float32)
+        temp.array.name = "temp"
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[temp])
+        udf_data.server_context = {"array_encoding": "binary"}
+
+        request = {"code": {"language": "python", "source": PIPELINE_CODE},
+                   "data": udf_data.to_dict(array_encoding="binary")}
+        self.assertEqual(request["data"]["datacubes"][0]["data"]["dtype"], "float32")
+
+        response = self.app.post('/udf_legacy', json=request)
+        self.assertEqual(response.status_code, 200)
+
+        result = UdfData.from_dict(response.json())
+        cube = result.get_datacube_by_id("temp")
+        self.assertEqual(response.json()["datacubes"][0]["data"]["dtype"], "float32")
+        self.assertEqual(cube.array.dtype, numpy.float32)
+        self.assertTrue(numpy.array_equal(cube.array.values, numpy.ones((3, 3, 3))))
+        self.assertEqual(cube.array.dims, ("t", "y", "x"))
+
+    def test_udf_legacy_list_response(self):
+        """Test that binary requests without array encoding in the server context return nested lists"""
+
+        array = xarray.DataArray(numpy.ones((2, 2), dtype=numpy.int16), dims=("y", "x"), name="ones")
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)])
+
+        request = {"code": {"language": "python", "source": PIPELINE_CODE},
+                   "data": udf_data.to_dict(array_encoding="binary")}
+
+        response = self.app.post('/udf_legacy', json=request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["datacubes"][0]["data"], [[1, 1], [1, 1]])
+
+
+if __name__ == "__main__":
+    unittest.main()
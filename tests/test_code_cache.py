@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.run_code import run_user_code, compile_user_code, code_cache_info, clear_code_cache, \
+    DATACUBE_ENTRY_POINT, TIMESERIES_ENTRY_POINT, UDF_DATA_ENTRY_POINT
+from openeo_udf.api.run_code import build_base_execution_context, execution_context_info
+from openeo_udf.server.config import UdfConfiguration
+import openeo_udf.functions
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+TIMESERIES_CODE = """
+from typing import Dict
+from pandas import Series
+def apply_timeseries(series: Series, context: Dict) -> Series:
+    return series + 1
+"""
+
+DATACUBE_CODE = """
+from typing import Dict
+from openeo_udf.api.datacube import DataCube
+def apply_datacube(cube: DataCube, context: Dict) -> DataCube:
+    return cube
+"""
+
+
+class CompiledCodeCacheTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+        clear_code_cache()
+
+    def tearDown(self):
+        clear_code_cache()
+
+    @staticmethod
+    def read_function(name: str) -> str:
+        dir = os.path.dirname(openeo_udf.functions.__file__)
+        return open(os.path.join(dir, name), "r").read()
+
+    def test_entry_point_types(self):
+        """Test the resolution of the entry point types"""
+        self.assertEqual(compile_user_code(DATACUBE_CODE).entry_point_type, DATACUBE_ENTRY_POINT)
+        self.assertEqual(compile_user_code(self.read_function("datacube_ndvi.py")).entry_point_type,
+                         UDF_DATA_ENTRY_POINT)
+        self.assertEqual(compile_user_code(TIMESERIES_CODE).entry_point_type, TIMESERIES_ENTRY_POINT)
+        self.assertIsNone(compile_user_code("x = 1").entry_point)
+
+    def test_hits_and_misses(self):
+        """Test that the same source is compiled only once"""
+        code = self.read_function("datacube_map_fabs.py")
+
+        for i in range(3):
+            temp = create_datacube(name="temp", value=-1, dims=("t", "x", "y"), shape=(2, 2, 2))
+            udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[temp])
+            run_user_code(code=code, data=udf_data)
+            self.assertEqual(udf_data.datacube_list[0].id, "temp_fabs")
+            self.assertEqual(udf_data.datacube_list[0].array.values.min(), 1)
+
+        info = code_cache_info()
+        self.assertEqual(info["misses"], 1)
+        self.assertEqual(info["hits"], 2)
+        self.assertEqual(info["size"], 1)
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["code_cache"]["hits"], 2)
+
+    def test_timeseries_entry_point(self):
+        """Test the cached apply_timeseries entry point"""
+        for i in range(2):
+            temp = create_datacube(name="temp", value=1, dims=("t", "x", "y"), shape=(3, 2, 2))
+            udf_data = run_user_code(code=TIMESERIES_CODE, data=UdfData(datacube_list=[temp]))
+            self.assertEqual(udf_data.datacube_list[0].array.values.min(), 2)
+        self.assertEqual(code_cache_info()["hits"], 1)
+
+    def test_eviction(self):
+        """Test the eviction of the least recently used module"""
+        size = UdfConfiguration.code_cache_size
+        UdfConfiguration.code_cache_size = 2
+        try:
+            first = compile_user_code("x = 1")
+            compile_user_code("x = 2")
+            compile_user_code("x = 1")
+            compile_user_code("x = 3")
+            self.assertEqual(code_cache_info()["size"], 2)
+            self.assertIs(compile_user_code("x = 1"), first)
+            self.assertEqual(code_cache_info()["misses"], 3)
+        finally:
+            UdfConfiguration.code_cache_size = size
+
+    def test_base_execution_context(self):
+        """Test that UDF modules get a copy of the base execution context"""
+        build_base_execution_context(frameworks=[])
+        info = execution_context_info()
+        self.assertEqual(info["frameworks"], {})
+        self.assertGreater(info["build_time"], 0)
+
+        first = compile_user_code("numpy = None")
+        second = compile_user_code("x = numpy.zeros(2)")
+        self.assertIsNone(first.module["numpy"])
+        self.assertEqual(second.module["x"].shape, (2,))
+        self.assertNotIn("torch", second.module)
+
+        with self.assertRaises(Exception):
+            build_base_execution_context(frameworks=["caffe"])
+
+    def test_startup_metrics(self):
+        """Test the import statistics of the frameworks that are preloaded at server startup"""
+        with TestClient(app=app) as client:
+            response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        frameworks = response.json()["execution_context"]["frameworks"]
+        self.assertEqual(sorted(frameworks), sorted(UdfConfiguration.preload_frameworks))
+        for framework in frameworks.values():
+            self.assertGreaterEqual(framework["import_time"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import unittest
+import numpy
+import xarray
+import zstandard
+import lz4.frame
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server.compression import StreamCompressor, StreamDecompressor, select_encoding
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+def identity(udf_data: UdfData):
+    pass
+"""
+
+DECOMPRESS = {"gzip": gzip.decompress,
+              "zstd": lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+              "lz4": lz4.frame.decompress}
+
+
+def create_request_body() -> bytes:
+    array = xarray.DataArray(numpy.zeros((10, 20, 20), dtype=numpy.int16), dims=("t", "y", "x"),
+                             coords={"t": list(range(10)), "y": list(range(20)), "x": list(range(20))},
+                             name="zeros")
+    udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)])
+    request = {"code": {"language": "python", "source": PIPELINE_CODE}, "data": udf_data.to_dict()}
+    return json.dumps(request).encode("utf-8")
+
+
+class CompressionTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def test_stream_round_trip(self):
+        """Test the chunk wise compression and decompression of all codecs"""
+
+        data = (numpy.arange(100000) % 256).astype(numpy.int32).tobytes()
+        for encoding in ["gzip", "zstd", "lz4"]:
+            compressor = StreamCompressor(encoding)
+            compressed = b"".join([compressor.compress(data[i:i + 7000]) for i in range(0, len(data), 7000)])
+            compressed += compressor.flush()
+            self.assertLess(len(compressed), len(data))
+            self.assertEqual(DECOMPRESS[encoding](compressed), data)
+
+            decompressor = StreamDecompressor(encoding)
+            result = b"".join([decompressor.decompress(compressed[i:i + 1000])
+                               for i in range(0, len(compressed), 1000)]) + decompressor.flush()
+            self.assertEqual(result, data)
+
+    def test_select_encoding(self):
+        """Test the negotiation of the response encoding"""
+
+        self.assertEqual(select_encoding("gzip, zstd, lz4"), "zstd")
+        self.assertEqual(select_encoding("gzip;q=1.0, zstd;q=0.5"), "gzip")
+        self.assertEqual(select_encoding("*"), "zstd")
+        self.assertIsNone(select_encoding(""))
+        self.assertIsNone(select_encoding("br"))
+
+    def test_udf_legacy_compressed(self):
+        """Test compressed requests and responses of the legacy endpoint"""
+
+        body = create_request_body()
+        for encoding in ["gzip", "zstd", "lz4"]:
+            compressor = StreamCompressor(encoding)
+            compressed = compressor.compress(body) + compressor.flush()
+            response = self.app.post('/udf_legacy', data=compressed,
+                                     headers={"Content-Type": "application/json", "Content-Encoding": encoding,
+                                              "Accept-Encoding": encoding}, stream=True)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.headers["Content-Encoding"], encoding)
+            content = DECOMPRESS[encoding](response.raw.read(decode_content=False))
+            result = UdfData.from_dict(json.loads(content))
+            self.assertEqual(result.get_datacube_by_id("zeros").array.shape, (10, 20, 20))
+
+    def test_unsupported_content_encoding(self):
+        """Test that requests with unsupported content encoding are rejected"""
+
+        response = self.app.post('/udf_legacy', data=b"abc", headers={"Content-Encoding": "br"})
+        self.assertEqual(response.status_code, 415)
+
+    def test_uncompressed_response(self):
+        """Test that the response is not compressed without Accept-Encoding"""
+
+        response = self.app.post('/udf_legacy', data=create_request_body(),
+                                 headers={"Content-Type": "application/json", "Accept-Encoding": "identity"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Content-Encoding", response.headers)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import json
 import unittest
+import numpy
+import pandas
+import xarray
 
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.server.data_model.data_collection_schema import DataCollectionModel
+from openeo_udf.server.udf import numpy_json_default
 from openeo_udf.server.data_model.model_example_creator import create_data_collection_model_example
 
 __license__ = "Apache License, Version 2.0"
@@ -21,6 +28,70 @@ class DataCollectionTest(unittest.TestCase):
         print(t.json())
         print(t.schema_json())
 
+    def test_regular_grid_coordinates(self):
+        """Test the coordinates of dimensions that are defined by extent and number of cells"""
+
+        t = create_data_collection_model_example()
+        dc_list = DataCube.from_data_collection(data_collection=t)
+
+        self.assertEqual(len(dc_list), 2)
+        self.assertEqual(dc_list[0].array.coords["y"].values.tolist(), [0.5, 1.5, 2.5])
+        self.assertEqual(dc_list[0].array.coords["x"].values.tolist(), [3.5, 4.5, 5.5])
+        self.assertTrue(numpy.array_equal(dc_list[0].array.coords["y"], dc_list[1].array.coords["y"]))
+
+        # No accumulation of floating point errors for many cells
+        dim_y = t.object_collections.data_cubes[0].dimensions["y"]
+        dim_y.extent = [0, 0.1]
+        dim_y.number_of_cells = 100000
+        t.object_collections.data_cubes[0].size = [3, 100000, 3]
+        t.variables_collections[0].size = [3, 100000, 3]
+        for variable in t.variables_collections[0].variables:
+            variable.values = numpy.zeros(900000)
+        dc_list = DataCube.from_data_collection(data_collection=t)
+        y = dc_list[0].array.coords["y"].values
+        self.assertAlmostEqual(y[-1], 0.0999995, places=15)
+        self.assertTrue(numpy.allclose(numpy.diff(y), 1e-6, rtol=0, atol=1e-15))
+
+
+    def test_to_data_collection(self):
+        """Test the grouping of data cubes with the same grid into a shared variables collection"""
+
+        coords = {"t": pandas.date_range("2001-01-01", periods=2), "y": [10.5, 11.5, 12.5], "x": [1.0, 2.0, 4.0, 8.0]}
+        red = xarray.DataArray(numpy.ones((2, 3, 4), dtype=numpy.int16), dims=("t", "y", "x"), coords=coords,
+                               name="red")
+        nir = xarray.DataArray(numpy.full((2, 3, 4), 3, dtype=numpy.int16), dims=("t", "y", "x"), coords=coords,
+                               name="nir")
+        other = xarray.DataArray(numpy.zeros((2, 2), dtype=numpy.float32), dims=("y", "x"), name="other")
+        cubes = [DataCube(array=red), DataCube(array=nir), DataCube(array=other)]
+
+        for array_encoding in ["list", "binary"]:
+            dcm = DataCube.to_data_collection(cubes, array_encoding=array_encoding)
+            self.assertEqual(len(dcm.object_collections.data_cubes), 2)
+            self.assertEqual(dcm.variables_collections[0].number_of_variables, 2)
+
+            dimensions = dcm.object_collections.data_cubes[0].dimensions
+            self.assertEqual(dimensions["y"].extent, [10.0, 13.0])
+            self.assertEqual(dimensions["y"].number_of_cells, 3)
+            self.assertIsNone(dimensions["y"].values)
+            self.assertEqual(dimensions["x"].values, [1.0, 2.0, 4.0, 8.0])
+            self.assertEqual(dimensions["t"].type, "temporal")
+
+            # The model survives the JSON round trip
+            dcm = DataCollectionModel(**json.loads(json.dumps(dcm.dict(), default=numpy_json_default)))
+            result = DataCube.from_data_collection(dcm)
+            self.assertEqual([c.id for c in result], ["red", "nir", "other"])
+            for cube, expected in zip(result, cubes):
+                self.assertEqual(cube.array.dtype, expected.array.dtype)
+                self.assertTrue(cube.array.equals(expected.array))
+
+    def test_to_data_collection_view(self):
+        """Test that the variable values are views on the data cube arrays"""
+
+        array = xarray.DataArray(numpy.ones((3, 4)), dims=("y", "x"), name="ones")
+        dcm = DataCube.to_data_collection([DataCube(array=array)])
+        values = dcm.variables_collections[0].variables[0].values
+        self.assertTrue(numpy.shares_memory(values, array.values))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+import numpy
+import xarray
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.run_code import run_user_code
+from openeo_udf.server.udf import app, numpy_json_default
+from openeo_udf.server.arrow_ipc import ARROW_STREAM_CONTENT_TYPE, read_arrow_stream, write_arrow_stream
+from openeo_udf.server.data_model.udf_schemas import UdfDataModel
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+LAZY_CODE = """
+from typing import Dict
+from openeo_udf.api.datacube import DataCube
+
+chunks = []
+
+def apply_datacube(cube: DataCube, context: Dict) -> DataCube:
+    chunks.append(cube.array.chunks)
+    array = (cube.array * 2).max(dim="t")
+    array.name = cube.id + "_max"
+    return DataCube(array=array)
+"""
+
+CHUNKS_CODE = """
+from typing import Dict
+from openeo_udf.api.datacube import DataCube
+
+def apply_datacube(cube: DataCube, context: Dict) -> DataCube:
+    array = cube.array.max(dim="t")
+    array.name = cube.id + ("_" + "_".join(str(len(c)) for c in cube.array.chunks) if cube.is_lazy else "_eager")
+    return DataCube(array=array)
+"""
+
+
+def create_udf_dict(server_context: dict) -> dict:
+    cube = create_datacube(name="temp", value=3, dims=("t", "y", "x"), shape=(3, 4, 6))
+    udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[cube])
+    udf_data.server_context = server_context
+    return json.loads(json.dumps(udf_data.to_dict(), default=numpy_json_default))
+
+
+class DaskDataCubeTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def test_chunked_data_collection(self):
+        """Test the creation of dask backed data cubes from a data collection"""
+        cube = create_datacube(name="temp", value=1, dims=("t", "y", "x"), shape=(2, 4, 6))
+        data_collection = DataCube.to_data_collection([cube])
+
+        cube = DataCube.from_data_collection(data_collection, chunks={"y": 2, "x": 3})[0]
+        self.assertTrue(cube.is_lazy)
+        self.assertEqual(cube.array.chunks, ((2,), (2, 2), (3, 3)))
+
+        cube = DataCube.from_data_collection(data_collection)[0]
+        self.assertFalse(cube.is_lazy)
+
+    def test_compute_shared_graph(self):
+        """Test that lazy data cubes that share a task graph are computed together"""
+        array = xarray.DataArray(numpy.arange(24.0).reshape((2, 3, 4)), dims=("t", "y", "x"), name="a")
+        base = DataCube(array=array.chunk({"x": 2}) + 1)
+        udf_data = UdfData(datacube_list=[DataCube(array=base.array.sum(dim="t")),
+                                          DataCube(array=base.array.max(dim="t"))])
+        udf_data.compute(scheduler="synchronous")
+
+        sum_cube, max_cube = udf_data.get_datacube_list()
+        self.assertFalse(sum_cube.is_lazy)
+        self.assertFalse(max_cube.is_lazy)
+        self.assertTrue(numpy.array_equal(sum_cube.array.values, (array + 1).sum(dim="t").values))
+        self.assertTrue(numpy.array_equal(max_cube.array.values, (array + 1).max(dim="t").values))
+
+    def test_run_user_code_lazy(self):
+        """Test that the UDF receives dask backed data cubes and the result is computed"""
+        udf_data = UdfData.from_dict(create_udf_dict({"dask": {"chunks": {"y": 2}, "scheduler": "threads"}}))
+        self.assertTrue(udf_data.get_datacube_list()[0].is_lazy)
+
+        result = run_user_code(LAZY_CODE, udf_data)
+        cube = result.get_datacube_list()[0]
+        self.assertEqual(cube.id, "temp_max")
+        self.assertFalse(cube.is_lazy)
+        self.assertTrue(numpy.all(cube.array.values == 6))
+
+    def test_udf_endpoint_with_chunks(self):
+        """Test the dask options of the server context with the UDF endpoint"""
+        udf_dict = create_udf_dict({"dask": {"chunks": {"x": 3}}})
+        udf_data = UdfData.from_dict(udf_dict)
+        udf_model = json.loads(json.dumps(udf_data.to_udf_data_model().dict(), default=numpy_json_default))
+
+        response = self.app.post('/udf', json={"code": {"language": "python", "source": LAZY_CODE},
+                                               "data": udf_model})
+        self.assertEqual(response.status_code, 200)
+        result = UdfDataModel(**response.json())
+        cube = DataCube.from_data_collection(result.data_collection)[0]
+        self.assertEqual(cube.id, "temp_max")
+        self.assertEqual(cube.array.shape, (4, 6))
+        self.assertTrue(numpy.all(cube.array.values == 6))
+
+    def test_udf_arrow_with_chunks(self):
+        """Test that the data cubes of the Arrow IPC endpoint are chunked by the dask options of the server context"""
+        udf_data = UdfData.from_dict(create_udf_dict({"dask": {"chunks": {"y": 2, "x": 3}}}))
+        request = write_arrow_stream(udf_data, code={"language": "python", "source": CHUNKS_CODE})
+
+        response = self.app.post('/udf_arrow', data=request, headers={"Content-Type": ARROW_STREAM_CONTENT_TYPE})
+        self.assertEqual(response.status_code, 200)
+        code, result = read_arrow_stream(response.content)
+        cube = result.get_datacube_list()[0]
+        # The UDF received a cube with one chunk along t and two chunks along y and x
+        self.assertEqual(cube.id, "temp_1_2_2")
+        self.assertEqual(cube.array.shape, (4, 6))
+        self.assertTrue(numpy.all(cube.array.values == 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,7 +6,9 @@ Temporal framework doctests
 import doctest
 import unittest
 from openeo_udf.api import collection_base, feature_collection, datacube, \
-    machine_learn_model, spatial_extent, udf_data, structured_data
+    machine_learn_model, spatial_extent, udf_data, structured_data, binary_array, run_code, tiling, \
+    udf_wrapper
+from openeo_udf.server import streaming, compression, machine_learn_database
 
 
 def load_tests(loader, tests, ignore):
@@ -18,6 +20,13 @@ def load_tests(loader, tests, ignore):
     tests.addTests(doctest.DocTestSuite(spatial_extent))
     tests.addTests(doctest.DocTestSuite(structured_data))
     tests.addTests(doctest.DocTestSuite(udf_data))
+    tests.addTests(doctest.DocTestSuite(binary_array))
+    tests.addTests(doctest.DocTestSuite(run_code))
+    tests.addTests(doctest.DocTestSuite(tiling))
+    tests.addTests(doctest.DocTestSuite(udf_wrapper))
+    tests.addTests(doctest.DocTestSuite(streaming))
+    tests.addTests(doctest.DocTestSuite(compression))
+    tests.addTests(doctest.DocTestSuite(machine_learn_database))
     return tests
 
 
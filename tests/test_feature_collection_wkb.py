@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+import pandas
+import geopandas
+from shapely.geometry import Polygon
+
+from openeo_udf.api.feature_collection import FeatureCollection, geometries_to_wkb, geometries_from_wkb
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server import message_pack
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+def identity(udf_data: UdfData):
+    pass
+"""
+
+
+def create_feature_collection(number_of_features: int) -> FeatureCollection:
+    polygons = [Polygon([(i, 0), (i + 1, 0), (i + 1, 1), (i, 1)]) for i in range(number_of_features)]
+    data = geopandas.GeoDataFrame({"value": numpy.arange(number_of_features, dtype=numpy.float32),
+                                   "label": [f"p{i}" for i in range(number_of_features)]}, geometry=polygons)
+    times = pandas.date_range("2001-01-01", periods=number_of_features, freq="H")
+    return FeatureCollection(id="polygons", data=data, start_times=times, end_times=times)
+
+
+class FeatureCollectionWkbTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def check_feature_collection(self, fct: FeatureCollection, result: FeatureCollection, check_times=True):
+        self.assertEqual(result.id, fct.id)
+        self.assertTrue(result.data.geometry.geom_equals(fct.data.geometry).all())
+        self.assertTrue(numpy.array_equal(result.data["value"].values, fct.data["value"].values))
+        self.assertEqual(result.data["value"].dtype, numpy.float32)
+        self.assertEqual(result.data["label"].tolist(), fct.data["label"].tolist())
+        if check_times:
+            self.assertTrue(result.start_times.equals(fct.start_times))
+
+    def test_wkb_round_trip(self):
+        """Test the binary and the numpy encoding of feature collections with WKB geometries"""
+
+        fct = create_feature_collection(1000)
+
+        d = fct.to_dict(array_encoding="binary")
+        self.assertNotIn("data", d)
+        self.assertEqual(d["geometry"]["encoding"], "wkb")
+        self.check_feature_collection(fct, FeatureCollection.from_dict(d))
+
+        blob = message_pack.packb(fct.to_dict(array_encoding="numpy"))
+        self.check_feature_collection(fct, FeatureCollection.from_dict(message_pack.unpackb(blob)))
+
+    def test_missing_geometry(self):
+        """Test that missing geometries are kept"""
+
+        fct = create_feature_collection(3)
+        fct.data.loc[1, "geometry"] = None
+        result = FeatureCollection.from_dict(fct.to_dict(array_encoding="binary"))
+        self.assertEqual(result.data.geometry.isna().tolist(), [False, True, False])
+
+    def test_wkb_offsets(self):
+        """Test the offsets of the WKB buffer and the decoding of zero length and empty geometry arrays"""
+
+        geometry = geopandas.GeoSeries([None, Polygon([(0, 0), (1, 0), (1, 1)]), None])
+        buffer, offsets = geometries_to_wkb(geometry)
+        self.assertEqual(offsets.tolist(), [0, 0, buffer.size, buffer.size])
+        geometries = geometries_from_wkb(buffer, offsets)
+        self.assertIsNone(geometries[0])
+        self.assertTrue(geometries[1].equals(geometry[1]))
+        self.assertIsNone(geometries[2])
+
+        buffer, offsets = geometries_to_wkb(geopandas.GeoSeries([]))
+        self.assertEqual((buffer.size, offsets.tolist()), (0, [0]))
+        self.assertEqual(len(geometries_from_wkb(buffer, offsets)), 0)
+
+    def test_udf_legacy_wkb(self):
+        """Test the legacy endpoint with WKB encoded feature collections in request and response"""
+
+        fct = create_feature_collection(10)
+        udf_data = UdfData(proj={"EPSG": 4326}, feature_collection_list=[fct])
+        udf_data.server_context = {"array_encoding": "binary"}
+        request = {"code": {"language": "python", "source": PIPELINE_CODE},
+                   "data": udf_data.to_dict(array_encoding="binary")}
+
+        response = self.app.post('/udf_legacy', json=request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("geometry", response.json()["feature_collection_list"][0])
+
+        result = UdfData.from_dict(response.json())
+        # The legacy feature collection model does not transfer the time stamps
+        self.check_feature_collection(fct, result.get_feature_collection_by_id("polygons"), check_times=False)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+import pandas
+import geopandas
+import xarray
+from shapely.geometry import Point
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.feature_collection import FeatureCollection
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server import message_pack
+from openeo_udf.server.message_pack import MESSAGE_PACK_CONTENT_TYPE
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+from openeo_udf.server.data_model.model_example_creator import create_data_collection_model_example
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+def identity(udf_data: UdfData):
+    pass
+"""
+
+
+class MessagePackTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def test_pack_unpack(self):
+        """Test the message pack extension types for numpy arrays and datetime indexes"""
+
+        times = pandas.DatetimeIndex(["2001-01-01T10:00:00", "2001-01-02T10:00:00"])
+        d = {"int16": numpy.arange(6, dtype=numpy.int16).reshape((2, 3)),
+             "float32": numpy.ones((2, 2, 2), dtype=numpy.float32),
+             "big_endian": numpy.arange(3, dtype=">f8"),
+             "transposed": numpy.arange(6, dtype=numpy.uint8).reshape((2, 3)).T,
+             "times": times,
+             "scalar": numpy.float64(1.5)}
+
+        result = message_pack.unpackb(message_pack.packb(d))
+
+        for key in ["int16", "float32", "big_endian", "transposed"]:
+            self.assertTrue(numpy.array_equal(d[key], result[key]))
+            self.assertEqual(d[key].dtype, result[key].dtype)
+            self.assertFalse(result[key].flags.writeable)
+        self.assertTrue(times.equals(result["times"]))
+        self.assertEqual(result["scalar"], 1.5)
+
+    def test_aligned_arrays(self):
+        """Test that the unpacked arrays are aligned views for all header lengths"""
+
+        for dtype in ["<f8", ">f8", "<f4", "<i2", "|u1", "|b1", "<i8"]:
+            for shape in [(), (5,), (3, 4), (2, 3, 4, 5)]:
+                array = numpy.arange(int(numpy.prod(shape))).astype(dtype).reshape(shape)
+                result = message_pack.unpackb(message_pack.packb({"a": array}))["a"]
+                self.assertTrue(result.flags.aligned, (dtype, shape))
+                self.assertEqual(result.ctypes.data % 8, 0, (dtype, shape))
+                self.assertEqual(result.dtype, array.dtype)
+                self.assertTrue(numpy.array_equal(result, array))
+
+    def create_udf_data(self) -> UdfData:
+        array = xarray.DataArray(numpy.arange(8, dtype=numpy.float32).reshape((2, 2, 2)), dims=("t", "y", "x"),
+                                 coords={"t": pandas.DatetimeIndex(["2001-01-01", "2001-01-02"]),
+                                         "y": [1, 2], "x": [1, 2]})
+        array.name = "temp"
+        data = geopandas.GeoDataFrame(geometry=[Point(0, 0), Point(1, 1)])
+        data["a"] = [1, 2]
+        fct = FeatureCollection(id="points", data=data,
+                                start_times=pandas.DatetimeIndex(["2001-01-01", "2001-01-02"]),
+                                end_times=pandas.DatetimeIndex(["2001-01-02", "2001-01-03"]))
+        return UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)],
+                       feature_collection_list=[fct])
+
+    def test_udf_legacy_raw_message_pack(self):
+        """Test the legacy message pack endpoint with raw message pack blobs"""
+
+        udf_data = self.create_udf_data()
+        request = {"code": {"language": "python", "source": PIPELINE_CODE},
+                   "data": udf_data.to_dict(array_encoding="numpy")}
+
+        response = self.app.post('/udf_legacy_message_pack', data=message_pack.packb(request),
+                                 headers={"Content-Type": MESSAGE_PACK_CONTENT_TYPE})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], MESSAGE_PACK_CONTENT_TYPE)
+
+        result = message_pack.unpackb(response.content)
+        self.assertIsInstance(result["datacubes"][0]["data"], numpy.ndarray)
+
+        result = UdfData.from_dict(result)
+        cube = result.get_datacube_by_id("temp")
+        self.assertEqual(cube.array.dtype, numpy.float32)
+        self.assertTrue(numpy.array_equal(cube.array.values, udf_data.datacube_list[0].array.values))
+        self.assertTrue(cube.array.coords["t"].equals(udf_data.datacube_list[0].array.coords["t"]))
+
+        fct = result.get_feature_collection_by_id("points")
+        self.assertTrue(fct.start_times.equals(udf_data.feature_collection_list[0].start_times))
+        self.assertTrue(fct.end_times.equals(udf_data.feature_collection_list[0].end_times))
+        self.assertEqual(list(fct.data["a"]), [1, 2])
+
+    def test_udf_raw_message_pack(self):
+        """Test the data collection message pack endpoint with raw message pack blobs"""
+
+        dcm = create_data_collection_model_example().dict()
+        values = numpy.arange(27, dtype=numpy.int16)
+        dcm["variables_collections"][0]["variables"][0]["values"] = values
+        request = {"code": {"language": "python", "source": PIPELINE_CODE},
+                   "data": {"data_collection": dcm}}
+
+        response = self.app.post('/udf_message_pack', data=message_pack.packb(request),
+                                 headers={"Content-Type": MESSAGE_PACK_CONTENT_TYPE})
+        self.assertEqual(response.status_code, 200)
+
+        result = message_pack.unpackb(response.content)
+        cube = result["datacubes"][0]
+        self.assertEqual(cube["id"], "Temperature")
+        self.assertEqual(cube["data"].dtype, numpy.int16)
+        self.assertTrue(numpy.array_equal(cube["data"].reshape([27]), values))
+
+
+if __name__ == "__main__":
+    unittest.main()
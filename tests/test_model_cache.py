@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+import os
+import pickle
+import time
+import unittest
+import numpy
+
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.externals import joblib
+
+from openeo_udf.api.machine_learn_model import MachineLearnModelConfig, model_cache_info, clear_model_cache, \
+    load_cached_model, model_memory_size, model_cache_budget
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.machine_learn_database import RequestStorageModel
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+def create_model(path: str, n_estimators: int = 5, compress=0):
+    model = RandomForestRegressor(n_estimators=n_estimators, max_depth=3, random_state=0)
+    model.fit(numpy.random.RandomState(0).random_sample((50, 2)), numpy.arange(50))
+    joblib.dump(value=model, filename=path, compress=compress)
+
+
+class ModelCacheTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+        self.memory = UdfConfiguration.model_cache_memory
+        self.worker_processes = UdfConfiguration.worker_processes
+        clear_model_cache()
+
+    def tearDown(self):
+        UdfConfiguration.model_cache_memory = self.memory
+        UdfConfiguration.worker_processes = self.worker_processes
+        clear_model_cache()
+
+    def test_hits_and_misses(self):
+        """Test that a model file is loaded only once"""
+        path = "/tmp/test_model_cache.pkl"
+        create_model(path)
+
+        models = [MachineLearnModelConfig(framework="sklearn", name="test", description="test", path=path)
+                  for i in range(3)]
+        self.assertEqual(model_cache_info()["misses"], 0)
+        self.assertIs(models[0].get_model(), models[1].get_model())
+        self.assertIs(models[0].get_model(), models[2].get_model())
+
+        info = model_cache_info()
+        self.assertEqual(info["misses"], 1)
+        self.assertEqual(info["hits"], 2)
+        self.assertEqual(info["size"], 1)
+        self.assertEqual(info["memory"], os.path.getsize(path))
+        self.assertEqual(info["memory"], model_memory_size(models[0].get_model(), path))
+
+        response = self.app.get('/metrics')
+        self.assertEqual(response.json()["model_cache"]["hits"], 2)
+
+    def test_compressed_file(self):
+        """Test that the memory size of a model of a compressed file is not estimated by the file size"""
+        for compress in [("xz", 3), ("gzip", 3), ("zlib", 3), ("bz2", 3), ("lzma", 3)]:
+            path = "/tmp/test_model_cache.pkl." + compress[0]
+            create_model(path, compress=compress)
+            model = load_cached_model("sklearn", path)
+            self.assertGreater(model_memory_size(model, path), 2 * os.path.getsize(path), compress)
+            self.assertEqual(model_memory_size(model, path), model_memory_size(model))
+
+    def test_worker_budget(self):
+        """Test that the worker processes share the memory budget of the model caches"""
+        UdfConfiguration.model_cache_memory = 1000
+        UdfConfiguration.worker_processes = 0
+        self.assertEqual(model_cache_budget(), 1000)
+        UdfConfiguration.worker_processes = 4
+        self.assertEqual(model_cache_budget(), 250)
+        self.assertEqual(model_cache_info()["memory_budget"], 250)
+
+    def test_modified_file(self):
+        """Test that a modified model file is loaded again"""
+        path = "/tmp/test_model_cache.pkl"
+        create_model(path, n_estimators=2)
+        first = load_cached_model("sklearn", path)
+        create_model(path, n_estimators=3)
+        # Make sure that the modification time changes
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 1000))
+        second = load_cached_model("sklearn", path)
+
+        self.assertEqual(len(first.estimators_), 2)
+        self.assertEqual(len(second.estimators_), 3)
+        self.assertEqual(model_cache_info()["misses"], 2)
+
+    def test_memory_budget(self):
+        """Test the eviction of the least recently used models"""
+        paths = [f"/tmp/test_model_cache_{i}.pkl" for i in range(3)]
+        for path in paths:
+            create_model(path)
+        size = os.path.getsize(paths[0])
+        UdfConfiguration.model_cache_memory = int(size * 2.5)
+
+        load_cached_model("sklearn", paths[0])
+        load_cached_model("sklearn", paths[1])
+        load_cached_model("sklearn", paths[0])
+        load_cached_model("sklearn", paths[2])
+
+        info = model_cache_info()
+        self.assertEqual(info["size"], 2)
+        self.assertEqual(info["evictions"], 1)
+        self.assertLessEqual(info["memory"], info["memory_budget"])
+        # The least recently used second model was evicted
+        load_cached_model("sklearn", paths[0])
+        self.assertEqual(model_cache_info()["hits"], 2)
+        load_cached_model("sklearn", paths[1])
+        self.assertEqual(model_cache_info()["misses"], 4)
+
+        UdfConfiguration.model_cache_memory = 0
+        clear_model_cache()
+        load_cached_model("sklearn", paths[0])
+        self.assertEqual(model_cache_info()["size"], 0)
+
+    def test_pickled_config(self):
+        """Test that the model is not pickled with the model configuration"""
+        path = "/tmp/test_model_cache.pkl"
+        create_model(path)
+        config = MachineLearnModelConfig(framework="sklearn", name="test", description="test", path=path)
+        config.get_model()
+
+        data = pickle.dumps(config)
+        self.assertLess(len(data), 1000)
+        self.assertIs(pickle.loads(data).get_model(), config.get_model())
+
+    def test_delete_stored_model(self):
+        """Test that a deleted model of the storage is removed from the cache"""
+        path = "/tmp/test_model_cache.pkl"
+        create_model(path)
+        request_model = RequestStorageModel(uri=path, title="Test model", description="Test")
+        md5_hash = self.app.post('/storage', json=request_model.dict()).content.decode("ascii")
+
+        MachineLearnModelConfig(framework="sklearn", name="test", description="test", md5_hash=md5_hash).get_model()
+        self.assertEqual(model_cache_info()["size"], 1)
+
+        response = self.app.delete(f'/storage/{md5_hash}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(model_cache_info()["size"], 0)
+        self.assertEqual(model_cache_info()["memory"], 0)
+
+    def test_stale_stored_model(self):
+        """Test that a model that was deleted from the storage by another process is removed on the next miss"""
+        path = "/tmp/test_model_cache.pkl"
+        create_model(path)
+        request_model = RequestStorageModel(uri=path, title="Test model", description="Test")
+        md5_hash = self.app.post('/storage', json=request_model.dict()).content.decode("ascii")
+        stored_path = os.path.join(UdfConfiguration.machine_learn_storage_path, md5_hash)
+
+        first = load_cached_model("sklearn", stored_path, md5_hash)
+        self.assertIs(load_cached_model("sklearn", stored_path, md5_hash), first)
+        # The model is deleted and uploaded again without evicting it from the cache of this process
+        os.remove(stored_path)
+        self.app.post('/storage', json=request_model.dict())
+        # Make sure that the modification time changes
+        os.utime(stored_path, ns=(time.time_ns(), time.time_ns() + 1000))
+        self.assertIsNot(load_cached_model("sklearn", stored_path, md5_hash), first)
+        self.assertEqual(model_cache_info()["size"], 1)
+        self.assertEqual(model_cache_info()["memory"], os.path.getsize(stored_path))
+
+        os.remove(stored_path)
+        load_cached_model("sklearn", path)
+        self.assertEqual(model_cache_info()["size"], 1)
+        self.assertEqual(model_cache_info()["memory"], os.path.getsize(path))
+        self.app.delete(f'/storage/{md5_hash}')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+
+from sklearn.linear_model import LinearRegression
+from sklearn.externals import joblib
+
+from openeo_udf.api.machine_learn_model import warmup_model, model_cache_info, clear_model_cache
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.machine_learn_database import RequestStorageModel, preload_models
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+class ModelPreloadTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+        self.preload_models = UdfConfiguration.preload_models
+        self.worker_processes = UdfConfiguration.worker_processes
+        clear_model_cache()
+
+        model = LinearRegression().fit(numpy.random.RandomState(0).random_sample((20, 3)), numpy.arange(20))
+        joblib.dump(value=model, filename="/tmp/preload_linear_model.pkl")
+        request_model = RequestStorageModel(uri="/tmp/preload_linear_model.pkl", title="Linear model",
+                                            description="A linear model")
+        response = self.app.post('/storage', json=request_model.dict())
+        self.assertEqual(response.status_code, 200)
+        self.md5_hash = response.content.decode("ascii")
+
+    def tearDown(self):
+        UdfConfiguration.preload_models = self.preload_models
+        UdfConfiguration.worker_processes = self.worker_processes
+        self.app.delete(f'/storage/{self.md5_hash}')
+        clear_model_cache()
+
+    def test_preload_and_warmup(self):
+        """Test the loading and the warmup of a stored model"""
+        statistics = preload_models([self.md5_hash, "unknown"])
+
+        entry = statistics[self.md5_hash]
+        self.assertEqual(entry["framework"], "sklearn")
+        self.assertIsNone(entry["error"])
+        self.assertGreater(entry["load_time"], 0)
+        self.assertGreater(entry["warmup_time"], 0)
+        self.assertIn("not found", statistics["unknown"]["error"])
+        self.assertEqual(model_cache_info()["size"], 1)
+
+    def test_readiness(self):
+        """Test that the server reports readiness after the preloaded models are warmed up at startup"""
+        self.assertEqual(self.app.get('/ready').status_code, 503)
+
+        UdfConfiguration.preload_models = ["all"]
+        with TestClient(app=app) as client:
+            response = client.get('/ready')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.json()["ready"])
+            self.assertIsNotNone(response.json()["models"][self.md5_hash]["warmup_time"])
+            self.assertIn(self.md5_hash, client.get('/metrics').json()["model_preload"])
+        self.assertEqual(self.app.get('/ready').status_code, 503)
+
+    def test_worker_preload(self):
+        """Test that only the worker processes preload the models if a worker pool is started"""
+        UdfConfiguration.preload_models = [self.md5_hash]
+        UdfConfiguration.worker_processes = 1
+        with TestClient(app=app) as client:
+            response = client.get('/ready')
+            self.assertEqual(response.status_code, 200)
+            entry = response.json()["models"][self.md5_hash]
+            self.assertIsNone(entry["error"])
+            self.assertIsNotNone(entry["warmup_time"])
+            self.assertIn(self.md5_hash, client.get('/metrics').json()["model_preload"])
+            # The server process did not load the model
+            self.assertEqual(model_cache_info()["misses"], 0)
+            self.assertEqual(client.get('/metrics').json()["worker_pool"]["workers"], 1)
+
+    @unittest.skipIf(torch is None, "pytorch is not installed")
+    def test_pytorch_warmup(self):
+        """Test the synthetic input of pytorch modules"""
+        linear = torch.nn.Sequential(torch.nn.Linear(4, 2), torch.nn.ReLU())
+        convolution = torch.nn.Sequential(torch.nn.Conv2d(3, 2, kernel_size=3))
+        self.assertTrue(warmup_model("pytorch", linear))
+        self.assertTrue(warmup_model("pytorch", convolution))
+        self.assertFalse(warmup_model("pytorch", torch.nn.Module))
+
+
+if __name__ == "__main__":
+    unittest.main()
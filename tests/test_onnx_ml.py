@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import os
+import unittest
+import numpy
+
+from openeo_udf.api.machine_learn_model import MachineLearnModelConfig, OnnxModel, model_cache_info, \
+    clear_model_cache
+from openeo_udf.api.run_code import run_user_code
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server.tools import create_storage_directory
+import openeo_udf.functions
+
+try:
+    import onnx
+    from onnx import helper, TensorProto
+    import onnxruntime
+except ImportError:
+    onnx = None
+    onnxruntime = None
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+def save_onnx_model(path: str, nodes: list, inputs: list, outputs: list, initializers: list):
+    graph = helper.make_graph(nodes, "test", inputs, outputs, initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 7
+    onnx.save(model, path)
+
+
+def create_sum_model(path: str):
+    """A regression model that adds the features of each row"""
+    weights = helper.make_tensor("W", TensorProto.FLOAT, [2, 1], [1.0, 1.0])
+    save_onnx_model(path, [helper.make_node("MatMul", ["X", "W"], ["Y"])],
+                    [helper.make_tensor_value_info("X", TensorProto.FLOAT, [None, 2])],
+                    [helper.make_tensor_value_info("Y", TensorProto.FLOAT, [None, 1])], [weights])
+
+
+def create_scale_model(path: str):
+    """A model that doubles all values of the input and keeps its shape"""
+    factor = helper.make_tensor("F", TensorProto.FLOAT, [], [2.0])
+    save_onnx_model(path, [helper.make_node("Mul", ["X", "F"], ["Y"])],
+                    [helper.make_tensor_value_info("X", TensorProto.FLOAT, None)],
+                    [helper.make_tensor_value_info("Y", TensorProto.FLOAT, None)], [factor])
+
+
+def read_function(name: str) -> str:
+    dir = os.path.dirname(openeo_udf.functions.__file__)
+    return open(os.path.join(dir, name), "r").read()
+
+
+@unittest.skipIf(onnxruntime is None, "ONNX Runtime is not installed")
+class OnnxModelTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        clear_model_cache()
+
+    def tearDown(self):
+        clear_model_cache()
+
+    def test_session_cache(self):
+        """Test the numpy native prediction and the caching of the inference session"""
+        path = "/tmp/test_sum_model.onnx"
+        create_sum_model(path)
+
+        first = MachineLearnModelConfig(framework="onnx", name="sum", description="Sum model", path=path)
+        second = MachineLearnModelConfig(framework="onnx", name="sum", description="Sum model", path=path)
+        self.assertIsInstance(first.get_model(), OnnxModel)
+        self.assertIs(first.get_model(), second.get_model())
+        self.assertEqual(model_cache_info()["hits"], 1)
+
+        prediction = first.get_model().predict(numpy.array([[1, 2], [3, 4]]))
+        self.assertEqual(prediction.tolist(), [3.0, 7.0])
+
+    def test_sklearn_ml_udf(self):
+        """Test the onnx model with the chunked prediction of rct_sklearn_ml"""
+        path = "/tmp/test_sum_model.onnx"
+        create_sum_model(path)
+
+        red = create_datacube(name="red", value=1, dims=("t", "y", "x"), shape=(2, 5, 4))
+        nir = create_datacube(name="nir", value=2, dims=("t", "y", "x"), shape=(2, 5, 4))
+        red.array.values[1, 1, 1] = numpy.nan
+        ml = MachineLearnModelConfig(framework="onnx", name="sum", description="Sum model", path=path)
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[red, nir], ml_model_list=[ml])
+        udf_data.user_context = {"chunk_size": 7}
+
+        run_user_code(code=read_function("datacube_sklearn_ml.py"), data=udf_data)
+        result = udf_data.get_datacube_list()[0].array.values
+        self.assertTrue(numpy.isnan(result[1, 1, 1]))
+        self.assertTrue(numpy.allclose(numpy.nan_to_num(result, nan=3.0), 3.0))
+
+    def test_pytorch_ml_udf(self):
+        """Test the onnx model with the batched inference of hyper_pytorch_ml"""
+        path = "/tmp/test_scale_model.onnx"
+        create_scale_model(path)
+
+        temp = create_datacube(name="temp", value=1.5, dims=("t", "y", "x"), shape=(3, 4, 2))
+        ml = MachineLearnModelConfig(framework="onnx", name="scale", description="Scale model", path=path)
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[temp], ml_model_list=[ml])
+        udf_data.user_context = {"batch_dimension": "t", "batch_size": 2}
+
+        run_user_code(code=read_function("datacube_pytorch_ml.py"), data=udf_data)
+        result = udf_data.get_datacube_list()[0].array
+        self.assertEqual(result.dims, ("t", "y", "x"))
+        self.assertEqual(result.dtype, numpy.float32)
+        self.assertTrue(numpy.all(result.values == 3.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+
+from openeo_udf.server.shared_arrays import shared_memory_available, array_to_shared_memory, \
+    array_from_shared_memory, copy_array_from_shared_memory, release_shared_memory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+@unittest.skipUnless(shared_memory_available(), "Shared memory requires Python 3.8")
+class SharedArraysTestCase(unittest.TestCase):
+
+    def test_array_round_trip(self):
+        """Test the transfer of arrays of different data types and shapes"""
+        for array in [numpy.arange(12, dtype=">f4").reshape((3, 4)), numpy.ones((2, 2, 2), dtype=numpy.bool_),
+                      numpy.zeros((0, 3), dtype=numpy.int16)]:
+            descriptor, block = array_to_shared_memory(array)
+            result = copy_array_from_shared_memory(descriptor)
+            release_shared_memory(block)
+            self.assertEqual(result.dtype, array.dtype)
+            self.assertEqual(result.shape, array.shape)
+            self.assertTrue(numpy.array_equal(result, array))
+
+    def test_array_view(self):
+        """Test that attached arrays are views on the shared memory block"""
+        descriptor, block = array_to_shared_memory(numpy.zeros(4))
+        view, attached = array_from_shared_memory(descriptor)
+        view[1] = 5
+        self.assertEqual(copy_array_from_shared_memory(descriptor, unlink=False)[1], 5)
+        del view
+        release_shared_memory(attached)
+        release_shared_memory(block, unlink=True)
+
+    def test_object_array(self):
+        """Test that object arrays can not be stored in shared memory"""
+        self.assertRaises(Exception, array_to_shared_memory, numpy.asarray(["a", None], dtype=object))
+
+
+if __name__ == "__main__":
+    unittest.main()
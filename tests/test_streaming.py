@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+import numpy
+import pandas
+import xarray
+import geopandas
+from shapely.geometry import Point
+from fastapi.encoders import jsonable_encoder
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.feature_collection import FeatureCollection
+from openeo_udf.api.structured_data import StructuredData
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server import streaming
+from openeo_udf.server.streaming import stream_udf_data_json
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+def identity(udf_data: UdfData):
+    pass
+"""
+
+
+def create_udf_data() -> UdfData:
+    array = xarray.DataArray(numpy.arange(105, dtype=numpy.float32).reshape((5, 3, 7)), dims=("t", "y", "x"),
+                             coords={"t": pandas.date_range("2001-01-01", periods=5), "y": [1, 2, 3],
+                                     "x": numpy.arange(7)},
+                             name="temp", attrs={"description": "Temperature"})
+    ones = create_datacube(name="ones", value=1, dims=("y", "x"), shape=(4, 4))
+    sd = StructuredData(description="Output table", data={"count": [1, 2, 3]}, type="table")
+    data = geopandas.GeoDataFrame({"a": [1, 2]}, geometry=[Point(0, 0), Point(1, 1)])
+    fct = FeatureCollection(id="points", data=data)
+    return UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array), ones],
+                   feature_collection_list=[fct], structured_data_list=[sd])
+
+
+class StreamingTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+        self.chunk_size = streaming.STREAM_CHUNK_SIZE
+
+    def tearDown(self):
+        streaming.STREAM_CHUNK_SIZE = self.chunk_size
+
+    def test_stream_equals_to_dict(self):
+        """Test that the streamed JSON document is identical to the dictionary representation"""
+
+        udf_data = create_udf_data()
+        # Small chunks force several blocks per array and base64 remainders between blocks
+        for chunk_size in [1, 20, 1 << 20]:
+            streaming.STREAM_CHUNK_SIZE = chunk_size
+            for array_encoding in ["list", "binary"]:
+                chunks = list(stream_udf_data_json(udf_data, array_encoding=array_encoding))
+                expected = jsonable_encoder(udf_data.to_dict(array_encoding=array_encoding))
+                self.assertEqual(json.loads("".join(chunks)), expected)
+
+        streaming.STREAM_CHUNK_SIZE = 1
+        chunks = list(stream_udf_data_json(udf_data))
+        self.assertGreater(len(chunks), 5)
+
+    def test_stream_unsupported_encoding(self):
+        """Test that the numpy encoding can not be streamed as JSON"""
+
+        self.assertRaises(Exception, stream_udf_data_json, create_udf_data(), "numpy")
+
+    def test_udf_legacy_stream_response(self):
+        """Test the streaming response of the legacy endpoint"""
+
+        udf_data = create_udf_data()
+        udf_data.server_context = {"stream_response": True, "array_encoding": "binary"}
+        request = {"code": {"language": "python", "source": PIPELINE_CODE},
+                   "data": jsonable_encoder(udf_data.to_dict(array_encoding="binary"))}
+
+        response = self.app.post('/udf_legacy', json=request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["datacubes"][0]["data"]["dtype"], "float32")
+
+        result = UdfData.from_dict(response.json())
+        cube = result.get_datacube_by_id("temp")
+        self.assertTrue(numpy.array_equal(cube.array.values, udf_data.get_datacube_by_id("temp").array.values))
+        self.assertEqual(cube.array.dims, ("t", "y", "x"))
+        self.assertEqual(result.get_structured_data_list()[0].data, {"count": [1, 2, 3]})
+        fct = result.get_feature_collection_by_id("points")
+        self.assertEqual([g.wkt for g in fct.data.geometry], ["POINT (0 0)", "POINT (1 1)"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import json
+import unittest
+import numpy
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.run_code import code_cache_info
+from openeo_udf.server.udf import app, numpy_json_default, NDJSON_CONTENT_TYPE
+from openeo_udf.server.worker_pool import start_worker_pool, stop_worker_pool
+from openeo_udf.server.data_model.udf_schemas import UdfDataModel
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+import time
+def double(udf_data: UdfData):
+    if udf_data.user_context.get("fail", False):
+        raise Exception("Tile failure")
+    time.sleep(udf_data.user_context.get("seconds", 0))
+    cubes = []
+    for cube in udf_data.get_datacube_list():
+        array = cube.array * 2
+        array.name = cube.id
+        cubes.append(DataCube(array=array))
+    udf_data.set_datacube_list(cubes)
+"""
+
+
+def create_tile(value: int, user_context: dict = None, server_context: dict = None) -> dict:
+    cube = create_datacube(name="temp", value=value, dims=("t", "y", "x"), shape=(2, 3, 3))
+    udf_data = UdfData(datacube_list=[cube])
+    udf_data.user_context = user_context or {}
+    udf_data.server_context = server_context or {}
+    return json.loads(json.dumps(udf_data.to_udf_data_model().dict(), default=numpy_json_default))
+
+
+class UdfBatchTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def post_batch(self, tiles, ordered=True):
+        request = {"code": {"language": "python", "source": PIPELINE_CODE}, "data": tiles, "ordered": ordered}
+        response = self.app.post('/udf_batch', json=request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith(NDJSON_CONTENT_TYPE))
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def check_tile(self, line: dict, value: int):
+        result = UdfDataModel(**line["data"])
+        cube = DataCube.from_data_collection(result.data_collection)[0]
+        self.assertEqual(cube.array.shape, (2, 3, 3))
+        self.assertTrue(numpy.all(cube.array.values == 2 * value))
+
+    def test_batch_in_event_loop(self):
+        """Test the batch endpoint without worker pool, the code is compiled only once"""
+        misses = code_cache_info()["misses"]
+        lines = self.post_batch([create_tile(value) for value in range(4)])
+
+        self.assertEqual([line["index"] for line in lines], [0, 1, 2, 3])
+        for value, line in enumerate(lines):
+            self.check_tile(line, value)
+        self.assertLessEqual(code_cache_info()["misses"], misses + 1)
+
+    def test_batch_errors(self):
+        """Test that a failing tile does not stop the other tiles"""
+        lines = self.post_batch([create_tile(1), create_tile(2, {"fail": True}), create_tile(3)])
+
+        self.assertEqual(len(lines), 3)
+        self.check_tile(lines[0], 1)
+        self.assertEqual(lines[1]["error"]["message"], "Tile failure")
+        self.check_tile(lines[2], 3)
+
+    def test_batch_in_worker_pool(self):
+        """Test the parallel execution of the batch in the worker pool in order and as completed"""
+        start_worker_pool(workers=2)
+        try:
+            tiles = [create_tile(1, {"seconds": 1.0}), create_tile(2), create_tile(3, {"fail": True})]
+            lines = self.post_batch(tiles, ordered=True)
+            self.assertEqual([line["index"] for line in lines], [0, 1, 2])
+            self.check_tile(lines[0], 1)
+            self.check_tile(lines[1], 2)
+            self.assertIn("error", lines[2])
+
+            lines = self.post_batch(tiles, ordered=False)
+            self.assertEqual(sorted(line["index"] for line in lines), [0, 1, 2])
+            # The slow first tile is returned last
+            self.assertEqual(lines[-1]["index"], 0)
+
+            info = self.app.get('/metrics').json()["worker_pool"]
+            self.assertEqual(info["completed_jobs"], 4)
+            self.assertEqual(info["failed_jobs"], 2)
+        finally:
+            stop_worker_pool()
+
+    def test_batch_deadline_starts_in_slot(self):
+        """Test that the deadline of a batch job does not include the time it waits for a free worker"""
+        start_worker_pool(workers=1)
+        try:
+            tiles = [create_tile(value, {"seconds": 0.5}, {"timeout": 2.0}) for value in range(5)]
+            lines = self.post_batch(tiles)
+            self.assertEqual([line["index"] for line in lines], [0, 1, 2, 3, 4])
+            for value, line in enumerate(lines):
+                self.check_tile(line, value)
+
+            info = self.app.get('/metrics').json()["worker_pool"]
+            self.assertEqual(info["timed_out_jobs"], 0)
+            self.assertEqual(info["queue_depth"], 0)
+        finally:
+            stop_worker_pool()
+
+
+if __name__ == "__main__":
+    unittest.main()
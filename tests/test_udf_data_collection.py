@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.server.udf import app
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+from openeo_udf.server.data_model.model_example_creator import create_udf_data_model_example
+from openeo_udf.server.data_model.udf_schemas import UdfDataModel
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+PIPELINE_CODE = """
+def double(udf_data: UdfData):
+    cubes = []
+    for cube in udf_data.get_datacube_list():
+        array = cube.array * 2
+        array.name = cube.id
+        cubes.append(DataCube(array=array))
+    udf_data.set_datacube_list(cubes)
+"""
+
+
+class UdfDataCollectionTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def test_udf_data_collection(self):
+        """Test that the /udf endpoint returns the result cubes as data collection"""
+
+        for array_encoding in ["list", "binary"]:
+            udf_data = create_udf_data_model_example()
+            udf_data.server_context = {"array_encoding": array_encoding}
+            request = {"code": {"language": "python", "source": PIPELINE_CODE}, "data": udf_data.dict()}
+
+            response = self.app.post('/udf', json=request)
+            self.assertEqual(response.status_code, 200)
+
+            result = UdfDataModel(**response.json())
+            self.assertEqual(len(result.data_collection.object_collections.data_cubes), 1)
+            self.assertEqual(result.data_collection.variables_collections[0].number_of_variables, 2)
+            self.assertEqual(result.structured_data_list[0].type, "dict")
+
+            cubes = DataCube.from_data_collection(result.data_collection)
+            self.assertEqual(cubes[0].array.shape, (3, 3, 3))
+            self.assertTrue(numpy.array_equal(cubes[0].array.values.reshape(-1), numpy.arange(2, 56, 2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -3,6 +3,7 @@ import os
 import unittest
 import msgpack
 import base64
+import numpy
 
 from openeo_udf.api.run_code import run_user_code
 
@@ -42,6 +43,32 @@ class DataCubeNdviTestCase(unittest.TestCase):
         run_user_code(code=udf_code.source, data=udf_data)
         self.checkDataCubeNdvi(udf_data=udf_data)
 
+    def test_DataCube_ndvi_float32(self):
+        """Test that the NDVI of float32 cubes is computed and returned as float32 by the legacy endpoint"""
+
+        dir = os.path.dirname(openeo_udf.functions.__file__)
+        file_name = os.path.join(dir, "datacube_ndvi.py")
+
+        hc_red = create_datacube(name="red", value=1, dims=("t", "y", "x"), shape=(3, 3, 3))
+        hc_nir = create_datacube(name="nir", value=3, dims=("t", "y", "x"), shape=(3, 3, 3))
+        for cube in [hc_red, hc_nir]:
+            name = cube.array.name
+            cube.array = cube.array.astype(numpy.float32)
+            cube.array.name = name
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[hc_red, hc_nir])
+
+        request = {"code": {"language": "python", "source": open(file_name, "r").read()},
+                   "data": udf_data.to_dict()}
+        self.assertEqual(request["data"]["datacubes"][0]["dtype"], "float32")
+
+        response = self.app.post('/udf_legacy', json=request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["datacubes"][0]["dtype"], "float32")
+
+        udf_data = UdfData.from_dict(response.json())
+        self.assertEqual(udf_data.datacube_list[0].array.dtype, numpy.float32)
+        self.checkDataCubeNdvi(udf_data=udf_data)
+
     def unused_test_DataCube_ndvi_message_pack(self):
         """Test the DataCube NDVI computation with the message pack protocol"""
         # TODO: Reactivate this test
@@ -102,6 +102,35 @@ class MachineLearningPytorchTestCase(unittest.TestCase):
         run_user_code(code=udf_code.source, data=udf_data)
         pprint.pprint(udf_data.to_dict())
 
+    def test_pytorch_batched_inference(self):
+        """Test the inference in batches of time slices with a single intra-op thread"""
+        model = SimpleNetwork()
+        MachineLearningPytorchTestCase.train_pytorch_model(model=model)
+
+        dir = os.path.dirname(openeo_udf.functions.__file__)
+        code = open(os.path.join(dir, "datacube_pytorch_ml.py"), "r").read()
+        values = numpy.random.RandomState(0).random_sample((5, 3, 2))
+
+        results = []
+        threads = torch.get_num_threads()
+        for context in ({}, {"batch_dimension": "t", "batch_size": 2, "threads": 1}):
+            temp = create_datacube(name="temp", value=0, dims=("t", "y", "x"), shape=(5, 3, 2))
+            temp.array.values[:] = values
+            ml = MachineLearnModelConfig(framework="pytorch", name="linear_model", description="Linear model",
+                                         path="/tmp/simple_linear_nn_pytorch.pt")
+            udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[temp], ml_model_list=[ml])
+            udf_data.user_context = context
+            run_user_code(code=code, data=udf_data)
+            results.append(udf_data.get_datacube_list()[0].array)
+
+        self.assertEqual(torch.get_num_threads(), threads)
+        self.assertEqual(results[1].dims, ("t", "y", "x"))
+        self.assertEqual(results[1].dtype, numpy.float32)
+        self.assertTrue(numpy.allclose(results[0].values, results[1].values))
+        with torch.no_grad():
+            expected = model(torch.from_numpy(values.astype(numpy.float32))).numpy()
+        self.assertTrue(numpy.allclose(results[1].values, expected))
+
 
 if __name__ == "__main__":
     unittest.main()
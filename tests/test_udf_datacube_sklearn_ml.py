@@ -207,6 +207,66 @@ class MachineLearningTestCase(unittest.TestCase):
         response = self.app.delete(f'/storage/{md5_hash}')
         self.assertEqual(response.status_code, 200)
 
+    def test_sklearn_chunked_prediction(self):
+        """Test the prediction in parallel pixel blocks with three bands and skipped NaN and nodata pixels"""
+        from sklearn.linear_model import LinearRegression
+
+        X = pd.DataFrame(np.random.RandomState(0).random_sample((100, 3)), columns=["red", "nir", "swir"])
+        model = LinearRegression().fit(X, X["red"] + X["nir"] + X["swir"])
+        joblib.dump(value=model, filename="/tmp/linear_sum_model.pkl")
+
+        dir = os.path.dirname(openeo_udf.functions.__file__)
+        code = open(os.path.join(dir, "datacube_sklearn_ml.py"), "r").read()
+
+        cubes = [create_datacube(name=name, value=value, dims=("t", "y", "x"), shape=(3, 10, 7))
+                 for name, value in (("red", 1), ("nir", 2), ("swir", 3))]
+        cubes[0].array.values[0, 0, 0] = np.nan
+        cubes[2].array.values[1, 2, 3] = -9999
+        ml = MachineLearnModelConfig(framework="sklearn", name="linear", description="A linear sum model",
+                                     path="/tmp/linear_sum_model.pkl")
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=cubes, ml_model_list=[ml])
+        udf_data.user_context = {"bands": ["red", "nir", "swir"], "chunk_size": 16, "threads": 3,
+                                 "nodata": -9999}
+
+        run_user_code(code=code, data=udf_data)
+        result = udf_data.get_datacube_list()[0].array
+        self.assertEqual(result.shape, (3, 10, 7))
+        self.assertTrue(np.isnan(result.values[0, 0, 0]))
+        self.assertTrue(np.isnan(result.values[1, 2, 3]))
+        self.assertEqual(int(np.isnan(result.values).sum()), 2)
+        self.assertTrue(np.allclose(np.nan_to_num(result.values, nan=6.0), 6.0))
+
+    def test_sklearn_label_prediction(self):
+        """Test that the string labels of a classifier are not truncated and skipped pixels are None"""
+        from sklearn.tree import DecisionTreeClassifier
+
+        X = pd.DataFrame({"red": [1, 2, 3, 4], "nir": [1, 1, 1, 1]})
+        model = DecisionTreeClassifier(random_state=0).fit(X, ["land", "land", "water", "water"])
+        joblib.dump(value=model, filename="/tmp/label_model.pkl")
+
+        dir = os.path.dirname(openeo_udf.functions.__file__)
+        code = open(os.path.join(dir, "datacube_sklearn_ml.py"), "r").read()
+
+        red = create_datacube(name="red", value=1, dims=("t", "y", "x"), shape=(2, 4, 5))
+        nir = create_datacube(name="nir", value=1, dims=("t", "y", "x"), shape=(2, 4, 5))
+        red.array.values[1] = 4
+        red.array.values[0, 0, 0] = np.nan
+        red.array.values[1, 3, 4] = np.nan
+        ml = MachineLearnModelConfig(framework="sklearn", name="labels", description="A label model",
+                                     path="/tmp/label_model.pkl")
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[red, nir], ml_model_list=[ml])
+        udf_data.user_context = {"chunk_size": 8}
+
+        run_user_code(code=code, data=udf_data)
+        result = udf_data.get_datacube_list()[0].array
+        self.assertEqual(result.name, "red_sklearn")
+        self.assertEqual(result.dtype, object)
+        self.assertIsNone(result.values[0, 0, 0])
+        self.assertIsNone(result.values[1, 3, 4])
+        self.assertEqual(result.values[0, 1, 1], "land")
+        self.assertEqual(result.values[1, 0, 0], "water")
+        self.assertEqual(sum(value is None for value in result.values.ravel()), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+import unittest
+import numpy
+import xarray
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.run_code import run_user_code, compile_user_code
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.tools import process_cpu_count
+import os
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+SMOOTHING_CODE = """
+from typing import Dict
+from openeo_udf.api.datacube import DataCube
+
+calls = []
+
+def apply_datacube(cube: DataCube, context: Dict) -> DataCube:
+    calls.append(cube.array.shape)
+    array = cube.array.rolling(x=3, center=True, min_periods=1).mean()
+    array = array.rolling(y=3, center=True, min_periods=1).mean()
+    array.name = cube.id + "_smoothed"
+    return DataCube(array=array)
+"""
+
+REDUCTION_CODE = """
+from typing import Dict
+from openeo_udf.api.datacube import DataCube
+
+UDF_TILING = {"tile_size": {"x": 4, "y": 3}, "overlap": 0}
+
+def apply_datacube(cube: DataCube, context: Dict) -> DataCube:
+    array = cube.array.max(dim="t")
+    array.name = cube.id + "_max"
+    return DataCube(array=array)
+"""
+
+CROP_CODE = """
+from typing import Dict
+from openeo_udf.api.datacube import DataCube
+
+def apply_datacube(cube: DataCube, context: Dict) -> DataCube:
+    return DataCube(array=cube.array[:, 1:, :])
+"""
+
+
+def create_cube() -> DataCube:
+    values = numpy.random.RandomState(42).random_sample((3, 10, 13)).astype(numpy.float32)
+    array = xarray.DataArray(values, dims=("t", "y", "x"), name="temp",
+                             coords={"t": [1, 2, 3], "y": numpy.arange(10) * 10.0, "x": numpy.arange(13) * 5.0})
+    return DataCube(array=array)
+
+
+class UdfTilingTestCase(unittest.TestCase):
+
+    def test_tiling_with_halo(self):
+        """Test that the tiled neighbourhood operation with halo equals the untiled operation"""
+        expected = run_user_code(SMOOTHING_CODE, UdfData(datacube_list=[create_cube()])).datacube_list[0]
+
+        udf_data = UdfData(datacube_list=[create_cube()])
+        udf_data.server_context = {"tiling": {"tile_size": 4, "overlap": 1, "workers": 3}}
+        calls = compile_user_code(SMOOTHING_CODE).module["calls"]
+        del calls[:]
+        result = run_user_code(SMOOTHING_CODE, udf_data).datacube_list[0]
+
+        # 3 x 4 tiles with halo
+        self.assertEqual(len(calls), 12)
+        self.assertEqual(result.id, "temp_smoothed")
+        self.assertTrue(result.array.equals(expected.array))
+        self.assertTrue(numpy.array_equal(result.array.coords["x"], numpy.arange(13) * 5.0))
+
+    def test_tiling_hint_of_module(self):
+        """Test the tiling of a reduction over time that is enabled by the UDF module"""
+        cube = create_cube()
+        result = run_user_code(REDUCTION_CODE, UdfData(datacube_list=[cube])).datacube_list[0]
+        self.assertEqual(result.array.dims, ("y", "x"))
+        self.assertTrue(numpy.array_equal(result.array.values, cube.array.values.max(axis=0)))
+
+        udf_data = UdfData(datacube_list=[create_cube()])
+        udf_data.server_context = {"tiling": None}
+        self.assertTrue(run_user_code(REDUCTION_CODE, udf_data).datacube_list[0].array.equals(result.array))
+
+    def test_default_tile_threads(self):
+        """Test that the CPUs are divided between the worker processes of the server"""
+        workers = UdfConfiguration.worker_processes
+        try:
+            UdfConfiguration.worker_processes = 0
+            self.assertEqual(process_cpu_count(), os.cpu_count())
+            UdfConfiguration.worker_processes = 2 * os.cpu_count()
+            self.assertEqual(process_cpu_count(), 1)
+        finally:
+            UdfConfiguration.worker_processes = workers
+
+    def test_tiling_size_mismatch(self):
+        """Test that UDFs that change the spatial size of the tiles are rejected"""
+        udf_data = UdfData(datacube_list=[create_cube()])
+        udf_data.server_context = {"tiling": {"tile_size": 5}}
+        self.assertRaises(Exception, run_user_code, CROP_CODE, udf_data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,42 @@
-from unittest import TestCase
+from unittest import TestCase, skipUnless
 
+import multiprocessing
+import numpy
+import pandas
+import xarray
+from pandas import DataFrame
+
+from openeo_udf.api.datacube import DataCube
 from openeo_udf.api.tools import create_datacube
 from openeo_udf.api.udf_data import UdfData
+from openeo_udf.api.run_code import run_user_code, compile_user_code, TIMESERIES_BLOCK_ENTRY_POINT
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.tools import process_cpu_count
+
+SERIES_CODE = """
+from typing import Dict
+from pandas import Series
+def apply_timeseries(series: Series, context: Dict) -> Series:
+    if context.get("fail", False):
+        raise Exception("Series failure")
+    return series.cumsum() + context.get("offset", 0)
+"""
+
+BLOCK_CODE = """
+from typing import Dict
+from pandas import DataFrame
+def apply_timeseries_block(frame: DataFrame, context: Dict) -> DataFrame:
+    return frame.interpolate(method="time", limit_direction="both")
+"""
+
+
+def create_gap_cube() -> DataCube:
+    values = numpy.arange(24, dtype=numpy.float64).reshape((2, 4, 3))
+    values[:, 1, :] = numpy.nan
+    array = xarray.DataArray(values, dims=("y", "t", "x"), name="temp",
+                             coords={"t": pandas.date_range("2001-01-01", periods=4, freq="D"),
+                                     "y": [0, 1], "x": [0, 1, 2]})
+    return DataCube(array=array)
 
 
 class TestWrapper(TestCase):
@@ -16,4 +51,90 @@ class TestWrapper(TestCase):
         rcts = udf_data.get_datacube_list
         apply_timeseries_generic(udf_data)
 
-        self.assertEqual(rcts,udf_data.get_datacube_list)
\ No newline at end of file
+        self.assertEqual(rcts,udf_data.get_datacube_list)
+
+    def test_timeseries_block_wrapper(self):
+        """Test that a block callback is called once with the time series of all pixels"""
+        from openeo_udf.api.udf_wrapper import apply_timeseries_generic
+
+        calls = []
+
+        def fill_gaps(frame: DataFrame, context: dict) -> DataFrame:
+            calls.append(frame.shape)
+            return frame.interpolate(method="time")
+
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[create_gap_cube()])
+        apply_timeseries_generic(udf_data, fill_gaps)
+
+        self.assertEqual(calls, [(4, 6)])
+        cube = udf_data.get_datacube_list()[0]
+        self.assertEqual(cube.id, "temp")
+        self.assertEqual(cube.array.dims, ("y", "t", "x"))
+        # The gap of the second time instant is filled with the mean of its neighbours
+        self.assertTrue(numpy.array_equal(cube.array.values[:, 1, :], (cube.array.values[:, 0, :] +
+                                                                       cube.array.values[:, 2, :]) / 2))
+
+    def test_timeseries_block_entry_point(self):
+        """Test the resolution and execution of the apply_timeseries_block entry point"""
+        self.assertEqual(compile_user_code(BLOCK_CODE).entry_point_type, TIMESERIES_BLOCK_ENTRY_POINT)
+
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[create_gap_cube()])
+        result = run_user_code(BLOCK_CODE, udf_data)
+        self.assertFalse(numpy.isnan(result.get_datacube_list()[0].array.values).any())
+
+    def test_timeseries_block_shape(self):
+        """Test that a block callback must keep the time instants and the pixels"""
+        from openeo_udf.api.udf_wrapper import apply_timeseries_block_generic
+
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[create_gap_cube()])
+        self.assertRaises(Exception, apply_timeseries_block_generic, udf_data, lambda frame, context: frame.iloc[1:])
+
+    def test_timeseries_per_pixel(self):
+        """Test that the callback is called with the time series of each pixel"""
+        array = create_gap_cube().array.fillna(0)
+        udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)])
+        udf_data.user_context = {"offset": 1}
+        expected = array.cumsum(dim="t").values + 1
+
+        result = run_user_code(SERIES_CODE, udf_data)
+        cube = result.get_datacube_list()[0]
+        self.assertEqual(cube.array.dims, ("y", "t", "x"))
+        self.assertTrue(numpy.allclose(cube.array.values, expected))
+
+    @skipUnless("fork" in multiprocessing.get_all_start_methods(), "Forked processes are not available")
+    def test_timeseries_parallel(self):
+        """Test the parallel computation of the time series in forked processes with shared output"""
+        values = numpy.random.RandomState(1).random_sample((5, 40, 50))
+        array = xarray.DataArray(values, dims=("t", "y", "x"), name="temp")
+        minimum_pixels = UdfConfiguration.timeseries_minimum_pixels
+        try:
+            UdfConfiguration.timeseries_minimum_pixels = 100
+            udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)])
+            udf_data.user_context = {"offset": 2}
+            from openeo_udf.api.udf_wrapper import apply_timeseries_generic
+            callback = compile_user_code(SERIES_CODE).entry_point
+            apply_timeseries_generic(udf_data, callback, processes=3)
+            self.assertTrue(numpy.allclose(udf_data.get_datacube_list()[0].array.values, values.cumsum(axis=0) + 2))
+
+            udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[DataCube(array=array)])
+            udf_data.user_context = {"fail": True}
+            with self.assertRaisesRegex(Exception, "Series failure"):
+                apply_timeseries_generic(udf_data, callback, processes=3)
+        finally:
+            UdfConfiguration.timeseries_minimum_pixels = minimum_pixels
+
+    @skipUnless("fork" in multiprocessing.get_all_start_methods(), "Forked processes are not available")
+    def test_timeseries_processes_in_worker(self):
+        """Test that the time series processes of a worker process are limited to the CPUs of the worker"""
+        from openeo_udf.api.udf_wrapper import timeseries_processes
+        worker_processes = UdfConfiguration.worker_processes
+        try:
+            UdfConfiguration.worker_processes = 0
+            self.assertEqual(timeseries_processes(3), 3)
+            self.assertEqual(timeseries_processes(0), 1)
+            UdfConfiguration.worker_processes = 2
+            self.assertEqual(timeseries_processes(64), min(64, process_cpu_count()))
+            UdfConfiguration.worker_processes = 1000 * process_cpu_count()
+            self.assertEqual(timeseries_processes(3), 1)
+        finally:
+            UdfConfiguration.worker_processes = worker_processes
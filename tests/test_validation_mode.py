@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+import numpy
+from pydantic import ValidationError
+
+from openeo_udf.api.datacube import DataCube
+from openeo_udf.server.config import UdfConfiguration, FULL_VALIDATION, STRUCTURE_VALIDATION
+from openeo_udf.server.data_model.data_collection_schema import DataCollectionModel
+from openeo_udf.server.data_model.variables_collection_schema import VariablesCollectionModel
+from openeo_udf.server.data_model.model_example_creator import create_data_collection_model_example
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+
+def create_data_collection_dict(size):
+    """Create a data collection dictionary with two variables of the provided size"""
+    d = create_data_collection_model_example().dict()
+    count = int(numpy.prod(size))
+    d["object_collections"]["data_cubes"][0]["size"] = size
+    d["variables_collections"][0]["size"] = size
+    for variable in d["variables_collections"][0]["variables"]:
+        variable["values"] = numpy.random.random(count).tolist()
+    return d
+
+
+class ValidationModeTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        UdfConfiguration.validation_mode = FULL_VALIDATION
+
+    def test_structure_validation(self):
+        """Test that structure validation parses the values into numpy arrays and checks the sizes"""
+
+        UdfConfiguration.validation_mode = STRUCTURE_VALIDATION
+        d = create_data_collection_dict([3, 3, 3])
+
+        dcm = DataCollectionModel(**d)
+        values = dcm.variables_collections[0].variables[0].values
+        self.assertIsInstance(values, numpy.ndarray)
+        self.assertEqual(values.dtype, numpy.float64)
+        dc = DataCube.from_data_collection(data_collection=dcm)
+        self.assertEqual(dc[0].array.shape, (3, 3, 3))
+
+        d["variables_collections"][0]["variables"][1]["values"] = [1, 2, 3]
+        self.assertRaises(ValidationError, DataCollectionModel, **d)
+
+        d["variables_collections"][0]["variables"][1]["values"] = ["a"] * 27
+        self.assertRaises(ValidationError, DataCollectionModel, **d)
+
+        d = create_data_collection_dict([3, 3, 3])
+        d["variables_collections"][0]["number_of_variables"] = 3
+        self.assertRaises(ValidationError, DataCollectionModel, **d)
+
+    def test_validation_benchmark(self):
+        """Compare the time of the full and the structure validation of a large variables collection,
+        the speedup is only reported, because wall clock timings are not reliable on shared test machines"""
+
+        variables_collection = create_data_collection_dict([20, 100, 100])["variables_collections"][0]
+
+        timings = {}
+        for mode in [FULL_VALIDATION, STRUCTURE_VALIDATION]:
+            UdfConfiguration.validation_mode = mode
+            start = time.perf_counter()
+            vcm = VariablesCollectionModel(**variables_collection)
+            timings[mode] = time.perf_counter() - start
+            self.assertEqual(numpy.size(vcm.variables[0].values), 200000)
+
+        speedup = timings[FULL_VALIDATION] / max(timings[STRUCTURE_VALIDATION], 1e-9)
+        print(f"Validation of 2 x 200000 values: full {timings[FULL_VALIDATION]:.3f}s, "
+              f"structure {timings[STRUCTURE_VALIDATION]:.3f}s, speedup {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    unittest.main()
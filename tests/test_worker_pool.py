@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import os
+import threading
+import time
+import unittest
+import numpy
+from fastapi.encoders import jsonable_encoder
+
+from openeo_udf.api.tools import create_datacube
+from openeo_udf.api.udf_data import UdfData
+from openeo_udf.server.udf import app
+from openeo_udf.server.worker_pool import WorkerPool, start_worker_pool, stop_worker_pool, get_worker_pool, \
+    execute_user_code, job_timeout
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.shared_arrays import shared_memory_available
+from starlette.testclient import TestClient
+from openeo_udf.server.tools import create_storage_directory
+
+__license__ = "Apache License, Version 2.0"
+__author__ = "Soeren Gebbert"
+__copyright__ = "Copyright 2018, Soeren Gebbert"
+__maintainer__ = "Soeren Gebbert"
+__email__ = "soerengebbert@googlemail.com"
+
+SCALE_CODE = """
+def scale(udf_data: UdfData):
+    cube = udf_data.get_datacube_list()[0]
+    array = cube.array * 2
+    array.name = cube.id + "_scaled"
+    udf_data.set_datacube_list([DataCube(array=array)])
+"""
+
+IDENTITY_CODE = """
+def identity(udf_data: UdfData):
+    pass
+"""
+
+SLEEP_CODE = """
+import time
+def sleep(udf_data: UdfData):
+    time.sleep(udf_data.user_context["seconds"])
+"""
+
+CPU_CODE = """
+from openeo_udf.server.config import UdfConfiguration
+from openeo_udf.server.tools import process_cpu_count
+def cpus(udf_data: UdfData):
+    udf_data.user_context = {"cpus": process_cpu_count(), "workers": UdfConfiguration.worker_processes}
+"""
+
+FAILING_CODE = """
+def fail(udf_data: UdfData):
+    raise Exception("UDF failure")
+"""
+
+
+class WorkerPoolTestCase(unittest.TestCase):
+    create_storage_directory()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = WorkerPool(workers=2)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def setUp(self):
+        self.app = TestClient(app=app)
+
+    def test_run_user_code(self):
+        """Test the execution of a UDF in a worker process"""
+        temp = create_datacube(name="temp", value=3, dims=("y", "x"), shape=(2, 2))
+        result = asyncio.run(self.pool.run_user_code(SCALE_CODE, UdfData(datacube_list=[temp])))
+        self.assertEqual(result.datacube_list[0].id, "temp_scaled")
+        self.assertTrue(numpy.all(result.datacube_list[0].array.values == 6))
+
+    def test_shared_memory_transfer(self):
+        """Test the transfer of data cubes with coordinates and attributes to a warm worker process"""
+        self.pool.warmup()
+        self.assertEqual(self.pool.info()["shared_memory"], shared_memory_available())
+        self.assertEqual(self.pool.info()["start_method"], "forkserver")
+
+        temp = create_datacube(name="temp", value=3, dims=("t", "y", "x"), shape=(3, 2, 2))
+        temp.array.attrs["description"] = "Temperature"
+        result = asyncio.run(self.pool.run_user_code(IDENTITY_CODE, UdfData(datacube_list=[temp])))
+        cube = result.datacube_list[0]
+        self.assertEqual(cube.id, "temp")
+        self.assertEqual(cube.array.dims, ("t", "y", "x"))
+        self.assertEqual(cube.array.attrs["description"], "Temperature")
+        self.assertTrue(numpy.array_equal(cube.array.coords["t"].values, temp.array.coords["t"].values))
+        self.assertTrue(numpy.all(cube.array.values == 3))
+        # The data cubes of the input data are restored after the transfer
+        self.assertTrue(numpy.all(temp.array.values == 3))
+
+    def test_event_loop_not_blocked(self):
+        """Test that the event loop keeps running while the workers execute UDF jobs in parallel"""
+        # Warm up both worker processes
+        asyncio.run(self.run_parallel(2, 0.0))
+
+        start = time.perf_counter()
+        ticks = asyncio.run(self.run_parallel(2, 1.0))
+        duration = time.perf_counter() - start
+
+        self.assertLess(duration, 1.9)
+        self.assertGreater(ticks, 5)
+
+        info = self.pool.info()
+        self.assertEqual(info["workers"], 2)
+        self.assertEqual(info["pending_jobs"], 0)
+        self.assertGreaterEqual(info["execution_time"]["max"], 1.0)
+
+    async def run_parallel(self, jobs: int, seconds: float) -> int:
+        ticks = 0
+        tasks = []
+        for i in range(jobs):
+            udf_data = UdfData()
+            udf_data.user_context = {"seconds": seconds}
+            tasks.append(asyncio.ensure_future(self.pool.run_user_code(SLEEP_CODE, udf_data)))
+        while not all(task.done() for task in tasks):
+            await asyncio.sleep(0.05)
+            ticks += 1
+        await asyncio.gather(*tasks)
+        return ticks
+
+    def test_event_loop_without_pool(self):
+        """Test that the event loop keeps running while the UDF code runs in a thread without worker pool"""
+        self.assertIsNone(get_worker_pool())
+
+        async def run_sleep() -> int:
+            udf_data = UdfData()
+            udf_data.user_context = {"seconds": 0.5}
+            task = asyncio.ensure_future(execute_user_code(SLEEP_CODE, udf_data))
+            ticks = 0
+            while not task.done():
+                await asyncio.sleep(0.05)
+                ticks += 1
+            await task
+            return ticks
+
+        self.assertGreater(asyncio.run(run_sleep()), 5)
+
+    def test_worker_cpu_count(self):
+        """Test that the worker processes divide the CPUs by the number of workers of the pool"""
+        result = asyncio.run(self.pool.run_user_code(CPU_CODE, UdfData()))
+        self.assertEqual(result.user_context["workers"], 2)
+        self.assertEqual(result.user_context["cpus"], max(1, os.cpu_count() // 2))
+
+    def test_failed_job(self):
+        """Test that UDF errors are raised and counted"""
+        failed = self.pool.info()["failed_jobs"]
+        with self.assertRaises(Exception):
+            asyncio.run(self.pool.run_user_code(FAILING_CODE, UdfData()))
+        self.assertEqual(self.pool.info()["failed_jobs"], failed + 1)
+
+    def test_deadline(self):
+        """Test that a job that exceeds its deadline is cancelled and its worker process is replaced"""
+        info = self.pool.info()
+        udf_data = UdfData()
+        udf_data.user_context = {"seconds": 30}
+
+        start = time.perf_counter()
+        with self.assertRaisesRegex(Exception, "deadline"):
+            asyncio.run(self.pool.run_user_code(SLEEP_CODE, udf_data, timeout=0.5))
+        self.assertLess(time.perf_counter() - start, 5)
+
+        self.assertEqual(self.pool.info()["timed_out_jobs"], info["timed_out_jobs"] + 1)
+        self.assertEqual(self.pool.info()["restarted_workers"], info["restarted_workers"] + 1)
+        self.test_run_user_code()
+
+    def test_cancel(self):
+        """Test the cancellation of a running job"""
+        cancelled = self.pool.info()["cancelled_jobs"]
+
+        async def cancel_job():
+            cancel_event = threading.Event()
+            udf_data = UdfData()
+            udf_data.user_context = {"seconds": 30}
+            job = asyncio.ensure_future(self.pool.run_user_code(SLEEP_CODE, udf_data, cancel_event=cancel_event))
+            await asyncio.sleep(0.3)
+            cancel_event.set()
+            await job
+
+        with self.assertRaisesRegex(Exception, "cancelled"):
+            asyncio.run(cancel_job())
+        self.assertEqual(self.pool.info()["cancelled_jobs"], cancelled + 1)
+
+    def test_job_timeout(self):
+        """Test the deadline of the server context and the server default"""
+        timeout = UdfConfiguration.execution_timeout
+        try:
+            UdfConfiguration.execution_timeout = 60
+            self.assertEqual(job_timeout({}), 60)
+            self.assertEqual(job_timeout({"timeout": 2}), 2)
+            self.assertIsNone(job_timeout({"timeout": None}))
+            self.assertRaises(Exception, job_timeout, {"timeout": -1})
+            self.assertRaises(Exception, job_timeout, {"timeout": "1"})
+        finally:
+            UdfConfiguration.execution_timeout = timeout
+
+    def test_client_disconnect(self):
+        """Test that the job of a disconnected client is cancelled"""
+
+        async def receive():
+            await asyncio.sleep(0.3)
+            return {"type": "http.disconnect"}
+
+        start_worker_pool(workers=1)
+        try:
+            udf_data = UdfData()
+            udf_data.user_context = {"seconds": 30}
+            start = time.perf_counter()
+            with self.assertRaisesRegex(Exception, "cancelled"):
+                asyncio.run(execute_user_code(SLEEP_CODE, udf_data, receive=receive))
+            self.assertLess(time.perf_counter() - start, 5)
+            self.assertEqual(get_worker_pool().info()["cancelled_jobs"], 1)
+        finally:
+            stop_worker_pool()
+
+    def test_udf_legacy_endpoint(self):
+        """Test the legacy endpoint with the worker pool of the server"""
+        start_worker_pool(workers=1)
+        try:
+            temp = create_datacube(name="temp", value=3, dims=("y", "x"), shape=(2, 2))
+            udf_data = UdfData(proj={"EPSG": 4326}, datacube_list=[temp])
+            request = {"code": {"language": "python", "source": SCALE_CODE},
+                       "data": jsonable_encoder(udf_data.to_dict())}
+
+            response = self.app.post('/udf_legacy', json=request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["datacubes"][0]["id"], "temp_scaled")
+            self.assertEqual(response.json()["datacubes"][0]["data"], [[6, 6], [6, 6]])
+
+            response = self.app.get('/metrics')
+            self.assertEqual(response.json()["worker_pool"]["completed_jobs"], 1)
+
+            udf_data.user_context = {"seconds": 30}
+            udf_data.server_context = {"timeout": 0.5}
+            request = {"code": {"language": "python", "source": SLEEP_CODE},
+                       "data": jsonable_encoder(udf_data.to_dict())}
+            response = self.app.post('/udf_legacy', json=request)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("deadline", response.json()["detail"]["message"])
+            self.assertEqual(self.app.get('/metrics').json()["worker_pool"]["timed_out_jobs"], 1)
+        finally:
+            stop_worker_pool()
+        self.assertIsNone(get_worker_pool())
+
+
+if __name__ == "__main__":
+    unittest.main()